@@ -0,0 +1,67 @@
+import argparse
+import json
+import random
+
+
+def generate_catalog(output, products, variants_per_product=1, in_store_only=0.0, malformed_prices=0.0,
+                     duplicates=0.0, seed=0):
+    """
+    Writes a synthetic catalog with the same shape as the one parsed by
+    :py:class:`src.spiders.vodafonebusinessstore.VodafoneBusinessStore`.
+
+    The catalog is written incrementally, so catalogs bigger than the available memory can be generated.
+
+    :param output: binary file-like object where the catalog is written to.
+    :param products: number of products of the catalog.
+    :param variants_per_product: number of variants of each product.
+    :param in_store_only: ratio of variants without an online price.
+    :param malformed_prices: ratio of variants whose price is not a number.
+    :param duplicates: ratio of variants with the same name as the previous one.
+    :param seed: seed of the random choices.
+    """
+    rng = random.Random(seed)
+    name = None
+
+    output.write(b'{"products":[')
+
+    for product_index in range(products):
+        variants = []
+
+        for variant_index in range(variants_per_product):
+            if name is None or rng.random() >= duplicates:
+                name = 'Product %d Variant %d' % (product_index, variant_index)
+
+            if rng.random() < in_store_only:
+                pvp = []
+            elif rng.random() < malformed_prices:
+                pvp = [{'price': 'N/A'}]
+            else:
+                pvp = [{'price': round(rng.uniform(1, 1000), 4)}]
+
+            variants.append({
+                'name': name,
+                'pageLink': '/loja/acessorios/product-%d-variant-%d.html' % (product_index, variant_index),
+                'priceCondition': {'PVP': pvp}
+            })
+
+        if product_index:
+            output.write(b',')
+        output.write(json.dumps({'name': 'Product %d' % product_index, 'variants': variants}).encode('utf8'))
+
+    output.write(b']}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic Vodafone Business Store catalog.')
+    parser.add_argument('output', help='Path of the generated catalog.')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--variants', type=int, default=1, help='Variants per product.')
+    parser.add_argument('--in-store-only', type=float, default=0.0, help='Ratio of variants only sold in-store.')
+    parser.add_argument('--malformed-prices', type=float, default=0.0, help='Ratio of variants with a malformed price.')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='Ratio of duplicated variants.')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    with open(arguments.output, 'wb') as catalog:
+        generate_catalog(catalog, arguments.products, arguments.variants, arguments.in_store_only,
+                         arguments.malformed_prices, arguments.duplicates, arguments.seed)
@@ -0,0 +1,144 @@
+import argparse
+import http.client
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from src.server import SimpleHTTPRequestHandler
+from src.structures.productcatalog import ProductCatalog
+
+WORDS = ['apple', 'samsung', 'xiaomi', 'huawei', 'capa', 'carregador', 'auriculares', 'cabo', 'usb', 'pro', 'max',
+         'mini', 'preto', 'branco', 'azul', 'wireless', 'bluetooth', 'galaxy', 'iphone', 'redmi']
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """
+    Handler of the server that does not log every request, which would be measured too.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+
+def products(count, seed=0):
+    """
+    :param count: number of products.
+    :param seed: seed of the random choices.
+    :return: list of tuples with the name, price in cents and URL of synthetic products.
+    """
+    rng = random.Random(seed)
+    return [(' '.join(rng.sample(WORDS, 4)) + ' %d' % index, rng.randint(100, 150000),
+             'https://www.vodafone.pt/loja/acessorios/product-%d.html' % index) for index in range(count)]
+
+
+def queries(count, seed=0):
+    """
+    :param count: number of queries.
+    :param seed: seed of the random choices.
+    :return: list of paths of `/products` with a mix of price, word and page filters.
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for _ in range(count):
+        parameters = ['limit=%d' % rng.choice([10, 20, 50])]
+        if rng.random() < 0.7:
+            parameters.append('max_price=%d' % rng.randint(5, 1500))
+        if rng.random() < 0.7:
+            parameters.append('contains=%s' % '+'.join(word[:rng.randint(2, len(word))]
+                                                       for word in rng.sample(WORDS, rng.randint(1, 2))))
+        if rng.random() < 0.2:
+            parameters.append('offset=%d' % rng.randint(0, 100))
+        paths.append('/products?' + '&'.join(parameters))
+
+    return paths
+
+
+def client(port, paths, revalidate, latencies, seed):
+    """
+    Sends every query through a single kept-alive connection, like a client of the API would.
+
+    :param port: port of the server.
+    :param paths: list of the queries.
+    :param revalidate: ratio of the queries sent again with the `ETag` of their first response.
+    :param latencies: list where the latency of each request, in seconds, is appended to.
+    :param seed: seed of the random choices.
+    """
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    etags = {}
+
+    for path in paths:
+        headers = {'If-None-Match': etags[path]} if path in etags and rng.random() < revalidate else {}
+
+        start = time.perf_counter()
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+
+        if response.status not in (200, 304):
+            raise RuntimeError('Unexpected response. status=%d path=%s' % (response.status, path))
+        etags[path] = response.getheader('ETag')
+
+    connection.close()
+
+
+def percentile(values, ratio):
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load tests GET /products with concurrent kept-alive clients.')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000, help='Number of requests of each client.')
+    parser.add_argument('--distinct-queries', type=int, default=200)
+    parser.add_argument('--revalidate', type=float, default=0.5,
+                        help='Ratio of repeated queries sent with the ETag of their previous response.')
+    parser.add_argument('--p50-budget', type=float, help='Fails if the median latency is higher (ms).')
+    parser.add_argument('--p99-budget', type=float, help='Fails if the 99th percentile of the latency is higher (ms).')
+    arguments = parser.parse_args()
+
+    catalog = ProductCatalog()
+    start = time.perf_counter()
+    catalog.load(products(arguments.products))
+    print('Loaded catalog: products=%d time=%.1fms' % (len(catalog), (time.perf_counter() - start) * 1000))
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+    httpd.daemon_threads = True
+    httpd.catalog = catalog
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    distinct = queries(arguments.distinct_queries)
+    rng = random.Random(1)
+    latencies = [[] for _ in range(arguments.clients)]
+    clients = [threading.Thread(target=client, args=(httpd.server_address[1],
+                                                     [rng.choice(distinct) for _ in range(arguments.requests)],
+                                                     arguments.revalidate, latencies[index], index))
+               for index in range(arguments.clients)]
+
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    httpd.shutdown()
+
+    latencies = sorted(latency * 1000 for client_latencies in latencies for latency in client_latencies)
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    print('Requests: %d throughput=%.0f/s p50=%.2fms p99=%.2fms max=%.2fms' % (
+        len(latencies), len(latencies) / elapsed, p50, p99, latencies[-1]))
+
+    over_budget = False
+    if arguments.p50_budget and p50 > arguments.p50_budget:
+        print('Median latency is over budget: %.2fms > %.2fms' % (p50, arguments.p50_budget))
+        over_budget = True
+    if arguments.p99_budget and p99 > arguments.p99_budget:
+        print('99th percentile of the latency is over budget: %.2fms > %.2fms' % (p99, arguments.p99_budget))
+        over_budget = True
+
+    sys.exit(1 if over_budget else 0)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ['ProductValidator', 'DuplicatesFilter', 'SaveToDatabase', 'SaveToDatabase (settled)', 'ProductNotifier']
+
+
+def run(arguments):
+    """
+    Runs the real scraper, with every item pipeline, against local stand-ins of the store, the database and Slack.
+
+    :param arguments: parsed command line arguments.
+    :return: dict with the results of the run.
+    """
+    from benchmarks import timedpipelines
+    from benchmarks.catalog import generate_catalog
+    from benchmarks.standins import CatalogHandler, SlackHandler, serve
+    from src.environmentvariables import EnvironmentVariables
+    from src.scraper import Scraper
+
+    variants = arguments.variants[0]
+    directory = tempfile.mkdtemp(prefix='vodafone-benchmark-')
+    catalog_path = os.path.join(directory, 'catalog.json')
+
+    with open(catalog_path, 'wb') as catalog:
+        generate_catalog(catalog, variants // arguments.variants_per_product, arguments.variants_per_product,
+                         arguments.in_store_only, arguments.malformed_prices, arguments.duplicates)
+
+    _, catalog_url = serve(CatalogHandler, catalog_path=catalog_path)
+    slack, slack_url = serve(SlackHandler, channel='benchmark', posted_messages=0)
+
+    settings = Scraper.settings()
+    settings.set(EnvironmentVariables.DATABASE_URL_ARG, 'memory:')
+    settings.set(EnvironmentVariables.NOTIFIER_ARG, 'slack')
+    settings.set(EnvironmentVariables.SLACK_TOKEN_ARG, 'benchmark')
+    settings.set(EnvironmentVariables.SLACK_CHANNEL_ARG, 'benchmark')
+    settings.set(EnvironmentVariables.SLACK_API_URL_ARG, slack_url)
+    settings.set(EnvironmentVariables.SLACK_CHANNEL_CACHE_ARG, os.path.join(directory, 'channels.json'))
+    settings.set('ITEM_PIPELINES', {
+        'benchmarks.timedpipelines.TimedProductValidator': 100,
+        'benchmarks.timedpipelines.TimedDuplicatesFilter': 200,
+        'benchmarks.timedpipelines.TimedSaveToDatabase': 300,
+        'benchmarks.timedpipelines.TimedProductNotifier': 400
+    })
+    settings.set('LOG_LEVEL', arguments.log_level)
+
+    start = time.perf_counter()
+    stats = Scraper.scrape(settings, catalogs=[{'name': 'benchmark', 'url': catalog_url + 'catalog.json'}])
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for stage, latencies in timedpipelines.latencies.items():
+        ordered = sorted(latencies)
+        stages[stage] = {
+            'items': len(ordered),
+            'mean_us': statistics.mean(ordered) * 1e6,
+            'p99_us': ordered[int(len(ordered) * 0.99)] * 1e6,
+            'total_s': sum(ordered)
+        }
+
+    return {
+        'variants': variants,
+        'catalog_bytes': os.path.getsize(catalog_path),
+        'elapsed_s': elapsed,
+        'items_per_s': variants / elapsed,
+        'items_scraped': stats.get('item_scraped_count', 0),
+        'items_dropped': stats.get('item_dropped_count', 0),
+        'slack_messages': slack.posted_messages,
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': stages
+    }
+
+
+def report(results):
+    print('%10s %10s %12s %10s %10s %10s %14s' % (
+        'variants', 'MiB', 'items/s', 'scraped', 'dropped', 'slack', 'peak RSS MiB'))
+    for result in results:
+        print('%10d %10.1f %12.0f %10d %10d %10d %14.1f' % (
+            result['variants'], result['catalog_bytes'] / 2 ** 20, result['items_per_s'], result['items_scraped'],
+            result['items_dropped'], result['slack_messages'], result['peak_rss_mib']))
+
+    print()
+    print('%10s %-26s %10s %12s %12s %10s' % ('variants', 'stage', 'items', 'mean (us)', 'p99 (us)', 'total (s)'))
+    for result in results:
+        for stage in STAGES:
+            if stage in result['stages']:
+                latency = result['stages'][stage]
+                print('%10d %-26s %10d %12.1f %12.1f %10.2f' % (
+                    result['variants'], stage, latency['items'], latency['mean_us'], latency['p99_us'],
+                    latency['total_s']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the whole scraper offline against local stand-ins.')
+    parser.add_argument('--variants', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Total number of variants of each run.')
+    parser.add_argument('--variants-per-product', type=int, default=4)
+    parser.add_argument('--in-store-only', type=float, default=0.05)
+    parser.add_argument('--malformed-prices', type=float, default=0.001)
+    parser.add_argument('--duplicates', type=float, default=0.01)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--single', action='store_true', help='Runs a single size in this process and prints JSON.')
+    parser.add_argument('--output', help='Writes the results as JSON to this path, to compare between commits.')
+    arguments = parser.parse_args()
+
+    if arguments.single:
+        print(json.dumps(run(arguments)))
+        sys.exit(0)
+
+    results = []
+    for variants in arguments.variants:
+        # Each size runs in its own process, as the reactor cannot be restarted and to isolate the peak RSS
+        command = [sys.executable, '-m', 'benchmarks.endtoend', '--single', '--variants', str(variants),
+                   '--variants-per-product', str(arguments.variants_per_product),
+                   '--in-store-only', str(arguments.in_store_only),
+                   '--malformed-prices', str(arguments.malformed_prices),
+                   '--duplicates', str(arguments.duplicates), '--log-level', arguments.log_level]
+        output = subprocess.run(command, cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT), stdout=subprocess.PIPE,
+                                universal_newlines=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    report(results)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(results, output, indent=2)
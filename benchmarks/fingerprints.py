@@ -0,0 +1,40 @@
+import argparse
+import time
+import tracemalloc
+
+from src.structures.fingerprintset import FingerprintSet
+
+
+def measure(name, factory, products):
+    """
+    Adds every product name to a new set and reports the time and memory it took.
+
+    :param name: name of the set.
+    :param factory: callable that creates the set.
+    :param products: number of product names.
+    """
+    # Names are generated on the fly, so only the ones kept by the set are measured
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    seen = factory()
+    for index in range(products):
+        seen.add('Apple AirPods Pro com Estojo de Carregamento Sem Fios - Variant %d' % index)
+
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('%-24s products=%9d time=%7.3fs memory=%9.1fMiB per product=%6.1fB' % (
+        name, products, elapsed, memory / 2 ** 20, memory / products))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the memory of the seen products of the DuplicatesFilter.')
+    parser.add_argument('--products', type=int, nargs='+', default=[100000, 1000000])
+    arguments = parser.parse_args()
+
+    for products in arguments.products:
+        measure('set', set, products)
+        measure('FingerprintSet', FingerprintSet, products)
+        measure('FingerprintSet (exact)', lambda: FingerprintSet(exact=True), products)
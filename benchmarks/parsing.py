@@ -0,0 +1,63 @@
+import argparse
+import io
+import time
+import tracemalloc
+
+from scrapy.http import Request, TextResponse
+from scrapy.settings import Settings
+
+from benchmarks.catalog import generate_catalog
+from src.environmentvariables import EnvironmentVariables
+from src.spiders.vodafonebusinessstore import VodafoneBusinessStore
+
+
+def run(body, parser):
+    """
+    Parses the given catalog with the requested parser and measures it.
+
+    :param body: raw bytes of the catalog.
+    :param parser: `json` or `stream`.
+    :return: tuple with the number of products, time to first product, total time and peak of memory allocated.
+    """
+    spider = VodafoneBusinessStore()
+    spider.settings = Settings({
+        EnvironmentVariables.CATALOG_PARSER_ARG: parser,
+        EnvironmentVariables.NOTIFIER_ARG: 'log'
+    })
+    url = VodafoneBusinessStore.catalog_url(VodafoneBusinessStore.DEFAULT_CATALOGS[0])
+    response = TextResponse(url, body=body, encoding='utf-8', request=Request(url, meta={'catalog': 'benchmark'}))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_product = None
+    products = 0
+
+    for _ in spider.parse(response):
+        if first_product is None:
+            first_product = time.perf_counter() - start
+        products += 1
+
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return products, first_product, total, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the json and stream catalog parsers.')
+    parser.add_argument('--variants', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Total number of variants of each generated catalog.')
+    arguments = parser.parse_args()
+
+    print('%10s %8s %10s %14s %10s %12s' % ('variants', 'parser', 'MiB', 'first item (s)', 'total (s)', 'peak (MiB)'))
+
+    for variants in arguments.variants:
+        catalog = io.BytesIO()
+        generate_catalog(catalog, variants // 4, 4)
+        body = catalog.getvalue()
+
+        for catalog_parser in ('json', 'stream'):
+            products, first_product, total, peak = run(body, catalog_parser)
+            print('%10d %8s %10.1f %14.4f %10.3f %12.1f' % (
+                products, catalog_parser, len(body) / 2 ** 20, first_product, total, peak / 2 ** 20))
@@ -0,0 +1,96 @@
+import argparse
+import logging
+import time
+import tracemalloc
+
+from scrapy.settings import Settings
+
+from src.domain.product import Product, ProductItem
+from src.environmentvariables import EnvironmentVariables
+from src.pipelines.duplicatesfilter import DuplicatesFilter
+from src.pipelines.productnotifier import ProductNotifier
+from src.pipelines.productvalidator import ProductValidator
+from src.pipelines.savetodatabase import SaveToDatabase
+
+
+class FormattingHandler(logging.Handler):
+    """
+    Formats every record, as a real handler would, and discards it.
+    """
+
+    def emit(self, record):
+        self.format(record)
+
+
+def create(product_type, index):
+    return product_type(name='Apple AirPods Pro com Estojo de Carregamento Sem Fios - Variant %d' % index,
+                        price=279.99, url='https://www.vodafone.pt/loja/acessorios/apple-airpods-pro-%d.html' % index,
+                        catalog='accessories')
+
+
+def measure_creation(product_type, products):
+    """
+    Creates and keeps the given number of products and reports the memory blocks and bytes each one takes, besides
+    its strings.
+
+    :param product_type: :py:class:`src.domain.product.Product` or :py:class:`src.domain.product.ProductItem`.
+    :param products: number of products.
+    """
+    # The strings are created beforehand, so only the products themselves are measured
+    fields = [create(dict, index) for index in range(products)]
+
+    tracemalloc.start()
+    created = [product_type(**product_fields) for product_fields in fields]
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    statistics = snapshot.statistics('filename')
+    blocks = sum(statistic.count for statistic in statistics) - 1
+    size = sum(statistic.size for statistic in statistics) - len(created) * 8
+
+    print('%-12s creation products=%8d blocks per product=%5.1f bytes per product=%6.1f' % (
+        product_type.__name__, len(created), blocks / products, size / products))
+
+
+def measure_pipeline(product_type, products):
+    """
+    Creates the given number of products and sends each one through every pipeline step, with a database in memory and
+    logs of INFO level formatted, and reports the time and peak of memory per product.
+
+    :param product_type: :py:class:`src.domain.product.Product` or :py:class:`src.domain.product.ProductItem`.
+    :param products: number of products.
+    """
+    settings = Settings({EnvironmentVariables.NOTIFIER_ARG: 'log', EnvironmentVariables.DATABASE_URL_ARG: 'memory:'})
+    pipelines = [ProductValidator(settings), DuplicatesFilter(settings), SaveToDatabase('memory:'),
+                 ProductNotifier(settings)]
+
+    for pipeline in pipelines:
+        pipeline.open_spider(None)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    for index in range(products):
+        item = create(product_type, index)
+        for pipeline in pipelines:
+            item = pipeline.process_item(item, None)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('%-12s pipeline products=%8d time per product=%6.1fus peak bytes per product=%6.1f' % (
+        product_type.__name__, products, elapsed / products * 1e6, peak / products))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the memory and time of Product and ProductItem.')
+    parser.add_argument('--products', type=int, default=100000)
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, handlers=[FormattingHandler()])
+
+    for product_type in (ProductItem, Product):
+        measure_creation(product_type, arguments.products)
+    for product_type in (ProductItem, Product):
+        measure_pipeline(product_type, arguments.products)
@@ -0,0 +1,66 @@
+import argparse
+import os
+import tempfile
+import time
+
+from src.structures.snapshot import Snapshot
+
+
+def catalog(products, offset, repriced_every):
+    """
+    :param products: number of products.
+    :param offset: index of the first product. Products before it are removed and the same number of products is added.
+    :param repriced_every: every this many products, the price is one cent higher. 0 to reprice none.
+    :return: generator of tuples with the name, price in cents and URL of each product.
+    """
+    for index in range(offset, offset + products):
+        price = 999 + index % 5000 + (1 if repriced_every and index % repriced_every == 0 else 0)
+        yield ('Apple AirPods Pro com Estojo de Carregamento Sem Fios - Variant %d' % index, price,
+               'https://www.vodafone.pt/loja/acessorios/apple-airpods-pro-%d.html' % index)
+
+
+def measure(directory, products, changes):
+    """
+    Writes two snapshots whose differences are the given fraction of the products and compares them.
+
+    :param directory: directory of the snapshot files.
+    :param products: number of products of each snapshot.
+    :param changes: fraction of the products that are added, removed and repriced.
+    """
+    changed = max(int(products * changes), 1)
+    previous_path = os.path.join(directory, 'previous.snapshot')
+    current_path = os.path.join(directory, 'current.snapshot')
+
+    Snapshot.write(previous_path, catalog(products, 0, 0))
+
+    start = time.perf_counter()
+    Snapshot.write(current_path, catalog(products, changed, products // changed))
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    previous, current = Snapshot(previous_path), Snapshot(current_path)
+    open_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    diff = Snapshot.diff(previous, current)
+    diff_time = time.perf_counter() - start
+
+    print('products=%9d size=%7.1fMiB write=%7.3fs open=%7.5fs diff=%7.3fs added=%7d removed=%7d repriced=%7d' % (
+        products, os.path.getsize(current_path) / 2 ** 20, write_time, open_time, diff_time, len(diff.added),
+        len(diff.removed), len(diff.repriced)))
+
+    del diff
+    previous.close()
+    current.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures writing and comparing catalog snapshots.')
+    parser.add_argument('--products', type=int, nargs='+', default=[100000, 1000000, 3000000])
+    parser.add_argument('--changes', type=float, default=0.01,
+                        help='Fraction of the products that are added, removed and repriced between snapshots.')
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for products in arguments.products:
+            measure(directory, products, arguments.changes)
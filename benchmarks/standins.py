@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """
+    Request handler that does not log every request.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CatalogHandler(QuietHandler):
+    """
+    Serves the catalog file of the server on any path.
+    """
+
+    def do_GET(self):
+        with open(self.server.catalog_path, 'rb') as catalog:
+            body = catalog.read()
+
+        self.send_body(200, 'application/json', body, {'ETag': '"%d"' % os.stat(self.server.catalog_path).st_mtime_ns})
+
+
+class SlackHandler(QuietHandler):
+    """
+    Stand-in of the Slack Web API methods used by :py:class:`src.notifiers.slacknotifier.SlackNotifier`.
+
+    Every channel exists and every message is accepted. Posted messages are counted by the server.
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.split('?')[0].rsplit('/', 1)[-1]
+        response = {'ok': True}
+
+        if method == 'conversations.list':
+            response['channels'] = [{'name': self.server.channel, 'id': 'C0BENCHMARK'}]
+        elif method == 'conversations.create':
+            response['channel'] = {'id': 'C0BENCHMARK'}
+        elif method == 'chat.postMessage':
+            with self.server.lock:
+                self.server.posted_messages += 1
+
+        self.send_body(200, 'application/json', json.dumps(response).encode('utf8'))
+
+    do_GET = do_POST
+
+
+def serve(handler, **attributes):
+    """
+    Starts a threaded HTTP server on a free local port, in the background.
+
+    :param handler: request handler class.
+    :param attributes: attributes set on the server, available to the handler as `self.server.<name>`.
+    :return: tuple with the server and its base URL.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    for name, value in attributes.items():
+        setattr(server, name, value)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, 'http://127.0.0.1:%d/' % server.server_port
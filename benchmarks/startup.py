@@ -0,0 +1,99 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment(**variables):
+    """
+    :param variables: extra environment variables.
+    :return: environment of the current process with the repository in the `PYTHONPATH`.
+    """
+    return dict(os.environ, PYTHONPATH=ROOT, **variables)
+
+
+def import_time(module, top):
+    """
+    Imports the given module in a new interpreter with `-X importtime`.
+
+    :param module: name of the module to import.
+    :param top: number of the most expensive imports to return.
+    :return: tuple with the cumulative import time of the module in milliseconds and the most expensive imports.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module], cwd=ROOT,
+                            env=environment(), stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        imports.append((int(self_time) / 1000, int(cumulative_time) / 1000, name.rstrip()))
+
+    total = next(cumulative for _, cumulative, name in imports if name.strip() == module)
+
+    return total, sorted(imports, reverse=True)[:top]
+
+
+def time_to_listen(timeout):
+    """
+    Starts the HTTP server and measures how long it takes to accept connections.
+
+    :param timeout: seconds to wait for the server.
+    :return: seconds until the port accepted a connection.
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, os.path.join('src', 'server.py')], cwd=ROOT,
+                              env=environment(PORT=str(port)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+
+        raise TimeoutError('Server did not listen within %d seconds' % timeout)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the startup cost of the entry points.')
+    parser.add_argument('--modules', nargs='+', default=['src.server', 'src.scraper'])
+    parser.add_argument('--top', type=int, default=10, help='Number of the most expensive imports to show.')
+    parser.add_argument('--import-budget', type=float, help='Fails if importing src.server takes longer (ms).')
+    parser.add_argument('--listen-budget', type=float, help='Fails if the server takes longer to listen (ms).')
+    arguments = parser.parse_args()
+
+    over_budget = False
+
+    for module in arguments.modules:
+        total, imports = import_time(module, arguments.top)
+        print('%s: %.1fms' % (module, total))
+        for self_time, cumulative_time, name in imports:
+            print('  self=%8.1fms cumulative=%8.1fms %s' % (self_time, cumulative_time, name))
+
+        if module == 'src.server' and arguments.import_budget and total > arguments.import_budget:
+            print('Importing src.server is over budget: %.1fms > %.1fms' % (total, arguments.import_budget))
+            over_budget = True
+
+    listen = time_to_listen(timeout=30) * 1000
+    print('Time to listen: %.1fms' % listen)
+
+    if arguments.listen_budget and listen > arguments.listen_budget:
+        print('Time to listen is over budget: %.1fms > %.1fms' % (listen, arguments.listen_budget))
+        over_budget = True
+
+    sys.exit(1 if over_budget else 0)
@@ -0,0 +1,47 @@
+import time
+from array import array
+
+from twisted.internet.defer import Deferred
+
+from src.pipelines.duplicatesfilter import DuplicatesFilter
+from src.pipelines.productnotifier import ProductNotifier
+from src.pipelines.productvalidator import ProductValidator
+from src.pipelines.savetodatabase import SaveToDatabase
+
+# Latencies in seconds of each stage
+latencies = {}
+
+
+def record(stage, start):
+    latencies.setdefault(stage, array('d')).append(time.perf_counter() - start)
+
+
+def timed(cls):
+    """
+    :param cls: class of an item pipeline.
+    :return: subclass of the item pipeline that records the latency of each item. Items that are settled later, through
+    a :py:class:`twisted.internet.defer.Deferred`, are also recorded until they are settled.
+    """
+
+    class Timed(cls):
+        def process_item(self, item, spider):
+            start = time.perf_counter()
+
+            try:
+                result = super().process_item(item, spider)
+            finally:
+                record(cls.__name__, start)
+
+            if isinstance(result, Deferred):
+                result.addBoth(lambda settled: record(cls.__name__ + ' (settled)', start) or settled)
+
+            return result
+
+    Timed.__name__ = 'Timed' + cls.__name__
+    return Timed
+
+
+TimedProductValidator = timed(ProductValidator)
+TimedDuplicatesFilter = timed(DuplicatesFilter)
+TimedSaveToDatabase = timed(SaveToDatabase)
+TimedProductNotifier = timed(ProductNotifier)
@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+import time
+
+from src.databases.databasefactory import DatabaseFactory
+
+
+def products(count, round_number, prefix):
+    """
+    :param count: number of products.
+    :param round_number: products of later rounds are cheaper, so every product has its price changed.
+    :param prefix: prefix of the names, so different measures do not write the same products.
+    :return: list of products that can be passed to :py:meth:`src.databases.database.Database.insert_many`.
+    """
+    return [{'name': '%s Benchmark Product %d' % (prefix, index),
+             'price': round(100 - round_number - (index % 100) / 100, 2),
+             'url': 'https://www.vodafone.pt/loja/acessorios/benchmark-%d.html' % index}
+            for index in range(count)]
+
+
+def measure(database_url, count, batch_size, rounds):
+    """
+    Upserts the products in batches and reports the throughput of each round. The first round only inserts and the
+    following ones only update prices.
+
+    :param database_url: URL of the database. The products are written to its tables, so use a throwaway database.
+    :param count: number of products.
+    :param batch_size: number of products per batch.
+    :param rounds: number of times every product is written.
+    """
+    db = DatabaseFactory.get_database(database_url)
+
+    try:
+        for round_number in range(rounds):
+            batch = products(count, round_number, 'Batch %d' % batch_size)
+            start = time.perf_counter()
+
+            for index in range(0, count, batch_size):
+                db.insert_many(batch[index:index + batch_size])
+
+            elapsed = time.perf_counter() - start
+            print('%-10s round=%d products=%8d batch=%5d time=%7.3fs products/s=%10.0f' % (
+                database_url[:database_url.find(':')], round_number, count, batch_size, elapsed, count / elapsed))
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the upsert throughput of the databases.')
+    parser.add_argument('--databases', nargs='+', default=[],
+                        help='URLs of the databases. A temporary SQLite file and the memory database are always '
+                             'measured. The tables of PostgreSQL databases are written, so use a throwaway one.')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--rounds', type=int, default=2)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for batch_size in arguments.batch_sizes:
+            database_urls = ['memory:', 'sqlite:' + os.path.join(directory, 'upserts-%d.db' % batch_size)]
+
+            for database_url in database_urls + arguments.databases:
+                measure(database_url, arguments.products, batch_size, arguments.rounds)
@@ -0,0 +1,84 @@
+import argparse
+import logging
+import time
+
+import validators
+
+from src.validation.validationengine import ValidationEngine
+
+logger = logging.getLogger(__name__)
+
+
+def generate_products(count, invalid_ratio):
+    """
+    :param count: number of products.
+    :param invalid_ratio: ratio of products with an invalid URL.
+    :return: list of products with the same fields as :py:class:`src.domain.product.Product`.
+    """
+    invalid_every = int(1 / invalid_ratio) if invalid_ratio else 0
+    products = []
+
+    for index in range(count):
+        url = 'https://www.vodafone.pt/loja/acessorios/product-%d.html' % index
+        if invalid_every and index % invalid_every == 0:
+            url = 'https://www.vodafone.pt/loja/acessorios/product %d.html' % index
+        products.append({'name': 'Product %d' % index, 'price': index / 100, 'url': url})
+
+    return products
+
+
+def validate_before(product):
+    """
+    Validation as it was done by :py:class:`src.pipelines.productvalidator.ProductValidator` before the
+    :py:class:`src.validation.validationengine.ValidationEngine`.
+    """
+    valid = True
+
+    if product['name']:
+        logger.debug("Product has valid name: '%s'", product)
+    else:
+        logger.warning("Product contains invalid name: '%s'", product)
+        valid = False
+
+    if valid and product['price'] >= 0:
+        logger.debug("Product has valid price: '%s'", product)
+    elif valid:
+        logger.warning("Product contains invalid price: '%s'", product)
+        valid = False
+
+    if valid and validators.url(product['url']) is True:
+        logger.debug("Product has valid URL: '%s'", product)
+    elif valid:
+        logger.warning("Product contains invalid URL: '%s'", product)
+        valid = False
+
+    if valid:
+        logger.debug("Valid Product: '%s'", product)
+    else:
+        logger.warning("Invalid Product: '%s'", product)
+        # Formatted for the notifier and the dropped item
+        "Invalid Product: '%s'" % product
+
+    return valid
+
+
+def measure(name, validate, products):
+    start = time.perf_counter()
+    valid = validate(products)
+    elapsed = time.perf_counter() - start
+    print('%-20s valid=%8d total=%8.3fs per item=%8.2fus' % (name, valid, elapsed, elapsed / len(products) * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the per-item validation cost before and after the engine.')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--invalid-ratio', type=float, default=0.01)
+    arguments = parser.parse_args()
+
+    # Warnings are disabled as the engine does not log per item
+    logging.basicConfig(level=logging.ERROR)
+    products = generate_products(arguments.products, arguments.invalid_ratio)
+
+    measure('before', lambda items: sum(validate_before(item) for item in items), products)
+    engine = ValidationEngine()
+    measure('engine per item', lambda items: sum(engine.validate(item) is None for item in items), products)
@@ -0,0 +1,86 @@
+import argparse
+import random
+import time
+
+from src.structures.productcatalog import ProductCatalog
+from src.structures.watchlist import Watchlist, WatchRule
+
+BRANDS = ['apple', 'samsung', 'xiaomi', 'huawei', 'oppo', 'sony', 'jbl', 'belkin', 'anker', 'garmin', 'fitbit', 'nokia']
+KINDS = ['capa', 'carregador', 'auriculares', 'cabo', 'coluna', 'relogio', 'pelicula', 'suporte', 'bateria',
+         'adaptador']
+ATTRIBUTES = ['pro', 'max', 'mini', 'lite', 'plus', 'ultra', 'preto', 'branco', 'azul', 'rosa', 'wireless', 'usb']
+
+
+def products(count, rng):
+    """
+    :param count: number of products.
+    :param rng: :py:class:`random.Random` of the choices.
+    :return: list of tuples with the name and price of synthetic products.
+    """
+    return [('%s %s %s %s %d' % (rng.choice(KINDS), rng.choice(BRANDS), rng.choice(ATTRIBUTES), rng.choice(ATTRIBUTES),
+                                 rng.randint(1, 500)), round(rng.uniform(1, 1500), 2)) for _ in range(count)]
+
+
+def rules(count, rng):
+    """
+    :param count: number of rules.
+    :param rng: :py:class:`random.Random` of the choices.
+    :return: list of :py:class:`src.structures.watchlist.WatchRule` of 1 to 3 words, most of them with a maximum price.
+    """
+    watch_rules = []
+
+    for index in range(count):
+        words = [rng.choice(KINDS), rng.choice(BRANDS), rng.choice(ATTRIBUTES), str(rng.randint(1, 500))]
+        keywords = ' '.join(rng.sample(words, rng.randint(1, 3)))
+        max_price = round(rng.uniform(5, 500), 2) if rng.random() < 0.8 else None
+        watch_rules.append(WatchRule('U%06d' % (index % 5000), keywords, max_price))
+
+    return watch_rules
+
+
+def linear_match(watch_rules, name, price):
+    """
+    Checks every rule against the product, as a watchlist without an index would.
+
+    :return: sorted list with the subscribers of the rules matched by the product, without repetitions.
+    """
+    keywords = set(ProductCatalog.tokenize(name))
+    return sorted({rule.subscriber for rule in watch_rules
+                   if set(ProductCatalog.tokenize(rule.keywords)) <= keywords
+                   and (rule.max_price is None or price <= rule.max_price)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures how matching products scales with the number of rules.')
+    parser.add_argument('--rules', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--linear-products', type=int, default=200,
+                        help='Number of products also matched by checking every rule, to compare and verify.')
+    arguments = parser.parse_args()
+
+    rng = random.Random(0)
+    catalog = products(arguments.products, rng)
+
+    for count in arguments.rules:
+        watch_rules = rules(count, rng)
+
+        start = time.perf_counter()
+        watchlist = Watchlist(watch_rules)
+        compile_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matches = sum(len(watchlist.match(name, price)) for name, price in catalog)
+        elapsed = time.perf_counter() - start
+
+        sample = catalog[:arguments.linear_products]
+        start = time.perf_counter()
+        for name, price in sample:
+            if linear_match(watch_rules, name, price) != watchlist.match(name, price):
+                raise AssertionError('Watchlist and linear matching differ. product=%r' % ((name, price),))
+        linear_elapsed = time.perf_counter() - start
+
+        # The work of the index grows with the matches, not with the rules, so the time per match stays flat
+        print('rules=%7d compile=%7.1fms index=%8.0f products/s %7.1fus/product %5.2fus/match linear=%8.0f products/s '
+              'matches per product=%.2f' % (count, compile_time * 1000, len(catalog) / elapsed,
+                                            elapsed / len(catalog) * 1e6, elapsed / max(matches, 1) * 1e6,
+                                            len(sample) / linear_elapsed, matches / len(catalog)))
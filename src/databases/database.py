@@ -1,11 +1,48 @@
 from abc import abstractmethod
+from collections import namedtuple
+
+CatalogState = namedtuple('CatalogState', ['etag', 'last_modified', 'content_hash', 'content_length'])
+CatalogState.__doc__ = """
+Validators and hash of the last processed response of a catalog, used to skip unchanged catalogs.
+"""
+
+PriceDrop = namedtuple('PriceDrop', ['name', 'previous_price', 'price'])
+PriceDrop.__doc__ = """
+Product whose price went down, with both prices in cents.
+"""
+
+BatchResult = namedtuple('BatchResult', ['new', 'price_drops'])
+BatchResult.__doc__ = """
+Outcome of writing a batch of products: the set of names of the new products and the list of
+:py:class:`src.databases.database.PriceDrop`.
+"""
+
+RemovedProduct = namedtuple('RemovedProduct', ['name', 'price', 'url', 'catalog'])
+RemovedProduct.__doc__ = """
+Product that was no longer seen in its catalog, with its last price in cents.
+"""
 
 
 class Database:
     """
     Abstract class representing a database.
+
+    Prices are stored in integer cents and every change of price is kept in the history of the product.
+
+    Every scraping run gets an id from :py:meth:`start_run` and stamps it on the products it sees, either when they are
+    written or, for the ones that did not change, with :py:meth:`mark_seen`. At the end of the run,
+    :py:meth:`remove_unseen` marks the products of its catalogs that were not stamped as removed, with a single
+    statement. Removed products are not listed by :py:meth:`products` and they are new again if they reappear.
     """
 
+    @staticmethod
+    def cents(price):
+        """
+        :param price: price in euros.
+        :return: price in integer cents.
+        """
+        return int(round(price * 100))
+
     @abstractmethod
     def __init__(self):
         """
@@ -13,6 +50,15 @@ class Database:
         """
         pass
 
+    @abstractmethod
+    def products(self):
+        """
+        Streams all the stored products that were not removed without loading them all at once in memory.
+
+        :return: iterable of tuples with the name, price in cents and URL of each product.
+        """
+        pass
+
     @abstractmethod
     def insert(self, product):
         """
@@ -23,6 +69,85 @@ class Database:
         """
         pass
 
+    @abstractmethod
+    def insert_many(self, products, run=None):
+        """
+        Inserts the given products in the database in a single transaction. Existent products have their price updated
+        and new prices are appended to the price history.
+
+        :param products: list of :py:class:`src.domain.product.Product` to be inserted.
+        :param run: Optional id of the run that saw the products, stamped on them along with their catalog.
+        :return: :py:class:`src.databases.database.BatchResult` with the products that did not exist before (or were
+        removed) and the ones whose price dropped.
+        """
+        pass
+
+    @abstractmethod
+    def start_run(self):
+        """
+        Registers a new scraping run.
+
+        :return: id of the run, greater than the id of any previous run.
+        """
+        pass
+
+    @abstractmethod
+    def mark_seen(self, run, products):
+        """
+        Stamps the given run and their catalog on the given products, in a single transaction. It is meant for the
+        products that were seen without changes, so they are not written with :py:meth:`insert_many`.
+
+        :param run: id of the run.
+        :param products: list of :py:class:`src.domain.product.Product` seen by the run.
+        """
+        pass
+
+    @abstractmethod
+    def remove_unseen(self, run, catalogs, complete):
+        """
+        Marks as removed, with a single statement, the products of the given catalogs that were not seen by the run, and
+        finishes the run.
+
+        Products stored before their catalog was known are only removed by complete runs.
+
+        :param run: id of the run.
+        :param catalogs: names of the catalogs the run extracted completely.
+        :param complete: whether the run extracted every catalog it requested.
+        :return: list of :py:class:`src.databases.database.RemovedProduct`.
+        """
+        pass
+
+    @abstractmethod
+    def remove_many(self, catalog, names):
+        """
+        Marks the given products of the catalog as removed, with a single statement. Products that moved to another
+        catalog are left alone.
+
+        :param catalog: name of the catalog the products were removed from.
+        :param names: names of the removed products.
+        """
+        pass
+
+    @abstractmethod
+    def catalog_state(self, url):
+        """
+        Retrieves the state of the catalog last processed from the given URL.
+
+        :param url: URL of the catalog.
+        :return: :py:class:`src.databases.database.CatalogState` or None if the catalog was never processed.
+        """
+        pass
+
+    @abstractmethod
+    def save_catalog_state(self, url, state):
+        """
+        Stores the state of the catalog processed from the given URL, replacing the previous one.
+
+        :param url: URL of the catalog.
+        :param state: :py:class:`src.databases.database.CatalogState` to be stored.
+        """
+        pass
+
     @abstractmethod
     def close(self):
         """
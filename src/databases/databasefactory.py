@@ -1,17 +1,52 @@
 import logging
 
-from src.databases.postgresqldatabase import PostgreSqlDatabase
-
 
 class DatabaseFactory:
     """
     https://en.wikipedia.org/wiki/Abstract_factory_pattern
+
+    Vendors are imported only when requested, so their drivers are never loaded if they are not used.
+
+    The `memory` vendor keeps nothing between runs, so every product is new on every run. It is meant for runs whose
+    results are disposable, such as benchmarks and replays of archived runs.
     """
     __logger = logging.getLogger(__name__)
 
-    __vendors = {
-        'postgres': PostgreSqlDatabase
-    }
+    __vendors = ('postgres', 'sqlite', 'memory')
+
+    @staticmethod
+    def __load(vendor):
+        """
+        :param vendor: configured vendor.
+        :return: class of the database of the vendor.
+        """
+        if vendor == 'postgres':
+            from src.databases.postgresqldatabase import PostgreSqlDatabase
+
+            return PostgreSqlDatabase
+        elif vendor == 'sqlite':
+            from src.databases.sqlitedatabase import SqliteDatabase
+
+            return SqliteDatabase
+        elif vendor == 'memory':
+            from src.databases.memorydatabase import MemoryDatabase
+
+            return MemoryDatabase
+        else:
+            raise ValueError("No database for vendor '%s'" % vendor)
+
+    @staticmethod
+    def release(database_url):
+        """
+        Closes the connections that the vendor of the given URL keeps open in this process, if it keeps any. Every
+        database of the URL must have been closed before.
+
+        :param database_url: URL to database.
+        """
+        if database_url[:database_url.find(':')] == 'postgres':
+            from src.databases.postgresqlpool import PostgreSqlPool
+
+            PostgreSqlPool.discard(database_url)
 
     @staticmethod
     def get_database(database_url):
@@ -27,10 +62,10 @@ class DatabaseFactory:
 
         if vendor in DatabaseFactory.__vendors:
             DatabaseFactory.__logger.info("Retrieving database for vendor '%s'", vendor)
-            return DatabaseFactory.__vendors[vendor](database_url)
+            return DatabaseFactory.__load(vendor)(database_url)
         else:
             DatabaseFactory.__logger.error("Requested vendor is not supported! vendor='%s' database_url='%s'",
                                            vendor, database_url)
-            supported_vendors = ','.join(DatabaseFactory.__vendors.keys())
+            supported_vendors = ','.join(DatabaseFactory.__vendors)
             raise ValueError(
                 "Invalid vendor requested! Got '%s' but should be one of '%s'" % (vendor, supported_vendors))
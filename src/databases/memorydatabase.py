@@ -0,0 +1,103 @@
+import logging
+import time
+
+from src.databases.database import BatchResult, Database, PriceDrop, RemovedProduct
+
+
+class MemoryDatabase(Database):
+    """
+    Database that only lives in memory, for runs that must not touch the network or the disk, such as benchmarks.
+    Nothing is persisted, so every product is new on every run.
+
+    Prices are stored in cents and their history is kept, the same way as
+    :py:class:`src.databases.postgresqldatabase.PostgreSqlDatabase` does.
+    """
+    __logger = logging.getLogger(__name__)
+
+    def __init__(self, database_url):
+        super().__init__()
+        self.rows = {}
+        self.price_history = []
+        self.catalog_states = {}
+        # Catalog and last run that saw each product, and the names of the removed ones
+        self.sightings = {}
+        self.removed = set()
+        self.last_run = 0
+        MemoryDatabase.__logger.warning('Memory database created. Nothing is persisted, every product is new.')
+
+    def products(self):
+        for name, (price, url) in self.rows.items():
+            if name not in self.removed:
+                yield name, price, url
+
+    def insert(self, product):
+        return product['name'] in self.insert_many([product]).new
+
+    def insert_many(self, products, run=None):
+        new_product_names = set()
+        price_drops = []
+        recorded_at = time.time()
+
+        for product in products:
+            name = product['name']
+            price = Database.cents(product['price'])
+            previous_price = self.rows[name][0] if name in self.rows else None
+            reappeared = name in self.removed
+
+            self.rows[name] = (price, product['url'])
+            self.removed.discard(name)
+            self.__stamp(name, product, run)
+
+            if previous_price == price and not reappeared:
+                continue
+
+            if previous_price != price:
+                self.price_history.append((name, recorded_at, price))
+
+            if previous_price is None or reappeared:
+                new_product_names.add(name)
+            elif price < previous_price:
+                price_drops.append(PriceDrop(name, previous_price, price))
+
+        return BatchResult(new_product_names, price_drops)
+
+    def start_run(self):
+        self.last_run += 1
+        return self.last_run
+
+    def mark_seen(self, run, products):
+        for product in products:
+            if product['name'] in self.rows:
+                self.__stamp(product['name'], product, run)
+
+    def remove_unseen(self, run, catalogs, complete):
+        removed_products = []
+
+        for name, (catalog, last_seen_run) in self.sightings.items():
+            in_scope = catalog in catalogs or (complete and catalog is None)
+            if name in self.removed or last_seen_run == run or not in_scope:
+                continue
+
+            price, url = self.rows[name]
+            removed_products.append(RemovedProduct(name, price, url, catalog))
+
+        self.removed.update(removed.name for removed in removed_products)
+        return removed_products
+
+    def remove_many(self, catalog, names):
+        for name in names:
+            if name in self.sightings and self.sightings[name][0] in (catalog, None):
+                self.removed.add(name)
+
+    def __stamp(self, name, product, run):
+        catalog, last_seen_run = self.sightings.get(name, (None, None))
+        self.sightings[name] = (product.get('catalog') or catalog, run if run is not None else last_seen_run)
+
+    def catalog_state(self, url):
+        return self.catalog_states.get(url)
+
+    def save_catalog_state(self, url, state):
+        self.catalog_states[url] = state
+
+    def close(self):
+        MemoryDatabase.__logger.info('Memory database closed. products=%d', len(self.rows))
@@ -1,30 +1,128 @@
 import logging
 
-import psycopg2
-
-from src.databases.database import Database
+from src.databases.database import BatchResult, CatalogState, Database, PriceDrop, RemovedProduct
+from src.databases.postgresqlpool import PostgreSqlPool
 
 
 class PostgreSqlDatabase(Database):
+    """
+    Connections are borrowed from a :py:class:`src.databases.postgresqlpool.PostgreSqlPool` and given back on
+    :py:meth:`close`. The schema is only checked by the first database of the process and the upsert of the products is
+    prepared once per connection.
+    """
     __logger = logging.getLogger(__name__)
 
+    PRODUCTS_CHUNK_SIZE = 10000
+
+    # Statements that bring the schema from each version to the next one. They are applied in order and only once.
+    MIGRATIONS = [
+        # 1: prices in integer cents and an append-only history of prices. The history is only ever appended to in
+        # time order, so a BRIN index keeps time range scans cheap while costing next to nothing on writes.
+        '''
+        alter table vodafone.products alter column price type integer using round(price::numeric * 100)::integer;
+
+        create table vodafone.price_history(
+            product_id  integer   not null constraint price_history_products_fk references vodafone.products (id),
+            recorded_at TIMESTAMP not null default CURRENT_TIMESTAMP,
+            price       integer   not null,
+            constraint price_history_pk primary key (product_id, recorded_at));
+
+        create index price_history_recorded_at_brin on vodafone.price_history using brin (recorded_at);
+
+        insert into vodafone.price_history (product_id, recorded_at, price)
+            select id, coalesce(created_at, CURRENT_TIMESTAMP), price from vodafone.products;
+        ''',
+        # 2: runs, and the catalog and last run that saw each product, to find the removed products of a run. The
+        # partial index only covers the products that are still available, which are the only ones a run looks at.
+        '''
+        create table vodafone.runs(
+            id          serial    not null constraint runs_pk primary key,
+            started_at  TIMESTAMP not null default CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP);
+
+        alter table vodafone.products
+            add column catalog       text,
+            add column last_seen_run integer,
+            add column removed_at    TIMESTAMP;
+
+        create index products_catalog_last_seen_run_index on vodafone.products (catalog, last_seen_run)
+            where removed_at is null;
+        '''
+    ]
+
+    # The products are passed as four arrays and the run, so the same prepared statement serves batches of any size.
+    # Every part of the statement sees the same snapshot, so `previous` holds the prices from before the upsert.
+    # Unchanged products are not rewritten and xmax is only zero for freshly inserted tuples. Removed products that
+    # are seen again are reported as inserted, but their history only grows if their price changed.
+    UPSERT_PRODUCTS = 'vodafone_upsert_products'
+    PREPARE_UPSERT_PRODUCTS = '''
+        PREPARE vodafone_upsert_products (text[], integer[], text[], text[], integer) AS
+            WITH batch AS (
+                SELECT * FROM unnest($1, $2, $3, $4) AS batch (name, price, url, catalog)),
+            previous AS (
+                SELECT products.id, products.price, products.removed_at FROM vodafone.products JOIN batch USING (name)),
+            upserted AS (
+                INSERT INTO vodafone.products (name, price, url, catalog, last_seen_run)
+                    SELECT name, price, url, catalog, $5 FROM batch
+                    ON CONFLICT (name) DO UPDATE SET price=EXCLUDED.price, url=EXCLUDED.url,
+                        catalog=coalesce(EXCLUDED.catalog, products.catalog),
+                        last_seen_run=coalesce(EXCLUDED.last_seen_run, products.last_seen_run), removed_at=NULL
+                        WHERE (products.price, products.url, products.catalog, products.last_seen_run,
+                               products.removed_at)
+                            IS DISTINCT FROM (EXCLUDED.price, EXCLUDED.url,
+                                              coalesce(EXCLUDED.catalog, products.catalog),
+                                              coalesce(EXCLUDED.last_seen_run, products.last_seen_run), NULL)
+                    RETURNING id, name, price, (xmax = 0) AS inserted),
+            changed AS (
+                SELECT upserted.id, upserted.name, upserted.price,
+                       upserted.inserted OR previous.removed_at IS NOT NULL AS inserted,
+                       previous.price AS previous_price, previous.price IS DISTINCT FROM upserted.price AS repriced
+                    FROM upserted LEFT JOIN previous USING (id)
+                    WHERE previous.price IS DISTINCT FROM upserted.price OR previous.removed_at IS NOT NULL),
+            history AS (
+                INSERT INTO vodafone.price_history (product_id, price) SELECT id, price FROM changed WHERE repriced)
+            SELECT name, inserted, previous_price, price FROM changed;
+    '''
+
+    # URLs of the databases whose schema is known to be up to date in this process
+    __initialized_urls = set()
+
     def __init__(self, database_url):
         super().__init__()
         try:
-            self.connection = psycopg2.connect(database_url, sslmode='require')
+            self.pool = PostgreSqlPool.get(database_url)
+            self.connection = self.pool.borrow()
             self.connection.autocommit = False
             self.cursor = self.connection.cursor()
         except Exception as exception:
-            if self.connection:
-                self.close()
-
             PostgreSqlDatabase.__logger.error("Could not connect to database! url='%s' exception='%s'",
                                               database_url, exception)
             raise exception
 
         PostgreSqlDatabase.__logger.info('PostgreSQL database connected.')
-        self.__init_schema()
-        self.__init_table()
+
+        if database_url not in PostgreSqlDatabase.__initialized_urls:
+            if not self.__is_schema_current():
+                self.__init_schema()
+                self.__init_table()
+                self.__migrate()
+            PostgreSqlDatabase.__initialized_urls.add(database_url)
+
+    def __is_schema_current(self):
+        """
+        :return: True if the schema exists and has every migration applied.
+        """
+        self.cursor.execute("SELECT to_regclass('vodafone.schema_version') IS NOT NULL;")
+        version = None
+
+        if self.cursor.fetchone()[0]:
+            self.cursor.execute('SELECT version FROM vodafone.schema_version;')
+            row = self.cursor.fetchone()
+            version = row[0] if row else None
+
+        self.connection.commit()
+
+        return version == len(PostgreSqlDatabase.MIGRATIONS)
 
     def __init_schema(self):
         """
@@ -36,7 +134,7 @@ class PostgreSqlDatabase(Database):
 
     def __init_table(self):
         """
-        Creates the table for the products if it does not exist.
+        Creates the tables for the products and the catalogs if they do not exist.
         """
         create_table = '''
         create table if not exists vodafone.products(
@@ -47,37 +145,185 @@ class PostgreSqlDatabase(Database):
             url         text   not null);
 
         create unique index if not exists products_name_uindex on vodafone.products (name);
+
+        create table if not exists vodafone.catalogs(
+            url             text   not null constraint catalogs_pk primary key,
+            updated_at      TIMESTAMP default CURRENT_TIMESTAMP,
+            etag            text,
+            last_modified   text,
+            content_hash    text   not null,
+            content_length  bigint not null);
         '''
         self.cursor.execute(create_table)
         self.connection.commit()
-        PostgreSqlDatabase.__logger.info('Created table.')
+        PostgreSqlDatabase.__logger.info('Created tables.')
+
+    def __migrate(self):
+        """
+        Applies the migrations the schema is missing. Concurrent connections wait for each other on the lock of the
+        version table.
+        """
+        self.cursor.execute('''
+            create table if not exists vodafone.schema_version(version integer not null);
+            LOCK TABLE vodafone.schema_version IN EXCLUSIVE MODE;
+            SELECT version FROM vodafone.schema_version;
+        ''')
+        row = self.cursor.fetchone()
+
+        if row is None:
+            self.cursor.execute('INSERT INTO vodafone.schema_version (version) VALUES (0);')
+
+        version = row[0] if row else 0
+
+        for number, migration in enumerate(PostgreSqlDatabase.MIGRATIONS[version:], version + 1):
+            self.cursor.execute(migration)
+            self.cursor.execute('UPDATE vodafone.schema_version SET version=%(version)s;', {'version': number})
+            PostgreSqlDatabase.__logger.info('Migrated schema. version=%d', number)
+
+        self.connection.commit()
+
+    def products(self):
+        # Named cursors are server-side, so rows are fetched in chunks of itersize instead of all at once
+        with self.connection.cursor(name='vodafone_products_index') as cursor:
+            cursor.itersize = PostgreSqlDatabase.PRODUCTS_CHUNK_SIZE
+            cursor.execute('SELECT name, price, url FROM vodafone.products WHERE removed_at IS NULL;')
+            yield from cursor
+
+        self.connection.commit()
 
     def insert(self, product):
-        query_parameters = {
-            'name': product['name'],
-            'price': product['price'],
-            'url': product['url']
-        }
+        return product['name'] in self.insert_many([product]).new
 
-        self.cursor.execute('SELECT EXISTS(SELECT 1 from vodafone.products WHERE name=%(name)s);', query_parameters)
+    def insert_many(self, products, run=None):
+        if not products:
+            return BatchResult(set(), [])
 
-        did_the_product_already_exist = self.cursor.fetchone()[0]
+        # A single statement cannot update the same row twice, so only the last occurrence of each name is kept
+        rows = list({product['name']: (product['name'], Database.cents(product['price']), product['url'],
+                                       product.get('catalog'))
+                     for product in products}.values())
 
-        self.cursor.execute('''
-            INSERT INTO vodafone.products (name, price, url) VALUES (%(name)s, %(price)s, %(url)s)
-                ON CONFLICT (name) DO UPDATE SET price=%(price)s;
-        ''', query_parameters)
+        try:
+            if PostgreSqlDatabase.UPSERT_PRODUCTS not in self.connection.prepared_statements:
+                self.cursor.execute(PostgreSqlDatabase.PREPARE_UPSERT_PRODUCTS)
+                self.connection.prepared_statements.add(PostgreSqlDatabase.UPSERT_PRODUCTS)
+
+            names, prices, urls, catalogs = (list(column) for column in zip(*rows))
+            self.cursor.execute('EXECUTE vodafone_upsert_products (%s, %s, %s, %s, %s);',
+                                (names, prices, urls, catalogs, run))
+            changed_rows = self.cursor.fetchall()
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            PostgreSqlDatabase.__logger.error("Could not insert batch of products! size=%d exception='%s'",
+                                              len(rows), exception)
+            raise exception
+
+        new_product_names = {name for name, inserted, _, _ in changed_rows if inserted}
+        price_drops = [PriceDrop(name, previous_price, price) for name, inserted, previous_price, price in changed_rows
+                       if not inserted and price < previous_price]
+
+        PostgreSqlDatabase.__logger.debug("Inserted batch of products in database. size=%d new=%d price_drops=%d",
+                                          len(rows), len(new_product_names), len(price_drops))
+
+        return BatchResult(new_product_names, price_drops)
+
+    def start_run(self):
+        self.cursor.execute('INSERT INTO vodafone.runs DEFAULT VALUES RETURNING id;')
+        run = self.cursor.fetchone()[0]
+        self.connection.commit()
+
+        return run
+
+    def mark_seen(self, run, products):
+        if not products:
+            return
+
+        seen = dict((product['name'], product.get('catalog')) for product in products)
+
+        # Only the products that were not stamped yet are rewritten
+        try:
+            self.cursor.execute('''
+                UPDATE vodafone.products SET last_seen_run=%(run)s, catalog=coalesce(seen.catalog, products.catalog)
+                    FROM unnest(%(names)s::text[], %(catalogs)s::text[]) AS seen (name, catalog)
+                    WHERE products.name = seen.name AND products.last_seen_run IS DISTINCT FROM %(run)s;
+            ''', {'run': run, 'names': list(seen), 'catalogs': list(seen.values())})
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            PostgreSqlDatabase.__logger.error("Could not mark products as seen! run=%d size=%d exception='%s'",
+                                              run, len(seen), exception)
+            raise exception
+
+        PostgreSqlDatabase.__logger.debug("Marked products as seen. run=%d size=%d", run, len(seen))
 
+    def remove_unseen(self, run, catalogs, complete):
+        try:
+            self.cursor.execute('''
+                WITH removed AS (
+                    UPDATE vodafone.products SET removed_at=CURRENT_TIMESTAMP
+                        WHERE removed_at IS NULL AND last_seen_run IS DISTINCT FROM %(run)s
+                            AND (catalog = ANY(%(catalogs)s::text[]) OR (%(complete)s AND catalog IS NULL))
+                        RETURNING name, price, url, catalog),
+                finished AS (
+                    UPDATE vodafone.runs SET finished_at=CURRENT_TIMESTAMP WHERE id=%(run)s)
+                SELECT name, price, url, catalog FROM removed;
+            ''', {'run': run, 'catalogs': sorted(catalogs), 'complete': complete})
+            rows = self.cursor.fetchall()
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            PostgreSqlDatabase.__logger.error("Could not remove unseen products! run=%d exception='%s'", run, exception)
+            raise exception
+
+        PostgreSqlDatabase.__logger.debug("Removed unseen products. run=%d removed=%d", run, len(rows))
+
+        return [RemovedProduct(*row) for row in rows]
+
+    def remove_many(self, catalog, names):
+        if not names:
+            return
+
+        try:
+            self.cursor.execute('''
+                UPDATE vodafone.products SET removed_at=CURRENT_TIMESTAMP
+                    WHERE removed_at IS NULL AND (catalog = %(catalog)s OR catalog IS NULL)
+                        AND name = ANY(%(names)s::text[]);
+            ''', {'catalog': catalog, 'names': list(names)})
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            PostgreSqlDatabase.__logger.error("Could not remove products! catalog='%s' size=%d exception='%s'",
+                                              catalog, len(names), exception)
+            raise exception
+
+        PostgreSqlDatabase.__logger.debug("Removed products. catalog='%s' size=%d", catalog, len(names))
+
+    def catalog_state(self, url):
+        self.cursor.execute(
+            'SELECT etag, last_modified, content_hash, content_length FROM vodafone.catalogs WHERE url=%(url)s;',
+            {'url': url})
+
+        row = self.cursor.fetchone()
         self.connection.commit()
 
-        if did_the_product_already_exist:
-            PostgreSqlDatabase.__logger.debug("Updated price of existent product in database. product='%s'", product)
-        else:
-            PostgreSqlDatabase.__logger.debug("Added new product to the database. product='%s'", product)
+        return CatalogState(*row) if row else None
+
+    def save_catalog_state(self, url, state):
+        query_parameters = dict(state._asdict(), url=url)
 
-        return not did_the_product_already_exist
+        self.cursor.execute('''
+            INSERT INTO vodafone.catalogs (url, etag, last_modified, content_hash, content_length)
+                VALUES (%(url)s, %(etag)s, %(last_modified)s, %(content_hash)s, %(content_length)s)
+                ON CONFLICT (url) DO UPDATE SET updated_at=CURRENT_TIMESTAMP, etag=EXCLUDED.etag,
+                    last_modified=EXCLUDED.last_modified, content_hash=EXCLUDED.content_hash,
+                    content_length=EXCLUDED.content_length;
+        ''', query_parameters)
+
+        self.connection.commit()
+        PostgreSqlDatabase.__logger.debug("Saved catalog state. url='%s' state='%s'", url, state)
 
     def close(self):
         self.cursor.close()
-        self.connection.close()
-        PostgreSqlDatabase.__logger.info('PostgreSQL database connection closed.')
+        self.pool.give_back(self.connection)
+        PostgreSqlDatabase.__logger.info('PostgreSQL database connection given back to the pool.')
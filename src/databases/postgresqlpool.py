@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import connection as Connection
+from psycopg2.pool import ThreadedConnectionPool
+
+
+class PooledConnection(Connection):
+    """
+    PostgreSQL connection that remembers the statements prepared on it and when it was last given back to the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.last_used = time.monotonic()
+
+
+class PostgreSqlPool:
+    """
+    Pool of warm PostgreSQL connections, shared by every database of the process with the same URL.
+
+    Connections are opened when the pool is created, so the TLS handshake and the authentication are not paid by the
+    runs that borrow them. Connections that were idle for longer than `HEALTH_CHECK_INTERVAL` are checked before being
+    borrowed and replaced if the server dropped them.
+
+    The pool lives as long as its process. Scraping processes run a single job (see :py:func:`src.scheduler.work`), so
+    their connections are opened before each job instead of being kept across jobs. Processes that only use the
+    database now and then should :py:meth:`discard` the pool once they are done, so no connection is left open.
+    """
+    __logger = logging.getLogger(__name__)
+
+    # The spider and the SaveToDatabase pipeline hold a connection each during a run
+    MIN_CONNECTIONS = 2
+    MAX_CONNECTIONS = 8
+    # Seconds a connection may be idle before it is checked again
+    HEALTH_CHECK_INTERVAL = 30
+
+    __pools = {}
+    __pools_lock = threading.Lock()
+
+    @staticmethod
+    def get(database_url):
+        """
+        :param database_url: URL of the database.
+        :return: the pool of the given database, created if it is the first time it is requested.
+        """
+        with PostgreSqlPool.__pools_lock:
+            if database_url not in PostgreSqlPool.__pools:
+                PostgreSqlPool.__pools[database_url] = PostgreSqlPool(database_url)
+
+            return PostgreSqlPool.__pools[database_url]
+
+    @staticmethod
+    def discard(database_url):
+        """
+        Closes every connection of the pool of the given database, if there is one, and forgets it. Connections still
+        borrowed are closed as well, so no database of the pool can be in use.
+
+        :param database_url: URL of the database.
+        """
+        with PostgreSqlPool.__pools_lock:
+            pool = PostgreSqlPool.__pools.pop(database_url, None)
+
+        if pool is not None:
+            pool.pool.closeall()
+            PostgreSqlPool.__logger.info('PostgreSQL connection pool closed.')
+
+    def __init__(self, database_url):
+        """
+        Opens the minimum number of connections.
+
+        :param database_url: URL of the database.
+        """
+        self.pool = ThreadedConnectionPool(PostgreSqlPool.MIN_CONNECTIONS, PostgreSqlPool.MAX_CONNECTIONS,
+                                           database_url, sslmode='require', connection_factory=PooledConnection)
+        PostgreSqlPool.__logger.info('PostgreSQL connection pool created. connections=%d',
+                                     PostgreSqlPool.MIN_CONNECTIONS)
+
+    def borrow(self):
+        """
+        Throws :py:class:`psycopg2.OperationalError` if no healthy connection could be borrowed.
+
+        :return: a healthy :py:class:`src.databases.postgresqlpool.PooledConnection`.
+        """
+        for _ in range(PostgreSqlPool.MAX_CONNECTIONS + 1):
+            connection = self.pool.getconn()
+
+            if PostgreSqlPool.healthy(connection):
+                return connection
+
+            self.pool.putconn(connection, close=True)
+
+        raise psycopg2.OperationalError('Could not borrow a healthy connection from the pool!')
+
+    def give_back(self, connection):
+        """
+        Returns the connection to the pool. Unfinished transactions are rolled back.
+
+        :param connection: connection borrowed with :py:meth:`borrow`.
+        """
+        connection.last_used = time.monotonic()
+        self.pool.putconn(connection)
+
+    @staticmethod
+    def healthy(connection):
+        """
+        :param connection: :py:class:`src.databases.postgresqlpool.PooledConnection` to be checked.
+        :return: False if the connection is closed or does not answer, True otherwise.
+        """
+        if connection.closed:
+            return False
+
+        if time.monotonic() - connection.last_used < PostgreSqlPool.HEALTH_CHECK_INTERVAL:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1;')
+            connection.rollback()
+            return True
+        except psycopg2.Error as error:
+            PostgreSqlPool.__logger.warning("Discarding unhealthy PostgreSQL connection. error='%s'", error)
+            return False
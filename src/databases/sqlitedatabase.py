@@ -0,0 +1,257 @@
+import json
+import logging
+import sqlite3
+
+from src.databases.database import BatchResult, CatalogState, Database, PriceDrop, RemovedProduct
+
+
+class SqliteDatabase(Database):
+    """
+    Database embedded in the process, for single node deployments and runs with no network I/O.
+
+    The URL is `sqlite:` followed by the path of the file, e.g. `sqlite:///var/lib/vodafone.db` or `sqlite:vodafone.db`.
+    `sqlite::memory:` keeps everything in memory, separately for each connection.
+
+    The file is in WAL mode, so the readers never block the writer. Each batch is written in a single transaction and
+    every statement is constant, so they are compiled once and reused from the statement cache of the connection.
+
+    Removed products are detected and returned by a single `UPDATE ... RETURNING`, which requires SQLite 3.35 or newer.
+    """
+    __logger = logging.getLogger(__name__)
+
+    # Statements that bring the schema from each version to the next one, starting at version 1. They are applied in
+    # order and only once.
+    MIGRATIONS = [
+        # 2: runs, and the catalog and last run that saw each product, to find the removed products of a run. The
+        # partial index only covers the products that are still available, which are the only ones a run looks at.
+        [
+            '''
+            create table if not exists runs(
+                id          integer not null constraint runs_pk primary key autoincrement,
+                started_at  TIMESTAMP not null default CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP);
+            ''',
+            'alter table products add column catalog text;',
+            'alter table products add column last_seen_run integer;',
+            'alter table products add column removed_at TIMESTAMP;',
+            '''
+            create index if not exists products_catalog_last_seen_run_index on products (catalog, last_seen_run)
+                where removed_at is null;
+            '''
+        ]
+    ]
+
+    # Version of the schema created by this class, stored in the user_version of the file
+    SCHEMA_VERSION = 1 + len(MIGRATIONS)
+
+    def __init__(self, database_url):
+        super().__init__()
+        path = database_url[len('sqlite:'):]
+        if path.startswith('//'):
+            path = path[2:]
+
+        try:
+            # Transactions are managed explicitly
+            self.connection = sqlite3.connect(path, isolation_level=None)
+        except Exception as exception:
+            SqliteDatabase.__logger.error("Could not open database! url='%s' exception='%s'", database_url, exception)
+            raise exception
+
+        # WAL only needs to sync on checkpoints to be durable, so NORMAL is enough
+        self.connection.execute('PRAGMA journal_mode=WAL;')
+        self.connection.execute('PRAGMA synchronous=NORMAL;')
+        self.connection.execute('PRAGMA foreign_keys=ON;')
+
+        SqliteDatabase.__logger.info("SQLite database opened. path='%s'", path)
+        self.__init_table()
+
+    def __init_table(self):
+        """
+        Creates the tables for the products, their prices and the catalogs if they do not exist.
+        """
+        self.connection.executescript('''
+        BEGIN;
+
+        create table if not exists products(
+            id          integer not null constraint products_pk primary key,
+            created_at  TIMESTAMP default CURRENT_TIMESTAMP,
+            name        text    not null,
+            price       integer not null,
+            url         text    not null);
+
+        create unique index if not exists products_name_uindex on products (name);
+
+        create table if not exists price_history(
+            product_id  integer not null constraint price_history_products_fk references products (id),
+            recorded_at TIMESTAMP not null default (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            price       integer not null);
+
+        create index if not exists price_history_product_id_recorded_at_index
+            on price_history (product_id, recorded_at);
+
+        create table if not exists catalogs(
+            url             text    not null constraint catalogs_pk primary key,
+            updated_at      TIMESTAMP default CURRENT_TIMESTAMP,
+            etag            text,
+            last_modified   text,
+            content_hash    text    not null,
+            content_length  integer not null);
+
+        COMMIT;
+        ''')
+        SqliteDatabase.__logger.info('Created tables.')
+        self.__migrate()
+
+    def __migrate(self):
+        """
+        Applies the migrations the file is missing. Files created before the schema was versioned are at version 1.
+        Concurrent connections wait for each other on the write lock of the file.
+        """
+        self.connection.execute('BEGIN IMMEDIATE;')
+        version = max(self.connection.execute('PRAGMA user_version;').fetchone()[0], 1)
+
+        try:
+            for number, migration in enumerate(SqliteDatabase.MIGRATIONS[version - 1:], version + 1):
+                for statement in migration:
+                    self.connection.execute(statement)
+                SqliteDatabase.__logger.info('Migrated schema. version=%d', number)
+
+            self.connection.execute('PRAGMA user_version=%d;' % SqliteDatabase.SCHEMA_VERSION)
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            SqliteDatabase.__logger.error("Could not migrate schema! version=%d exception='%s'", version, exception)
+            raise exception
+
+    def products(self):
+        yield from self.connection.execute('SELECT name, price, url FROM products WHERE removed_at IS NULL;')
+
+    def insert(self, product):
+        return product['name'] in self.insert_many([product]).new
+
+    def insert_many(self, products, run=None):
+        if not products:
+            return BatchResult(set(), [])
+
+        # Only the last occurrence of each name is kept, the same way as the other databases do
+        rows = {product['name']: (product['name'], Database.cents(product['price']), product['url'],
+                                  product.get('catalog'), run)
+                for product in products}
+
+        try:
+            self.connection.execute('BEGIN IMMEDIATE;')
+
+            # The names are passed as a single JSON array, so the statement is the same regardless of the batch size
+            previous = {name: (price, removed) for name, price, removed in self.connection.execute('''
+                SELECT name, price, removed_at IS NOT NULL FROM products
+                    WHERE name IN (SELECT value FROM json_each(?));
+            ''', (json.dumps(list(rows)),))}
+            previous_prices = {name: price for name, (price, _) in previous.items()}
+            reappeared = {name for name, (_, removed) in previous.items() if removed}
+
+            # Products that are seen again lose their removal and keep their catalog if the batch does not know it
+            self.connection.executemany('''
+                INSERT INTO products (name, price, url, catalog, last_seen_run) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET price=excluded.price, url=excluded.url,
+                        catalog=coalesce(excluded.catalog, products.catalog),
+                        last_seen_run=coalesce(excluded.last_seen_run, products.last_seen_run), removed_at=NULL
+                        WHERE (products.price, products.url, products.catalog, products.last_seen_run,
+                               products.removed_at)
+                            IS NOT (excluded.price, excluded.url, coalesce(excluded.catalog, products.catalog),
+                                    coalesce(excluded.last_seen_run, products.last_seen_run), NULL);
+            ''', rows.values())
+
+            changed_rows = [(name, price) for name, price, _, _, _ in rows.values()
+                            if previous_prices.get(name) != price or name in reappeared]
+
+            self.connection.executemany(
+                'INSERT INTO price_history (product_id, price) SELECT id, ? FROM products WHERE name=?;',
+                [(price, name) for name, price in changed_rows if previous_prices.get(name) != price])
+
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            SqliteDatabase.__logger.error("Could not insert batch of products! size=%d exception='%s'",
+                                          len(rows), exception)
+            raise exception
+
+        new_product_names = {name for name, _ in changed_rows if name not in previous_prices or name in reappeared}
+        price_drops = [PriceDrop(name, previous_prices[name], price) for name, price in changed_rows
+                       if name in previous_prices and name not in reappeared and price < previous_prices[name]]
+
+        SqliteDatabase.__logger.debug("Inserted batch of products in database. size=%d new=%d price_drops=%d",
+                                      len(rows), len(new_product_names), len(price_drops))
+
+        return BatchResult(new_product_names, price_drops)
+
+    def start_run(self):
+        return self.connection.execute('INSERT INTO runs DEFAULT VALUES RETURNING id;').fetchone()[0]
+
+    def mark_seen(self, run, products):
+        if not products:
+            return
+
+        # Only the products that were not stamped yet are rewritten
+        self.connection.execute('''
+            UPDATE products SET last_seen_run=:run, catalog=coalesce(seen.catalog, products.catalog)
+                FROM (SELECT json_extract(value, '$[0]') AS name, json_extract(value, '$[1]') AS catalog
+                      FROM json_each(:products)) AS seen
+                WHERE products.name = seen.name AND products.last_seen_run IS NOT :run;
+        ''', {'run': run, 'products': json.dumps([[product['name'], product.get('catalog')] for product in products])})
+
+        SqliteDatabase.__logger.debug("Marked products as seen. run=%d size=%d", run, len(products))
+
+    def remove_unseen(self, run, catalogs, complete):
+        try:
+            self.connection.execute('BEGIN IMMEDIATE;')
+
+            rows = self.connection.execute('''
+                UPDATE products SET removed_at=CURRENT_TIMESTAMP
+                    WHERE removed_at IS NULL AND last_seen_run IS NOT :run
+                        AND (catalog IN (SELECT value FROM json_each(:catalogs)) OR (:complete AND catalog IS NULL))
+                    RETURNING name, price, url, catalog;
+            ''', {'run': run, 'catalogs': json.dumps(sorted(catalogs)), 'complete': complete}).fetchall()
+
+            self.connection.execute('UPDATE runs SET finished_at=CURRENT_TIMESTAMP WHERE id=?;', (run,))
+            self.connection.commit()
+        except Exception as exception:
+            self.connection.rollback()
+            SqliteDatabase.__logger.error("Could not remove unseen products! run=%d exception='%s'", run, exception)
+            raise exception
+
+        SqliteDatabase.__logger.debug("Removed unseen products. run=%d removed=%d", run, len(rows))
+
+        return [RemovedProduct(*row) for row in rows]
+
+    def remove_many(self, catalog, names):
+        if not names:
+            return
+
+        self.connection.execute('''
+            UPDATE products SET removed_at=CURRENT_TIMESTAMP
+                WHERE removed_at IS NULL AND (catalog = :catalog OR catalog IS NULL)
+                    AND name IN (SELECT value FROM json_each(:names));
+        ''', {'catalog': catalog, 'names': json.dumps(list(names))})
+
+        SqliteDatabase.__logger.debug("Removed products. catalog='%s' size=%d", catalog, len(names))
+
+    def catalog_state(self, url):
+        row = self.connection.execute(
+            'SELECT etag, last_modified, content_hash, content_length FROM catalogs WHERE url=?;', (url,)).fetchone()
+
+        return CatalogState(*row) if row else None
+
+    def save_catalog_state(self, url, state):
+        self.connection.execute('''
+            INSERT INTO catalogs (url, etag, last_modified, content_hash, content_length)
+                VALUES (:url, :etag, :last_modified, :content_hash, :content_length)
+                ON CONFLICT (url) DO UPDATE SET updated_at=CURRENT_TIMESTAMP, etag=excluded.etag,
+                    last_modified=excluded.last_modified, content_hash=excluded.content_hash,
+                    content_length=excluded.content_length;
+        ''', dict(state._asdict(), url=url))
+
+        SqliteDatabase.__logger.debug("Saved catalog state. url='%s' state='%s'", url, state)
+
+    def close(self):
+        self.connection.close()
+        SqliteDatabase.__logger.info('SQLite database closed.')
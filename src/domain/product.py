@@ -1,14 +1,109 @@
 import scrapy
+from scrapy.item import BaseItem
 
 
-class Product(scrapy.Item):
+class Product(BaseItem):
     """
-    Domain representation of a Product with name, price and URL.
+    Domain representation of a Product with name, price and URL, tagged with the catalog it was found in.
+
+    It is created for every variant of the catalog and formatted by the logs of every pipeline, so it is kept as small
+    and as cheap as possible: the fields live in slots instead of a dict and the representation is only built once.
+    Fields are read and written like the ones of a :py:class:`scrapy.Item`. Use :py:meth:`to_item` and
+    :py:meth:`from_item` where an actual :py:class:`scrapy.Item` is needed.
+    """
+    # BaseItem has no slots, so the instances still have room for a dict. It is never allocated as every attribute is a
+    # slot.
+    __slots__ = ('name', 'price', 'url', 'catalog', '_repr')
+
+    FIELDS = ('name', 'price', 'url', 'catalog')
+
+    def __new__(cls, *args, **kwargs):
+        # BaseItem keeps a weak reference and a timestamp of every instance for the telnet console, which is disabled
+        return object.__new__(cls)
+
+    def __init__(self, name=None, price=None, url=None, catalog=None):
+        # The slots are filled straight away, as there is no representation to invalidate yet
+        set_slot = object.__setattr__
+        set_slot(self, 'name', name)
+        set_slot(self, 'price', price)
+        set_slot(self, 'url', url)
+        set_slot(self, 'catalog', catalog)
+        set_slot(self, '_repr', None)
+
+    def __setattr__(self, key, value):
+        # Every write of a field, as an attribute or as an item, invalidates the cached representation
+        object.__setattr__(self, key, value)
+        if key in Product.FIELDS:
+            object.__setattr__(self, '_repr', None)
+
+    def __getitem__(self, key):
+        if key not in Product.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in Product.FIELDS:
+            raise KeyError("Product does not support field: %s" % key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in Product.FIELDS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = self[key] if key in Product.FIELDS else None
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key in Product.FIELDS if getattr(self, key) is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in Product.FIELDS)
+
+    def __hash__(self):
+        # Consistent with __eq__, so a product must not be changed while it is in a set or is a key of a dict
+        return hash((self.name, self.price, self.url, self.catalog))
+
+    def __repr__(self):
+        if self._repr is None:
+            self._repr = "{'name': %r, 'price': %r, 'url': %r, 'catalog': %r}" % (
+                self.name, self.price, self.url, self.catalog)
+        return self._repr
+
+    __str__ = __repr__
+
+    def to_item(self):
+        """
+        :return: :py:class:`src.domain.product.ProductItem` with the same fields.
+        """
+        return ProductItem({key: getattr(self, key) for key in self.keys()})
+
+    @staticmethod
+    def from_item(item):
+        """
+        :param item: :py:class:`scrapy.Item` or dict with the fields of a product.
+        :return: :py:class:`src.domain.product.Product` with the same fields.
+        """
+        return Product(**{key: item.get(key) for key in Product.FIELDS})
+
+
+class ProductItem(scrapy.Item):
+    """
+    :py:class:`scrapy.Item` with the same fields of :py:class:`src.domain.product.Product`, for the parts of Scrapy
+    that require one, such as item loaders and feed exporters.
     """
 
     name = scrapy.Field()
     price = scrapy.Field()
     url = scrapy.Field()
+    catalog = scrapy.Field()
 
     def __str__(self):
-        return super.__str__(self).replace('\n', '')
+        return super().__str__().replace('\n', '')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 class EnvironmentVariables:
@@ -8,14 +9,69 @@ class EnvironmentVariables:
     PORT_ARG = 'PORT'
     PORT = os.getenv(PORT_ARG)
 
+    METRICS_ARG = 'METRICS'
+    METRICS = os.getenv(METRICS_ARG)
+
+    SCRAPE_MIN_INTERVAL_ARG = 'SCRAPE_MIN_INTERVAL'
+    SCRAPE_MIN_INTERVAL = os.getenv(SCRAPE_MIN_INTERVAL_ARG)
+
+    SCRAPE_MAX_INTERVAL_ARG = 'SCRAPE_MAX_INTERVAL'
+    SCRAPE_MAX_INTERVAL = os.getenv(SCRAPE_MAX_INTERVAL_ARG, '86400')
+
     DATABASE_URL_ARG = 'DATABASE_URL'
     DATABASE_URL = os.getenv(DATABASE_URL_ARG)
 
+    DATABASE_BATCH_SIZE_ARG = 'DATABASE_BATCH_SIZE'
+    DATABASE_BATCH_SIZE = os.getenv(DATABASE_BATCH_SIZE_ARG, '100')
+
+    DUPLICATES_EXACT_ARG = 'DUPLICATES_EXACT'
+    DUPLICATES_EXACT = os.getenv(DUPLICATES_EXACT_ARG, 'false')
+
+    SNAPSHOT_DIRECTORY_ARG = 'SNAPSHOT_DIRECTORY'
+    SNAPSHOT_DIRECTORY = os.getenv(SNAPSHOT_DIRECTORY_ARG)
+
+    CATALOGS_ARG = 'CATALOGS'
+    CATALOGS = os.getenv(CATALOGS_ARG)
+
+    CONCURRENT_REQUESTS_ARG = 'CONCURRENT_REQUESTS'
+    CONCURRENT_REQUESTS = os.getenv(CONCURRENT_REQUESTS_ARG, '16')
+
+    CONCURRENT_REQUESTS_PER_DOMAIN_ARG = 'CONCURRENT_REQUESTS_PER_DOMAIN'
+    CONCURRENT_REQUESTS_PER_DOMAIN = os.getenv(CONCURRENT_REQUESTS_PER_DOMAIN_ARG, '4')
+
+    ARCHIVE_DIRECTORY_ARG = 'ARCHIVE_DIRECTORY'
+    ARCHIVE_DIRECTORY = os.getenv(ARCHIVE_DIRECTORY_ARG)
+
+    ARCHIVE_MODE_ARG = 'ARCHIVE_MODE'
+    ARCHIVE_MODE = os.getenv(ARCHIVE_MODE_ARG, 'record')
+
+    ARCHIVE_RUN_ARG = 'ARCHIVE_RUN'
+    ARCHIVE_RUN = os.getenv(ARCHIVE_RUN_ARG)
+
+    PROFILE_DIRECTORY_ARG = 'PROFILE_DIRECTORY'
+    PROFILE_DIRECTORY = os.getenv(PROFILE_DIRECTORY_ARG, os.path.join(tempfile.gettempdir(), 'vodafone-profiles'))
+
+    CATALOG_PARSER_ARG = 'CATALOG_PARSER'
+    CATALOG_PARSER = os.getenv(CATALOG_PARSER_ARG, 'stream')
+
     NOTIFIER_ARG = 'NOTIFIER'
     NOTIFIER = os.getenv(NOTIFIER_ARG)
 
+    WATCHLIST_ARG = 'WATCHLIST'
+    WATCHLIST = os.getenv(WATCHLIST_ARG)
+
     SLACK_TOKEN_ARG = 'SLACK_TOKEN'
     SLACK_TOKEN = os.getenv(SLACK_TOKEN_ARG)
 
     SLACK_CHANNEL_ARG = 'SLACK_CHANNEL'
     SLACK_CHANNEL = os.getenv(SLACK_CHANNEL_ARG)
+
+    SLACK_CHANNEL_CACHE_ARG = 'SLACK_CHANNEL_CACHE'
+    SLACK_CHANNEL_CACHE = os.getenv(SLACK_CHANNEL_CACHE_ARG,
+                                    os.path.join(tempfile.gettempdir(), 'vodafone-slack-channels.json'))
+
+    SLACK_CHANNEL_CACHE_TTL_ARG = 'SLACK_CHANNEL_CACHE_TTL'
+    SLACK_CHANNEL_CACHE_TTL = os.getenv(SLACK_CHANNEL_CACHE_TTL_ARG, '86400')
+
+    SLACK_API_URL_ARG = 'SLACK_API_URL'
+    SLACK_API_URL = os.getenv(SLACK_API_URL_ARG)
@@ -0,0 +1,43 @@
+class CatalogStats:
+    """
+    Reads the per catalog stats of a run, kept as `vodafone/catalog/<name>/<stat>`:
+     - `products`: number of products extracted by the spider, set even if it is 0.
+     - `errors`: number of products that could not be extracted or were rejected by the validator.
+     - `failed`: number of products that could not be written to the database.
+    """
+
+    PREFIX = 'vodafone/catalog/'
+
+    @staticmethod
+    def key(catalog, stat):
+        """
+        :param catalog: name of the catalog.
+        :param stat: name of the per catalog stat, e.g. `products`.
+        :return: key of the stat of the catalog.
+        """
+        return '%s%s/%s' % (CatalogStats.PREFIX, catalog, stat)
+
+    @staticmethod
+    def catalogs(stats, stat):
+        """
+        :param stats: dict with the stats of the run, or None.
+        :param stat: name of the per catalog stat, e.g. `products`.
+        :return: set with the names of the catalogs that have the stat.
+        """
+        suffix = '/' + stat
+        return {key[len(CatalogStats.PREFIX):-len(suffix)] for key in (stats or {})
+                if key.startswith(CatalogStats.PREFIX) and key.endswith(suffix)}
+
+    @staticmethod
+    def removable(stats):
+        """
+        Products missing from a catalog are only taken as removed if the catalog was extracted with at least one
+        product and all of its products were extracted, validated and written. Otherwise, a single bad response would
+        remove, and then announce again, every product of the catalog.
+
+        :param stats: dict with the stats of the run, or None.
+        :return: set with the names of the catalogs whose missing products may be removed.
+        """
+        extracted = {catalog for catalog in CatalogStats.catalogs(stats, 'products')
+                     if stats[CatalogStats.key(catalog, 'products')] > 0}
+        return extracted - CatalogStats.catalogs(stats, 'errors') - CatalogStats.catalogs(stats, 'failed')
@@ -0,0 +1,93 @@
+import functools
+import time
+
+from scrapy.exceptions import DropItem
+
+from src.metrics.metrics import Metrics
+
+
+def drop_reason(drop):
+    """
+    :param drop: :py:class:`scrapy.exceptions.DropItem` raised by a pipeline.
+    :return: the message of the exception up to the item, which is not part of the reason.
+    """
+    return str(drop).split(':', 1)[0]
+
+
+def instrumented_stage(stage):
+    """
+    Decorates the `process_item` method of an item pipeline to count the processed and dropped items, and to measure
+    its latency. When metrics are disabled, the method is returned untouched.
+
+    Items settled later, through a :py:class:`twisted.internet.defer.Deferred`, are measured until they are settled.
+
+    :param stage: name of the pipeline stage.
+    """
+    labels = (('stage', stage),)
+
+    def decorator(process_item):
+        if not Metrics.enabled:
+            return process_item
+
+        def settled(result, start):
+            Metrics.observe('vodafone_stage_latency_seconds', labels, time.perf_counter() - start)
+            if hasattr(result, 'check') and result.check(DropItem):
+                Metrics.inc('vodafone_items_dropped_total', labels + (('reason', drop_reason(result.value)),))
+            else:
+                Metrics.inc('vodafone_items_processed_total', labels)
+            return result
+
+        @functools.wraps(process_item)
+        def wrapper(self, item, spider):
+            start = time.perf_counter()
+
+            try:
+                result = process_item(self, item, spider)
+            except DropItem as drop:
+                Metrics.observe('vodafone_stage_latency_seconds', labels, time.perf_counter() - start)
+                Metrics.inc('vodafone_items_dropped_total', labels + (('reason', drop_reason(drop)),))
+                raise
+
+            if hasattr(result, 'addBoth'):
+                return result.addBoth(settled, start)
+
+            return settled(result, start)
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented_callback(callback):
+    """
+    Decorates a spider callback that is a generator to measure the download latency of its response and the time spent
+    to produce each result, excluding the time spent by the item pipelines. When metrics are disabled, the callback is
+    returned untouched.
+
+    :param callback: spider callback.
+    """
+    if not Metrics.enabled:
+        return callback
+
+    labels = (('callback', callback.__name__),)
+
+    @functools.wraps(callback)
+    def wrapper(self, response, *args, **kwargs):
+        if 'download_latency' in response.meta:
+            Metrics.observe('vodafone_download_latency_seconds', (), response.meta['download_latency'])
+
+        results = callback(self, response, *args, **kwargs)
+
+        while True:
+            start = time.perf_counter()
+            try:
+                result = next(results)
+            except StopIteration:
+                Metrics.observe('vodafone_callback_latency_seconds', labels, time.perf_counter() - start)
+                return
+
+            Metrics.observe('vodafone_callback_latency_seconds', labels, time.perf_counter() - start)
+            Metrics.inc('vodafone_callback_results_total', labels)
+            yield result
+
+    return wrapper
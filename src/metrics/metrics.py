@@ -0,0 +1,138 @@
+import bisect
+import threading
+
+from src.environmentvariables import EnvironmentVariables
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, as defined by Prometheus.
+    """
+
+    # Upper bounds in seconds, from 10us to 10s
+    BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        :param value: observed value in seconds.
+        """
+        self.counts[bisect.bisect_left(Histogram.BUCKETS, value)] += 1
+        self.sum += value
+
+    def merge(self, counts, total):
+        """
+        :param counts: counts per bucket of another histogram.
+        :param total: sum of another histogram.
+        """
+        self.counts = [count + other for count, other in zip(self.counts, counts)]
+        self.sum += total
+
+
+class Metrics:
+    """
+    Static registry of counters and latency histograms, exported in the Prometheus text format.
+
+    Metrics are identified by their name and a tuple of (label, value) pairs. They are only collected when
+    `src.environmentvariables.EnvironmentVariables.METRICS_ARG` is enabled. Otherwise, nothing is instrumented.
+
+    Each scraping job runs in its own process, so its metrics are taken with :py:meth:`snapshot` at the end of the job
+    and added to the ones of the server with :py:meth:`merge`.
+    """
+    enabled = (EnvironmentVariables.METRICS or '').lower() in ('1', 'true', 'yes')
+
+    __lock = threading.Lock()
+    __counters = {}
+    __histograms = {}
+
+    @staticmethod
+    def inc(name, labels=(), value=1):
+        """
+        :param name: name of the counter.
+        :param labels: tuple of (label, value) pairs.
+        :param value: increment.
+        """
+        key = (name, labels)
+        with Metrics.__lock:
+            Metrics.__counters[key] = Metrics.__counters.get(key, 0) + value
+
+    @staticmethod
+    def observe(name, labels, value):
+        """
+        :param name: name of the histogram.
+        :param labels: tuple of (label, value) pairs.
+        :param value: observed value in seconds.
+        """
+        key = (name, labels)
+        with Metrics.__lock:
+            histogram = Metrics.__histograms.get(key)
+            if histogram is None:
+                histogram = Metrics.__histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @staticmethod
+    def snapshot():
+        """
+        :return: picklable copy of all the metrics.
+        """
+        with Metrics.__lock:
+            return {
+                'counters': dict(Metrics.__counters),
+                'histograms': {key: (list(histogram.counts), histogram.sum)
+                               for key, histogram in Metrics.__histograms.items()}
+            }
+
+    @staticmethod
+    def merge(snapshot):
+        """
+        Adds the metrics of a snapshot, usually taken by another process, to these ones.
+
+        :param snapshot: value returned by :py:meth:`snapshot`.
+        """
+        with Metrics.__lock:
+            for key, value in snapshot['counters'].items():
+                Metrics.__counters[key] = Metrics.__counters.get(key, 0) + value
+
+            for key, (counts, total) in snapshot['histograms'].items():
+                Metrics.__histograms.setdefault(key, Histogram()).merge(counts, total)
+
+    @staticmethod
+    def render():
+        """
+        :return: all the metrics in the Prometheus text format.
+        """
+        lines = []
+        snapshot = Metrics.snapshot()
+
+        for name in sorted({name for name, _ in snapshot['counters']}):
+            lines.append('# TYPE %s counter' % name)
+            for (counter_name, labels), value in sorted(snapshot['counters'].items()):
+                if counter_name == name:
+                    lines.append('%s%s %s' % (name, Metrics.__labels(labels), value))
+
+        for name in sorted({name for name, _ in snapshot['histograms']}):
+            lines.append('# TYPE %s histogram' % name)
+            for (histogram_name, labels), (counts, total) in sorted(snapshot['histograms'].items()):
+                if histogram_name != name:
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(Histogram.BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, Metrics.__labels(labels + (('le', str(bound)),)),
+                                                     cumulative))
+                lines.append('%s_sum%s %s' % (name, Metrics.__labels(labels), total))
+                lines.append('%s_count%s %d' % (name, Metrics.__labels(labels), cumulative))
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def __labels(labels):
+        if not labels:
+            return ''
+
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{%s}' % ','.join('%s="%s"' % (label, value) for (label, _), value in zip(labels, escaped))
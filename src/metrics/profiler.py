@@ -0,0 +1,275 @@
+import argparse
+import cProfile
+import datetime
+import inspect
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+
+class Profiler:
+    """
+    Profiles the CPU time and the memory allocations of a scraping run.
+
+    The CPU profile is taken with :py:mod:`cProfile` for the whole run. The allocations are traced with
+    :py:mod:`tracemalloc` and a snapshot is taken when the spider closes, while the item pipelines and the spider are
+    still alive. Both slow the run down (around twice as slow), so they are only enabled on request.
+
+    The artifacts of each run are written to their own directory, named after the UTC time the run started at:
+     - `cpu.pstats`: the CPU profile, readable with :py:mod:`pstats` or tools like snakeviz.
+     - `allocations.tracemalloc`: the allocation snapshot, readable with :py:meth:`tracemalloc.Snapshot.load`.
+     - `summary.json` and `summary.txt`: the top functions and allocation sites, and the time and allocations of each
+       item pipeline and spider callback.
+
+    Two runs are compared with :py:meth:`compare`, also available from the command line::
+
+        python3 -m src.metrics.profiler compare <previous directory> <current directory>
+    """
+    __logger = logging.getLogger(__name__)
+
+    # Number of functions and allocation sites of the summaries and comparisons
+    TOP = 20
+    # Frames kept per allocation, to attribute the allocations of shared code to the stage that called it
+    TRACEBACK_FRAMES = 16
+
+    def __init__(self, directory):
+        """
+        :param directory: directory where the directory of the run is created.
+        """
+        self.directory = os.path.join(directory, datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%fZ'))
+        self.profile = cProfile.Profile()
+        self.started_at = None
+        self.allocations = None
+        self.peak_bytes = 0
+        self.stages = {}
+        self.items = 0
+
+    def attach(self, crawler):
+        """
+        Takes the allocation snapshot and finds the stages when the spider of the crawler closes.
+
+        :param crawler: :py:class:`scrapy.crawler.Crawler` of the run.
+        """
+        from scrapy import signals
+
+        self.crawler = crawler
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    def start(self):
+        tracemalloc.start(Profiler.TRACEBACK_FRAMES)
+        self.started_at = time.perf_counter()
+        self.profile.enable()
+
+    def spider_closed(self, spider):
+        """
+        Takes the allocation snapshot and labels the methods of the item pipelines, downloader middlewares and spider.
+
+        :param spider: spider of the run.
+        """
+        components = list(self.crawler.engine.scraper.itemproc.middlewares)
+        components += list(self.crawler.engine.downloader.middleware.middlewares)
+        components.append(spider)
+
+        self.stages = Profiler.stages(components)
+        stats = self.crawler.stats
+        self.items = stats.get_value('item_scraped_count', 0) + stats.get_value('item_dropped_count', 0)
+        self.__take_snapshot()
+
+    def stop(self):
+        """
+        Stops profiling and writes the artifacts of the run.
+
+        :return: directory with the artifacts.
+        """
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started_at
+
+        if self.allocations is None:
+            self.__take_snapshot()
+        tracemalloc.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.profile.dump_stats(os.path.join(self.directory, 'cpu.pstats'))
+        self.allocations.dump(os.path.join(self.directory, 'allocations.tracemalloc'))
+
+        summary = Profiler.summary(pstats.Stats(self.profile), self.allocations, self.stages)
+        summary.update(elapsed_s=elapsed, items=self.items, peak_bytes=self.peak_bytes)
+
+        with open(os.path.join(self.directory, 'summary.json'), 'w', encoding='utf8') as file:
+            json.dump(summary, file, indent=2)
+        with open(os.path.join(self.directory, 'summary.txt'), 'w', encoding='utf8') as file:
+            file.write('\n'.join(Profiler.report(summary)) + '\n')
+
+        Profiler.__logger.info("Profile written. directory='%s' elapsed=%.3fs peak_bytes=%d", self.directory, elapsed,
+                               self.peak_bytes)
+        return self.directory
+
+    def __take_snapshot(self):
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        self.allocations = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__),
+             tracemalloc.Filter(False, __file__)])
+
+    @staticmethod
+    def stages(components):
+        """
+        :param components: item pipelines, downloader middlewares and spiders.
+        :return: dict with the name of the class of every component by the file it is defined in, and with the name
+        (`<class>.<method>`) of every method by its key in the CPU profile.
+        """
+        files = {}
+        functions = {}
+
+        for component in components:
+            cls = type(component)
+            try:
+                files[inspect.getsourcefile(cls)] = cls.__name__
+            except TypeError:
+                continue
+
+            for name, function in inspect.getmembers(cls, inspect.isfunction):
+                # Instrumented methods are wrapped, but the profile shows the original ones as well
+                code = inspect.unwrap(function).__code__
+                key = '%s:%d(%s)' % (code.co_filename, code.co_firstlineno, code.co_name)
+                functions[key] = '%s.%s' % (cls.__name__, name)
+
+        return {'files': files, 'functions': functions}
+
+    @staticmethod
+    def summary(cpu, allocations, stages):
+        """
+        :param cpu: :py:class:`pstats.Stats` of the run.
+        :param allocations: :py:class:`tracemalloc.Snapshot` of the run.
+        :param stages: dict returned by :py:meth:`stages`.
+        :return: JSON serializable dict with the top functions and allocation sites, and the time and allocations of
+        each stage.
+        """
+        functions = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in cpu.stats.items():
+            functions.append({'function': '%s:%d(%s)' % (filename, line, name), 'calls': calls, 'own_s': own,
+                              'cumulative_s': cumulative})
+
+        stage_functions = [dict(function, stage=stages.get('functions', {})[function['function']])
+                           for function in functions if function['function'] in stages.get('functions', {})]
+
+        # Each allocation belongs to the innermost stage of its traceback, if any
+        stage_allocations = {}
+        for statistic in allocations.statistics('traceback'):
+            stage = next((stages['files'][frame.filename] for frame in reversed(statistic.traceback)
+                          if frame.filename in stages.get('files', {})), None)
+            if stage is not None:
+                totals = stage_allocations.setdefault(stage, {'stage': stage, 'bytes': 0, 'blocks': 0})
+                totals['bytes'] += statistic.size
+                totals['blocks'] += statistic.count
+
+        return {
+            'stages': sorted(stage_functions, key=lambda function: -function['cumulative_s']),
+            'functions': sorted(functions, key=lambda function: -function['own_s'])[:Profiler.TOP],
+            'stage_allocations': sorted(stage_allocations.values(), key=lambda totals: -totals['bytes']),
+            'allocations': [{'location': '%s:%d' % (statistic.traceback[0].filename, statistic.traceback[0].lineno),
+                             'bytes': statistic.size, 'blocks': statistic.count}
+                            for statistic in allocations.statistics('lineno')[:Profiler.TOP]]
+        }
+
+    @staticmethod
+    def report(summary):
+        """
+        :param summary: dict returned by :py:meth:`summary`, with the elapsed time, items and peak of memory.
+        :return: list with the lines of a human readable report of the summary.
+        """
+        lines = ['elapsed=%.3fs items=%d peak=%.1fMiB' % (summary['elapsed_s'], summary['items'],
+                                                          summary['peak_bytes'] / 2 ** 20), '',
+                 '%-48s %10s %12s %12s' % ('stage', 'calls', 'own (s)', 'cumul. (s)')]
+        lines += ['%-48s %10d %12.3f %12.3f' % (stage['stage'], stage['calls'], stage['own_s'], stage['cumulative_s'])
+                  for stage in summary['stages']]
+
+        lines += ['', '%-48s %12s %10s' % ('stage', 'KiB', 'blocks')]
+        lines += ['%-48s %12.1f %10d' % (stage['stage'], stage['bytes'] / 1024, stage['blocks'])
+                  for stage in summary['stage_allocations']]
+
+        lines += ['', '%10s %12s %12s  %s' % ('calls', 'own (s)', 'cumul. (s)', 'function')]
+        lines += ['%10d %12.3f %12.3f  %s' % (function['calls'], function['own_s'], function['cumulative_s'],
+                                             function['function']) for function in summary['functions']]
+
+        lines += ['', '%12s %10s  %s' % ('KiB', 'blocks', 'location')]
+        lines += ['%12.1f %10d  %s' % (allocation['bytes'] / 1024, allocation['blocks'], allocation['location'])
+                  for allocation in summary['allocations']]
+
+        return lines
+
+    @staticmethod
+    def compare(previous_directory, current_directory, top=TOP):
+        """
+        Compares the profiles of two runs. Times are compared per item, so runs of different sizes are comparable.
+
+        :param previous_directory: directory with the artifacts of the baseline run.
+        :param current_directory: directory with the artifacts of the run to compare.
+        :param top: number of functions and allocation sites with the biggest differences.
+        :return: list with the lines of a human readable report of the differences.
+        """
+        summaries = []
+        for directory in (previous_directory, current_directory):
+            with open(os.path.join(directory, 'summary.json'), encoding='utf8') as file:
+                summaries.append(json.load(file))
+        previous, current = summaries
+        previous_items, current_items = max(previous['items'], 1), max(current['items'], 1)
+
+        lines = ['elapsed %.3fs -> %.3fs, items %d -> %d, peak %.1fMiB -> %.1fMiB' % (
+            previous['elapsed_s'], current['elapsed_s'], previous['items'], current['items'],
+            previous['peak_bytes'] / 2 ** 20, current['peak_bytes'] / 2 ** 20), '',
+            '%-48s %14s %14s %8s' % ('stage', 'before (us/it)', 'after (us/it)', 'change')]
+
+        previous_stages = {stage['stage']: stage for stage in previous['stages']}
+        for stage in current['stages']:
+            before = previous_stages.get(stage['stage'], {}).get('cumulative_s', 0) / previous_items * 1e6
+            after = stage['cumulative_s'] / current_items * 1e6
+            lines.append('%-48s %14.2f %14.2f %8s' % (stage['stage'], before, after, Profiler.__change(before, after)))
+
+        previous_cpu = pstats.Stats(os.path.join(previous_directory, 'cpu.pstats')).stats
+        current_cpu = pstats.Stats(os.path.join(current_directory, 'cpu.pstats')).stats
+        differences = []
+        for key in set(previous_cpu) | set(current_cpu):
+            before = previous_cpu[key][2] / previous_items * 1e6 if key in previous_cpu else 0
+            after = current_cpu[key][2] / current_items * 1e6 if key in current_cpu else 0
+            differences.append((after - before, before, after, '%s:%d(%s)' % key))
+
+        lines += ['', '%14s %14s %8s  %s' % ('before (us/it)', 'after (us/it)', 'change', 'function (own time)')]
+        lines += ['%14.2f %14.2f %8s  %s' % (before, after, Profiler.__change(before, after), function)
+                  for _, before, after, function in sorted(differences, key=lambda d: -abs(d[0]))[:top]]
+
+        allocations = tracemalloc.Snapshot.load(os.path.join(current_directory, 'allocations.tracemalloc')).compare_to(
+            tracemalloc.Snapshot.load(os.path.join(previous_directory, 'allocations.tracemalloc')), 'lineno')
+
+        lines += ['', '%12s %12s %10s  %s' % ('KiB', 'change KiB', 'blocks', 'location')]
+        lines += ['%12.1f %+12.1f %10d  %s:%d' % (statistic.size / 1024, statistic.size_diff / 1024, statistic.count,
+                                                  statistic.traceback[0].filename, statistic.traceback[0].lineno)
+                  for statistic in allocations[:top]]
+
+        return lines
+
+    @staticmethod
+    def __change(before, after):
+        if not before:
+            return 'new' if after else ''
+        return '%+.0f%%' % ((after - before) / before * 100)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shows or compares the profiles of scraping runs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show = subparsers.add_parser('show', help='Shows the summary of a run.')
+    show.add_argument('directory')
+    compare = subparsers.add_parser('compare', help='Compares a run with a previous one.')
+    compare.add_argument('previous_directory')
+    compare.add_argument('current_directory')
+    compare.add_argument('--top', type=int, default=Profiler.TOP)
+    arguments = parser.parse_args()
+
+    if arguments.command == 'show':
+        with open(os.path.join(arguments.directory, 'summary.txt'), encoding='utf8') as summary_file:
+            print(summary_file.read(), end='')
+    else:
+        print('\n'.join(Profiler.compare(arguments.previous_directory, arguments.current_directory, arguments.top)))
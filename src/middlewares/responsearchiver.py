@@ -0,0 +1,129 @@
+import logging
+
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+from src.environmentvariables import EnvironmentVariables
+from src.structures.responsearchive import ResponseArchive
+
+
+class ResponseArchiver:
+    """
+    Archiver able to be a `Downloader Middleware
+    <https://docs.scrapy.org/en/2.1/topics/downloader-middleware.html>`_ on Scrappy.
+
+    In `record` mode, every catalog response is written to a :py:class:`src.structures.responsearchive.ResponseArchive`
+    as part of the current run, after it was decompressed and before the spider parses it. Catalogs that were not
+    modified since the last run reference the body archived by a previous run, so every run lists all of its catalogs.
+
+    In `replay` mode, nothing is downloaded: every catalog request is answered with the response archived by the given
+    run (the newest one by default), which then goes through the spider and the item pipelines like a live one.
+    """
+    __logger = logging.getLogger(__name__)
+
+    # Headers that describe how the response was transferred, not its decoded body, or that are private
+    SKIPPED_HEADERS = {b'Content-Encoding', b'Transfer-Encoding', b'Content-Length', b'Set-Cookie'}
+
+    def __init__(self, archive, mode, run, stats):
+        """
+        :param archive: :py:class:`src.structures.responsearchive.ResponseArchive` to record to or replay from.
+        :param mode: `record` or `replay`.
+        :param run: name of the run to record or replay. Defaults to a new run or the newest one, respectively.
+        :param stats: :py:class:`scrapy.statscollectors.StatsCollector` where the archived responses are counted.
+        """
+        self.archive = archive
+        self.mode = mode
+        self.stats = stats
+
+        if mode == 'replay':
+            self.responses = {response.url: response for response in archive.responses(run)}
+            ResponseArchiver.__logger.info("Replaying archived run. directory='%s' run='%s' responses=%d",
+                                           archive.directory, run or archive.runs()[-1], len(self.responses))
+        else:
+            self.run = run or ResponseArchive.new_run()
+            ResponseArchiver.__logger.info("Recording responses. directory='%s' run='%s'", archive.directory,
+                                           self.run)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """
+        Retrieves the necessary arguments to initialize this Downloader Middleware.
+
+        The archive is only used if `src.environmentvariables.EnvironmentVariables.ARCHIVE_DIRECTORY_ARG` is set.
+
+        Throws :py:class:`builtins.ValueError` if the mode is unknown.
+
+        :param crawler: Used to get the settings and the stats.
+        :return: :py:class:`src.middlewares.responsearchiver.ResponseArchiver` instance.
+        """
+        directory = crawler.settings.get(EnvironmentVariables.ARCHIVE_DIRECTORY_ARG)
+        mode = crawler.settings.get(EnvironmentVariables.ARCHIVE_MODE_ARG)
+
+        if not directory:
+            raise NotConfigured('No archive directory')
+        if mode not in ('record', 'replay'):
+            ResponseArchiver.__logger.error("Invalid archive mode! Got '%s', but should be record or replay!", mode)
+            raise ValueError("Invalid archive mode! Got '%s', but should be record or replay" % mode)
+
+        return cls(ResponseArchive(directory), mode, crawler.settings.get(EnvironmentVariables.ARCHIVE_RUN_ARG),
+                   crawler.stats)
+
+    def process_request(self, request, spider):
+        """
+        In `replay` mode, answers the request with its archived response. Otherwise, lets it be downloaded.
+
+        :param request: :py:class:`scrapy.http.Request` of a catalog.
+        :param spider: Unused.
+        :return: :py:class:`scrapy.http.Response` in `replay` mode, None otherwise.
+        """
+        if self.mode != 'replay':
+            return None
+
+        url = request.meta.get('catalog_url', request.url)
+        archived = self.responses.get(url)
+
+        if archived is None:
+            ResponseArchiver.__logger.error("Response not found in the archive. Ignoring request. url='%s'", url)
+            raise IgnoreRequest("Response not found in the archive: %s" % url)
+
+        body = self.archive.body(archived)
+        headers = Headers(archived.headers)
+        self.stats.inc_value('vodafone/archive/replayed')
+
+        return responsetypes.from_args(headers=headers, url=request.url, body=body)(
+            url=request.url, status=archived.status, headers=headers, body=body, request=request, flags=['archived'])
+
+    def process_response(self, request, response, spider):
+        """
+        In `record` mode, archives the responses of the catalogs. Not modified catalogs reference their newest archived
+        body, if there is one.
+
+        :param request: :py:class:`scrapy.http.Request` of the response.
+        :param response: :py:class:`scrapy.http.Response`, already decompressed.
+        :param spider: Unused.
+        :return: response
+        """
+        if self.mode != 'record' or 'catalog_url' not in request.meta:
+            return response
+
+        url = request.meta['catalog_url']
+
+        if response.status == 304:
+            archived = self.archive.latest(url)
+            if archived is None:
+                ResponseArchiver.__logger.warning(
+                    "Catalog was not modified, but it was never archived. Not recording it. url='%s'", url)
+                return response
+
+            self.archive.reference(self.run, archived._replace(catalog=request.meta.get('catalog')))
+        else:
+            headers = {name.decode('latin-1'): [value.decode('latin-1') for value in values]
+                       for name, values in response.headers.items() if name not in ResponseArchiver.SKIPPED_HEADERS}
+            archived = self.archive.record(self.run, url, request.meta.get('catalog'), response.status, headers,
+                                           response.body)
+
+        self.stats.inc_value('vodafone/archive/recorded')
+        ResponseArchiver.__logger.info("Archived catalog response. url='%s' status=%d digest='%s' bytes=%d", url,
+                                       response.status, archived.digest, archived.size)
+        return response
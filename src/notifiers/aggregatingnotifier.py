@@ -0,0 +1,102 @@
+import threading
+import time
+
+from src.notifiers.notifier import Notifier
+
+
+class AggregatingNotifier(Notifier):
+    """
+    Notifier that sits in front of another one and suppresses storms of warnings and errors.
+
+    Warnings and errors are grouped by their level and template (the message before its arguments are applied). The
+    first message of each group is published straight away. The following ones are only counted, keeping a few
+    samples, and are published as a single summary per group when the group has been suppressing messages for longer
+    than `WINDOW` or when the notifier is flushed. So, no matter how many messages are published, each group costs a
+    bounded number of calls to the wrapped notifier.
+
+    New products, price drops and removed products are not aggregated.
+    """
+    # Number of suppressed messages kept as samples of each group
+    SAMPLES = 3
+    # Seconds after which the suppressed messages of a group are summarised without waiting for a flush
+    WINDOW = 60
+
+    def __init__(self, notifier):
+        """
+        :param notifier: :py:class:`src.notifiers.notifier.Notifier` the messages are published to.
+        """
+        self.notifier = notifier
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def new_product(self, product, subscribers=()):
+        self.notifier.new_product(product, subscribers)
+
+    def price_drop(self, product, previous_price, subscribers=()):
+        self.notifier.price_drop(product, previous_price, subscribers)
+
+    def removed_product(self, product, subscribers=()):
+        self.notifier.removed_product(product, subscribers)
+
+    def warning(self, msg, *args):
+        self.__aggregate('warning', msg, args)
+
+    def error(self, msg, *args):
+        self.__aggregate('error', msg, args)
+
+    def flush(self):
+        with self.lock:
+            groups, self.groups = self.groups, {}
+
+        for (level, template), group in groups.items():
+            if group['suppressed']:
+                self.__publish(level, AggregatingNotifier.summary(template, group))
+
+        self.notifier.flush()
+
+    def __aggregate(self, level, template, args):
+        """
+        Publishes the message if it is the first of its group, otherwise counts it and publishes the summary of the
+        group if its window is over.
+
+        :param level: `warning` or `error`.
+        :param template: message, with the placeholders of the arguments.
+        :param args: arguments of the message.
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            group = self.groups.get((level, template))
+
+            if group is None:
+                self.groups[(level, template)] = {'published_at': now, 'suppressed': 0, 'samples': []}
+                message = template % args if args else template
+            else:
+                group['suppressed'] += 1
+                if len(group['samples']) < AggregatingNotifier.SAMPLES:
+                    group['samples'].append(args)
+
+                if now - group['published_at'] < AggregatingNotifier.WINDOW:
+                    return
+
+                message = AggregatingNotifier.summary(template, group)
+                self.groups[(level, template)] = {'published_at': now, 'suppressed': 0, 'samples': []}
+
+        self.__publish(level, message)
+
+    def __publish(self, level, message):
+        if level == 'error':
+            self.notifier.error(message)
+        else:
+            self.notifier.warning(message)
+
+    @staticmethod
+    def summary(template, group):
+        """
+        :param template: message, with the placeholders of the arguments.
+        :param group: dict with the number of suppressed messages and their samples.
+        :return: message that summarises the suppressed messages of the group.
+        """
+        samples = '\n'.join(template % args if args else template for args in group['samples'])
+        return "%d more messages like this one were suppressed. template='%s' samples:\n%s" % (
+            group['suppressed'], template, samples)
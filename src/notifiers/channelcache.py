@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+class ChannelCache:
+    """
+    Persistent cache of Slack channel ids, stored as a JSON file.
+
+    Entries are keyed by the workspace token and channel name, and expire after a given time to live.
+    """
+    __logger = logging.getLogger(__name__)
+
+    def __init__(self, path, ttl):
+        """
+        :param path: path of the JSON file. Created on the first write.
+        :param ttl: seconds an entry is valid for.
+        """
+        self.path = path
+        self.ttl = ttl
+
+    @staticmethod
+    def key(token, channel):
+        """
+        The token is hashed so it is never written to disk.
+
+        :param token: Slack token to the workspace.
+        :param channel: Slack channel's name.
+        :return: key of the cache entry.
+        """
+        return '%s:%s' % (hashlib.sha256(token.encode('utf8')).hexdigest()[:16], channel)
+
+    def get(self, key):
+        """
+        :param key: key of the cache entry.
+        :return: the channel id or None if it is missing or expired.
+        """
+        entry = self.__read().get(key)
+
+        if entry is None or time.time() - entry['resolved_at'] > self.ttl:
+            return None
+
+        return entry['id']
+
+    def set(self, key, channel_id):
+        """
+        :param key: key of the cache entry.
+        :param channel_id: id of the channel.
+        """
+        entries = self.__read()
+        entries[key] = {'id': channel_id, 'resolved_at': time.time()}
+        self.__write(entries)
+
+    def invalidate(self, key):
+        """
+        :param key: key of the cache entry.
+        """
+        entries = self.__read()
+        if entries.pop(key, None) is not None:
+            self.__write(entries)
+
+    def __read(self):
+        try:
+            with open(self.path) as cache:
+                return json.load(cache)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            ChannelCache.__logger.warning("Ignoring unreadable Slack channel cache. path='%s' error='%s'", self.path, e)
+            return {}
+
+    def __write(self, entries):
+        # Written to a temporary file first, so concurrent readers never see a partial file
+        temporary_path = '%s.%d.tmp' % (self.path, os.getpid())
+
+        try:
+            with open(temporary_path, 'w') as cache:
+                json.dump(entries, cache)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            ChannelCache.__logger.warning("Failed to write Slack channel cache. path='%s' error='%s'", self.path, e)
@@ -6,11 +6,23 @@ from src.notifiers.notifier import Notifier
 class LogNotifier(Notifier):
     __logger = logging.getLogger(__name__)
 
-    def new_product(self, product):
-        LogNotifier.__logger.info("New product notification. product='%s'", product)
+    def new_product(self, product, subscribers=()):
+        LogNotifier.__logger.info("New product notification. product='%s' subscribers=%s", product, list(subscribers))
 
-    def warning(self, msg):
-        LogNotifier.__logger.warning("Something happened that may required your attention.\n%s", msg)
+    def price_drop(self, product, previous_price, subscribers=()):
+        LogNotifier.__logger.info("Price drop notification. previous_price='%s' product='%s' subscribers=%s",
+                                  previous_price, product, list(subscribers))
 
-    def error(self, msg):
-        LogNotifier.__logger.error("An error occurred.\n%s", msg)
+    def removed_product(self, product, subscribers=()):
+        LogNotifier.__logger.info("Removed product notification. product='%s' subscribers=%s", product,
+                                  list(subscribers))
+
+    def warning(self, msg, *args):
+        LogNotifier.__logger.warning("Something happened that may required your attention.\n%s",
+                                     msg % args if args else msg)
+
+    def error(self, msg, *args):
+        LogNotifier.__logger.error("An error occurred.\n%s", msg % args if args else msg)
+
+    def flush(self):
+        pass
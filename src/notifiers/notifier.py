@@ -6,31 +6,64 @@ class Notifier:
     Abstract class representing a notifier.
 
     A notifier publishes the given information to the configured end.
+
+    Notifications may be delivered asynchronously. Call :py:meth:`flush` to make sure they were all delivered.
     """
 
     @abstractmethod
-    def new_product(self, product):
+    def new_product(self, product, subscribers=()):
         """
-        Synchronously notifies about a new product.
+        Notifies about a new product.
 
         :param product: :py:class:`src.domain.product.Product`.
+        :param subscribers: Optional subscribers whose watch rules were matched by the product, to be mentioned.
+        """
+        pass
+
+    @abstractmethod
+    def price_drop(self, product, previous_price, subscribers=()):
+        """
+        Notifies about a product that became cheaper.
+
+        :param product: :py:class:`src.domain.product.Product` with the new price.
+        :param previous_price: price of the product before the drop.
+        :param subscribers: Optional subscribers whose watch rules were matched by the product, to be mentioned.
+        """
+        pass
+
+    @abstractmethod
+    def removed_product(self, product, subscribers=()):
+        """
+        Notifies about a product that is no longer available.
+
+        :param product: :py:class:`src.domain.product.Product` with its last known price.
+        :param subscribers: Optional subscribers whose watch rules were matched by the product, to be mentioned.
         """
         pass
 
     @abstractmethod
-    def warning(self, msg):
+    def warning(self, msg, *args):
         """
-        Synchronously notifies about a warning.
+        Notifies about a warning.
 
-        :param msg: Warning to be published.
+        :param msg: Warning to be published. If there are arguments, it is the template they are applied to with `%`.
+        :param args: Optional arguments of the warning. Warnings with the same template may be aggregated.
         """
         pass
 
     @abstractmethod
-    def error(self, msg):
+    def error(self, msg, *args):
         """
-        Synchronously notifies about an error.
+        Notifies about an error.
 
-        :param msg: Error to be published.
+        :param msg: Error to be published. If there are arguments, it is the template they are applied to with `%`.
+        :param args: Optional arguments of the error. Errors with the same template may be aggregated.
+        """
+        pass
+
+    @abstractmethod
+    def flush(self):
+        """
+        Blocks until all the previous notifications are delivered.
         """
         pass
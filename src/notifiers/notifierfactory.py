@@ -1,13 +1,18 @@
 import logging
 
 from src.environmentvariables import EnvironmentVariables
-from src.notifiers.lognotifier import LogNotifier
-from src.notifiers.slacknotifier import SlackNotifier
+from src.notifiers.aggregatingnotifier import AggregatingNotifier
 
 
 class NotifierFactory:
     """
     https://en.wikipedia.org/wiki/Abstract_factory_pattern
+
+    Notifiers are imported only when requested, so their clients are never loaded if they are not used.
+
+    Every notifier is wrapped by a :py:class:`src.notifiers.aggregatingnotifier.AggregatingNotifier`, so storms of
+    warnings and errors are summarised. If a watchlist is configured, it is also wrapped by a
+    :py:class:`src.notifiers.watchlistnotifier.WatchlistNotifier`, so only the watched products are published.
     """
     __logger = logging.getLogger(__name__)
 
@@ -26,7 +31,7 @@ class NotifierFactory:
         The reason to pass the whole blob of settings is that different notifiers may require different arguments to be
         initialised.
 
-        If the requested notifier has already been instantiated, then it it returned.
+        If the requested notifier has already been instantiated with the same watchlist, then it it returned.
 
         :param crawler_settings: :py:class:`scrapy.settings.Settings` of the :py:class:`scrapy.crawler.Crawler`.
         :return: Concrete instance of :py:class:`src.notifiers.notifier.Notifier`.
@@ -40,21 +45,44 @@ class NotifierFactory:
             raise ValueError(
                 "Invalid notifier requested! Got '%s', but should be one listed at the Notifiers Enum" % notifier)
 
+        watchlist = crawler_settings.get(EnvironmentVariables.WATCHLIST_ARG)
+
         if NotifierFactory.__notifiers.get(notifier) is not None:
-            return NotifierFactory.__notifiers.get(notifier)
+            cached_watchlist, notifier_instance = NotifierFactory.__notifiers.get(notifier)
+            if cached_watchlist == watchlist:
+                return notifier_instance
 
         notifier_instance = None
 
         if notifier == 'slack':
+            from src.notifiers.channelcache import ChannelCache
+            from src.notifiers.slacknotifier import SlackNotifier
+
             notifier_instance = SlackNotifier(
                 token=crawler_settings.get(EnvironmentVariables.SLACK_TOKEN_ARG),
-                channel=crawler_settings.get(EnvironmentVariables.SLACK_CHANNEL_ARG))
+                channel=crawler_settings.get(EnvironmentVariables.SLACK_CHANNEL_ARG),
+                base_url=crawler_settings.get(EnvironmentVariables.SLACK_API_URL_ARG),
+                channel_cache=ChannelCache(
+                    path=crawler_settings.get(EnvironmentVariables.SLACK_CHANNEL_CACHE_ARG),
+                    ttl=crawler_settings.getint(EnvironmentVariables.SLACK_CHANNEL_CACHE_TTL_ARG)))
         elif notifier == 'log':
+            from src.notifiers.lognotifier import LogNotifier
+
             notifier_instance = LogNotifier()
         else:
             NotifierFactory.__logger.error("Unimplemented notifier found! notifier='%s'", notifier)
             raise ValueError("Unimplemented notifier found! notifier='%s'" % notifier)
 
-        NotifierFactory.__notifiers[notifier] = notifier_instance
+        notifier_instance = AggregatingNotifier(notifier_instance)
+
+        if watchlist:
+            from src.notifiers.watchlistnotifier import WatchlistNotifier
+            from src.structures.watchlist import Watchlist
+
+            rules = Watchlist.load(watchlist)
+            NotifierFactory.__logger.info("Loaded watchlist. path='%s' rules=%d", watchlist, len(rules))
+            notifier_instance = WatchlistNotifier(notifier_instance, rules)
+
+        NotifierFactory.__notifiers[notifier] = (watchlist, notifier_instance)
 
         return notifier_instance
@@ -1,14 +1,18 @@
 import logging
+import queue
+import threading
+import time
 
 from slack import WebClient
 from slack.errors import SlackApiError
 
+from src.notifiers.channelcache import ChannelCache
 from src.notifiers.notifier import Notifier
 
 
 class SlackNotifier(Notifier):
     """
-    This class requires multiple permissions to the correct operation. It uses two Slack API endpoints:
+    This class requires multiple permissions to the correct operation. It uses four Slack API endpoints:
      - https://api.slack.com/methods/chat.postMessage
      - https://api.slack.com/methods/conversations.list
      - https://api.slack.com/methods/conversations.create
@@ -21,107 +25,249 @@ class SlackNotifier(Notifier):
     The permissions to join channels are optional and only necessary if the channel is to be joined by this class.
 
     The Slack token passed as argument to the constructor must have the necessary scopes.
+
+    Messages are delivered by a background thread, so publishing never waits for Slack. New products and price drops are
+    coalesced into digests of up to `DIGEST_SIZE` products and rate limited requests are retried after the
+    `Retry-After` returned by Slack. Use :py:meth:`flush` to wait for the delivery of all the published messages.
+
+    No Slack API is called until the first message is posted. The channel id is then read from a
+    :py:class:`src.notifiers.channelcache.ChannelCache` or looked up, and the channel is only created or joined when
+    Slack reports it is missing or the bot is not a member.
     """
     __logger = logging.getLogger(__name__)
 
-    def __init__(self, token, channel):
-        """
-        Initialises the Slack client and, if necessary, creates the channel.
-
-        Failing to create the channel does not prevent the correct operation of the instance.
+    # Maximum number of products per message
+    DIGEST_SIZE = 20
+    # Seconds to wait for more products before posting a digest
+    DIGEST_LINGER = 0.5
+    # Maximum number of attempts to post a message that is being rate limited
+    MAX_ATTEMPTS = 5
+    # Number of channels retrieved per page when looking up the channel
+    CHANNELS_PAGE_SIZE = 1000
 
-        If a channel already exists, it won't be unarchived.
+    def __init__(self, token, channel, base_url=None, channel_cache=None):
+        """
+        Initialises the Slack client. No Slack API is called.
 
-        After confirming the existence of the channel, it will be retrieved the channel's id.
-        With this id, the bot will join the Slack channel.
+        The channel id is resolved when the first message is posted: if the given cache has it, it is used straight
+        away. Otherwise, the public channels are listed page by page until the channel is found. If it does not exist,
+        it is created. If a channel already exists, it won't be unarchived.
 
         :param token: Slack token to the workspace.
         :param channel: Slack channel's name where the messages will be sent.
+        :param base_url: URL of the Slack Web API. Defaults to Slack's own, but can point to a local stand-in.
+        :param channel_cache: Optional :py:class:`src.notifiers.channelcache.ChannelCache` of the channel id.
         """
-        self.client = WebClient(token=token)
+        self.client = WebClient(token=token, base_url=base_url) if base_url else WebClient(token=token)
         self.channel = channel
+        self.channel_cache = channel_cache
+        self.channel_cache_key = ChannelCache.key(token or '', channel)
+        self.channel_id = channel_cache.get(self.channel_cache_key) if channel_cache else None
+
+        self.messages = queue.Queue()
+        self.worker = threading.Thread(target=self.__deliver, name='slack-notifier', daemon=True)
+        self.worker.start()
+
+    def __resolve_channel_id(self):
+        """
+        Sets the channel id, creating the channel if it was not found, and caches it.
+        """
+        self.channel_id = self.__find_channel_id() or self.__create_channel()
+
+        if self.channel_cache:
+            self.channel_cache.set(self.channel_cache_key, self.channel_id)
+
+    def __find_channel_id(self):
+        """
+        Lists the public channels page by page until the channel is found.
+
+        :return: id of the channel or None if it was not found.
+        """
+        # Slack's client only accepts strings and numbers as query parameters
+        parameters = {'types': 'public_channel', 'exclude_archived': 1, 'limit': SlackNotifier.CHANNELS_PAGE_SIZE}
+
+        while True:
+            try:
+                response = self.client.conversations_list(**parameters)
+            except SlackApiError as e:
+                SlackNotifier.__logger.error(
+                    "Failed to retrieve list of Slack channels to find the id of '%s'. error='%s'", self.channel, e)
+                raise ValueError(
+                    "Failed to retrieve list of Slack channels to find the id of '%s'. error='%s'" % (self.channel, e))
 
-        self.__connect_to_channel(channel)
+            for public_channel in response.get('channels', []):
+                if public_channel['name'] == self.channel:
+                    SlackNotifier.__logger.info(
+                        "Found id '%s' for the Slack channel '%s'.", public_channel['id'], self.channel)
+                    return public_channel['id']
 
-    def __connect_to_channel(self, channel):
+            parameters['cursor'] = response.get('response_metadata', {}).get('next_cursor')
+            if not parameters['cursor']:
+                return None
+
+    def __create_channel(self):
+        """
+        :return: id of the created channel.
+        """
         try:
-            self.client.conversations_create(name=channel)
-            SlackNotifier.__logger.info("Created Slack channel '%s'.", channel)
-            self.__set_channel_id(channel)
+            channel_id = self.client.conversations_create(name=self.channel)['channel']['id']
         except SlackApiError as e:
-            SlackNotifier.__logger.warning(
-                "Failed to create channel '%s' due to '%s'. You can ignore this warning if the channel already exists. "
-                "Attempting to join channel.", channel, e.response['error'])
-            self.__join_channel(channel)
+            SlackNotifier.__logger.error(
+                "Channel '%s' not found and failed to create it due to '%s'. Have you spelled the channel's name "
+                "correctly? Are you sure it is public and not archived?", self.channel, e.response['error'])
+            raise ValueError(
+                "Channel '%s' not found and failed to create it due to '%s'. Have you spelled the channel's name "
+                "correctly? Are you sure it is public and not archived?" % (self.channel, e.response['error']))
 
-    def __join_channel(self, channel):
-        self.__set_channel_id(channel)
+        SlackNotifier.__logger.info("Created Slack channel '%s'.", self.channel)
+        return channel_id
+
+    def __join_channel(self):
         try:
             self.client.conversations_join(channel=self.channel_id)
-            SlackNotifier.__logger.info("Joined Slack channel '%s'.", channel)
+            SlackNotifier.__logger.info("Joined Slack channel '%s'.", self.channel)
         except SlackApiError as e:
             if e.response['error'] == 'is_archived':
                 SlackNotifier.__logger.error("Requested channel '%s' is archived. Slack bot cannot post messages there."
-                                             " Please unarchive it or choose another channel.", channel)
+                                             " Please unarchive it or choose another channel.", self.channel)
                 raise ValueError("Requested channel '%s' is archived. Slack bot cannot post messages there. "
-                                 "Please unarchive it or choose another channel." % channel)
+                                 "Please unarchive it or choose another channel." % self.channel)
 
             SlackNotifier.__logger.warning(
                 "Failed to join channel '%s' due to '%s'. You can ignore this warning if the bot has already joined.",
-                channel, e.response['error'])
+                self.channel, e.response['error'])
 
-    def __set_channel_id(self, channel):
-        public_channels = []
+    def new_product(self, product, subscribers=()):
+        self.messages.put(('product', ":new: %s<%s|%s> is now available at €%s" % (
+            SlackNotifier.mentions(subscribers), product['url'], product['name'], product['price'])))
+        SlackNotifier.__logger.debug("New product queued for Slack. product='%s'", product)
 
-        try:
-            public_channels = self.client.conversations_list().get('channels')
-            SlackNotifier.__logger.debug("Retrieved the following list of channels: '%s'", public_channels)
-        except SlackApiError as e:
-            SlackNotifier.__logger.error(
-                "Failed to retrieve list of Slack channels to find the id of '%s'. error='%s'", channel, e)
-            raise ValueError(
-                "Failed to retrieve list of Slack channels to find the id of '%s'. error='%s'" % (channel, e))
+    def price_drop(self, product, previous_price, subscribers=()):
+        self.messages.put(('product', ":chart_with_downwards_trend: %s<%s|%s> dropped from €%.2f to €%.2f" % (
+            SlackNotifier.mentions(subscribers), product['url'], product['name'], previous_price, product['price'])))
+        SlackNotifier.__logger.debug("Price drop queued for Slack. product='%s'", product)
 
-        channel_ids = [public_channel for public_channel in public_channels if public_channel['name'] == channel]
+    def removed_product(self, product, subscribers=()):
+        self.messages.put(('product', ":x: %s<%s|%s> is no longer available (last seen at €%s)" % (
+            SlackNotifier.mentions(subscribers), product['url'], product['name'], product['price'])))
+        SlackNotifier.__logger.debug("Removed product queued for Slack. product='%s'", product)
 
-        # Most likely the channel was not found or Slack now supports multiple channels with the same name
-        if len(channel_ids) != 1:
-            SlackNotifier.__logger.error(
-                "Channel '%s' not found. Have you spelled the channel's name correctly? Are you sure it is public?",
-                channel)
-            raise ValueError(
-                "Channel '%s' not found. Have you spelled the channel's name correctly? Are you sure it is public?" %
-                channel)
+    @staticmethod
+    def mentions(subscribers):
+        """
+        :param subscribers: ids of the Slack users to be mentioned.
+        :return: text that mentions every subscriber, so Slack notifies them, followed by a space if there is any.
+        """
+        return ''.join('<@%s> ' % subscriber for subscriber in subscribers)
 
-        self.channel_id = channel_ids[0]['id']
-        SlackNotifier.__logger.info("Found id '%s' for the Slack channel '%s'.", self.channel_id, self.channel)
+    def warning(self, msg, *args):
+        msg = msg % args if args else msg
+        self.messages.put(
+            ('message', ":warning: Something happened that may required your attention.\n```%s```" % msg))
+        SlackNotifier.__logger.debug("Warning message queued for Slack. msg='%s'", msg)
 
-    def new_product(self, product):
-        try:
-            self.client.chat_postMessage(
-                channel=self.channel_id,
-                text=":new: <%s|%s> is now available at €%s" % (product['url'], product['name'], product['price']))
-            SlackNotifier.__logger.debug("New product posted on Slack. product='%s'", product)
-        except SlackApiError as e:
-            SlackNotifier.__logger.error(
-                "Failed to notify a new product to Slack! error='%s' product='%s'", e.response['error'], product)
+    def error(self, msg, *args):
+        msg = msg % args if args else msg
+        self.messages.put(('message', ":rotating_light: An error occurred!\n```%s```" % msg))
+        SlackNotifier.__logger.debug("Error message queued for Slack. msg='%s'", msg)
 
-    def warning(self, msg):
-        try:
-            self.client.chat_postMessage(
-                channel=self.channel_id,
-                text=":warning: Something happened that may required your attention.\n```%s```" % msg)
-            SlackNotifier.__logger.debug("Error message posted on Slack. msg='%s'", msg)
-        except SlackApiError as e:
-            SlackNotifier.__logger.error(
-                "Failed to publish an error to Slack! error_response='%s' error_msg='%s'", e.response['error'], msg)
+    def flush(self):
+        self.messages.join()
+        SlackNotifier.__logger.debug("All the queued messages were delivered to Slack.")
 
-    def error(self, msg):
-        try:
-            self.client.chat_postMessage(
-                channel=self.channel_id,
-                text=":rotating_light: An error occurred!\n```%s```" % msg)
-            SlackNotifier.__logger.debug("Error message posted on Slack. msg='%s'", msg)
-        except SlackApiError as e:
-            SlackNotifier.__logger.error(
-                "Failed to publish an error to Slack! error_response='%s' error_msg='%s'", e.response['error'], msg)
+    def __deliver(self):
+        """
+        Posts the queued messages forever. Consecutive new products are posted together as a single digest.
+
+        Every message taken from the queue is marked as done, even if posting it failed, so :py:meth:`flush` never
+        waits for a message that will not be delivered and the worker keeps going.
+        """
+        while True:
+            kind, text = self.messages.get()
+            taken = 1
+
+            try:
+                if kind != 'product':
+                    self.__post(text)
+                    continue
+
+                digest = [text]
+                deadline = time.monotonic() + SlackNotifier.DIGEST_LINGER
+                pending_message = None
+
+                while len(digest) < SlackNotifier.DIGEST_SIZE:
+                    try:
+                        kind, text = self.messages.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+
+                    taken += 1
+
+                    if kind != 'product':
+                        pending_message = text
+                        break
+
+                    digest.append(text)
+
+                self.__post('\n'.join(digest))
+
+                if pending_message is not None:
+                    self.__post(pending_message)
+            except Exception as e:
+                SlackNotifier.__logger.error("Failed to deliver messages to Slack! error='%s' messages=%d", e, taken)
+            finally:
+                for _ in range(taken):
+                    self.messages.task_done()
+
+    def __post(self, text):
+        """
+        Posts the given text to the channel. Rate limited requests are retried after the time requested by Slack.
+
+        The channel id is resolved on the first post. If the channel is missing, the cached id is discarded and resolved
+        again. If the bot is not a member of the channel, it joins it.
+
+        :param text: message to be posted.
+        """
+        # The channel is joined within the next attempt, so its errors are handled like the ones of posting
+        join_channel = False
+
+        for attempt in range(1, SlackNotifier.MAX_ATTEMPTS + 1):
+            try:
+                if self.channel_id is None:
+                    self.__resolve_channel_id()
+                if join_channel:
+                    join_channel = False
+                    self.__join_channel()
+
+                self.client.chat_postMessage(channel=self.channel_id, text=text)
+                SlackNotifier.__logger.debug("Message posted on Slack. text='%s'", text)
+                return
+            except SlackApiError as e:
+                error = e.response['error']
+                retry_after = 0
+
+                if attempt == SlackNotifier.MAX_ATTEMPTS:
+                    pass
+                elif error == 'not_in_channel':
+                    join_channel = True
+                    continue
+                elif error == 'channel_not_found':
+                    SlackNotifier.__logger.warning("Channel id '%s' is no longer valid. Resolving it again.",
+                                                   self.channel_id)
+                    if self.channel_cache:
+                        self.channel_cache.invalidate(self.channel_cache_key)
+                    self.channel_id = None
+                    continue
+                elif e.response.status_code == 429:
+                    retry_after = int(e.response.headers.get('Retry-After', 1))
+
+                if not retry_after:
+                    SlackNotifier.__logger.error("Failed to post a message to Slack! error='%s' text='%s'", error, text)
+                    return
+
+                SlackNotifier.__logger.warning("Rate limited by Slack. Retrying in %d seconds. attempt=%d",
+                                               retry_after, attempt)
+                time.sleep(retry_after)
+            except Exception as e:
+                SlackNotifier.__logger.error("Failed to post a message to Slack! error='%s' text='%s'", e, text)
+                return
@@ -0,0 +1,63 @@
+import logging
+
+from src.metrics.metrics import Metrics
+from src.notifiers.notifier import Notifier
+
+
+class WatchlistNotifier(Notifier):
+    """
+    Notifier that sits in front of another one and only lets through the products someone is watching.
+
+    New products, price drops and removed products are matched against a
+    :py:class:`src.structures.watchlist.Watchlist`. Products that match no rule are not published at all. The ones that
+    do are published once, with the subscribers of every rule they matched, so each of them is mentioned.
+
+    Warnings and errors are always published.
+    """
+    __logger = logging.getLogger(__name__)
+
+    def __init__(self, notifier, watchlist):
+        """
+        :param notifier: :py:class:`src.notifiers.notifier.Notifier` the matched products are published to.
+        :param watchlist: :py:class:`src.structures.watchlist.Watchlist` with the rules of the subscribers.
+        """
+        self.notifier = notifier
+        self.watchlist = watchlist
+
+    def new_product(self, product, subscribers=()):
+        subscribers = self.__subscribers(product)
+        if subscribers:
+            self.notifier.new_product(product, subscribers)
+
+    def price_drop(self, product, previous_price, subscribers=()):
+        subscribers = self.__subscribers(product)
+        if subscribers:
+            self.notifier.price_drop(product, previous_price, subscribers)
+
+    def removed_product(self, product, subscribers=()):
+        subscribers = self.__subscribers(product)
+        if subscribers:
+            self.notifier.removed_product(product, subscribers)
+
+    def warning(self, msg, *args):
+        self.notifier.warning(msg, *args)
+
+    def error(self, msg, *args):
+        self.notifier.error(msg, *args)
+
+    def flush(self):
+        self.notifier.flush()
+
+    def __subscribers(self, product):
+        """
+        :param product: :py:class:`src.domain.product.Product`.
+        :return: sorted list with the subscribers whose rules are matched by the product.
+        """
+        subscribers = self.watchlist.match(product['name'], product['price'])
+
+        if not subscribers:
+            WatchlistNotifier.__logger.debug("Product is not watched. product='%s'", product)
+        elif Metrics.enabled:
+            Metrics.inc('vodafone_watchlist_matches_total', value=len(subscribers))
+
+        return subscribers
@@ -0,0 +1,295 @@
+import logging
+import os
+
+from scrapy import signals
+
+from src.databases.database import Database
+from src.databases.databasefactory import DatabaseFactory
+from src.domain.product import Product
+from src.environmentvariables import EnvironmentVariables
+from src.metrics.catalogstats import CatalogStats
+from src.metrics.instrumentation import instrumented_stage
+from src.metrics.metrics import Metrics
+from src.notifiers.notifierfactory import NotifierFactory
+from src.structures.snapshot import Snapshot
+
+
+class CatalogSnapshot:
+    """
+    Snapshot stage able to be an `Item Pipeline component
+    <https://docs.scrapy.org/en/2.1/topics/item-pipeline.html>`_ on Scrappy.
+
+    This class replaces the per product work of :py:class:`src.pipelines.savetodatabase.SaveToDatabase` and
+    :py:class:`src.pipelines.productnotifier.ProductNotifier`. It only records each
+    :py:class:`src.domain.product.Product` of every catalog. When the spider finishes, a
+    :py:class:`src.structures.snapshot.Snapshot` of each catalog is written and compared with the snapshot of the last
+    run in a single linear merge. Only the added and repriced products are then written to the database, in bulk, and
+    notified. The removed products are marked as removed in the database, with a single statement per catalog, and
+    notified as well. Catalogs that extracted no products or had errors (see
+    :py:meth:`src.metrics.catalogstats.CatalogStats.removable`) keep their missing products in the snapshot instead.
+
+    Snapshots are only replaced once their changes were applied, so a failed run is compared again on the next one.
+    Catalogs that were skipped (because they did not change) keep their snapshot. As the changes are only written when
+    the spider closes, the state of the catalogs (see
+    :py:class:`src.spiders.vodafonebusinessstore.VodafoneBusinessStore`) is stored here too, once the snapshot of the
+    catalog was applied, with the same database connection used for every catalog.
+    """
+    __logger = logging.getLogger(__name__)
+
+    # Number of products written to the database per transaction
+    BATCH_SIZE = 1000
+
+    def __init__(self, directory, crawler_settings, stats):
+        """
+        Stores the snapshots directory, the crawler settings and the stats.
+
+        :param directory: directory where the snapshot of each catalog is kept.
+        :param crawler_settings: Settings of the crawler :py:class:`scrapy.settings.Settings`.
+        :param stats: :py:class:`scrapy.statscollectors.StatsCollector` where the number of products of the diff is
+        counted and where the extracted catalogs are read from.
+        """
+        self.directory = directory
+        self.crawler_settings = crawler_settings
+        self.stats = stats
+        self.catalogs = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """
+        Retrieves the necessary arguments to initialize this Item Component.
+
+        The single required configured parameter is
+        `src.environmentvariables.EnvironmentVariables.SNAPSHOT_DIRECTORY_ARG`. The snapshots are compared when the
+        spider closes, as only then the reason it was closed is known.
+
+        :param crawler: Used to get the settings and the stats.
+        :return: :py:class:`src.pipelines.catalogsnapshot.CatalogSnapshot` instance.
+        """
+        pipeline = cls(crawler.settings.get(EnvironmentVariables.SNAPSHOT_DIRECTORY_ARG), crawler.settings,
+                       crawler.stats)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        """
+        Creates the snapshots directory and instantiates the notifier.
+
+        :param spider: Unused.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.notifier = NotifierFactory.get_notifier(self.crawler_settings)
+
+    @instrumented_stage('CatalogSnapshot')
+    def process_item(self, item, spider):
+        """
+        Records the product in the snapshot of its catalog.
+
+        :param item: Product to be recorded.
+        :param spider: Unused.
+        :return: item
+        """
+        self.catalogs.setdefault(item.get('catalog') or 'default', []).append(
+            (item['name'], Database.cents(item['price']), item['url']))
+        return item
+
+    def spider_closed(self, spider, reason):
+        """
+        Compares and replaces the snapshot of every extracted catalog, if the spider finished successfully, and stores
+        the state of the catalogs whose snapshot was applied.
+
+        A catalog whose changes could not be written keeps its snapshot and its state, so it is compared again on the
+        next run, and its products are counted as failed.
+
+        :param spider: the spider, with the state of each catalog of this run.
+        :param reason: reason why the spider was closed.
+        """
+        if reason != 'finished':
+            CatalogSnapshot.__logger.warning("Spider did not finish. Keeping the snapshots. reason='%s'", reason)
+            return
+
+        stats = self.stats.get_stats()
+        removable = CatalogStats.removable(stats)
+        database_url = self.crawler_settings.get(EnvironmentVariables.DATABASE_URL_ARG)
+        db = DatabaseFactory.get_database(database_url) if database_url else None
+        failed = set()
+
+        try:
+            for catalog in sorted(CatalogStats.catalogs(stats, 'products') | set(self.catalogs)):
+                products = self.catalogs.get(catalog, [])
+                try:
+                    self.update(db, catalog, products, catalog in removable)
+                except Exception:
+                    CatalogSnapshot.__logger.exception(
+                        "Could not apply the snapshot of the catalog. Keeping the last one. catalog='%s'", catalog)
+                    self.stats.inc_value('vodafone/products_failed', len(products))
+                    self.stats.inc_value(CatalogStats.key(catalog, 'failed'), len(products))
+                    failed.add(catalog)
+
+            if db is not None:
+                self.save_catalog_states(db, spider, failed)
+        finally:
+            if db is not None:
+                db.close()
+
+        self.notifier.flush()
+
+    @staticmethod
+    def save_catalog_states(db, spider, failed):
+        """
+        Stores the state of every catalog of this run, except the ones whose snapshot could not be applied.
+
+        :param db: :py:class:`src.databases.database.Database` where the states are stored.
+        :param spider: the spider, with the state and the name of each catalog of this run.
+        :param failed: set with the names of the catalogs whose snapshot could not be applied.
+        """
+        for url, state in getattr(spider, 'current_states', {}).items():
+            catalog = spider.catalog_names.get(url)
+            if catalog in failed:
+                CatalogSnapshot.__logger.warning(
+                    "Snapshot of the catalog was not applied. Not storing its state. catalog='%s' url='%s'", catalog,
+                    url)
+                continue
+
+            db.save_catalog_state(url, state)
+
+    def update(self, db, catalog, products, removable):
+        """
+        Writes the snapshot of the catalog, applies its differences to the last one and replaces it.
+
+        :param db: :py:class:`src.databases.database.Database` where the changes are written, or None if there is no
+        database.
+        :param catalog: name of the catalog.
+        :param products: list of tuples with the name, price in cents and URL of each product of the catalog.
+        :param removable: whether the products missing from the catalog are removed. If not, they are kept in the
+        snapshot.
+        """
+        path = os.path.join(self.directory, '%s.snapshot' % catalog)
+        current_path = path + '.current'
+
+        Snapshot.write(current_path, products)
+        current = Snapshot(current_path)
+        previous = Snapshot(path) if os.path.exists(path) else None
+
+        try:
+            if previous is not None and not removable:
+                current = CatalogSnapshot.keep_missing(catalog, previous, current, current_path, products)
+            self.apply(db, catalog, previous, current)
+        finally:
+            current.close()
+            if previous is not None:
+                previous.close()
+
+        os.replace(current_path, path)
+
+    @staticmethod
+    def keep_missing(catalog, previous, current, path, products):
+        """
+        Writes the snapshot of the catalog again with the products of the last snapshot that are missing from it.
+
+        :param catalog: name of the catalog.
+        :param previous: :py:class:`src.structures.snapshot.Snapshot` of the last run.
+        :param current: :py:class:`src.structures.snapshot.Snapshot` of this run. It is closed if it is written again.
+        :param path: path of the snapshot of this run.
+        :param products: list of tuples with the name, price in cents and URL of each product of the catalog.
+        :return: :py:class:`src.structures.snapshot.Snapshot` of this run, with the missing products.
+        """
+        _, missing, _ = Snapshot.diff(previous, current)
+
+        if not missing:
+            return current
+
+        CatalogSnapshot.__logger.warning("Catalog had no products or errors. Keeping its missing products. "
+                                         "catalog='%s' missing=%d", catalog, len(missing))
+
+        current.close()
+        Snapshot.write(path, products + [previous.product(index) for index in missing])
+        return Snapshot(path)
+
+    def apply(self, db, catalog, previous, current):
+        """
+        Writes the added and repriced products to the database, marks the removed ones as removed and notifies about the
+        new products, the price drops and the removed products.
+
+        :param db: :py:class:`src.databases.database.Database` where the changes are written, or None if there is no
+        database.
+        :param catalog: name of the catalog.
+        :param previous: :py:class:`src.structures.snapshot.Snapshot` of the last run, or None if there is none.
+        :param current: :py:class:`src.structures.snapshot.Snapshot` of this run.
+        """
+        if previous is None:
+            added, removed, repriced = range(len(current)), [], []
+        else:
+            added, removed, repriced = Snapshot.diff(previous, current)
+
+        CatalogSnapshot.__logger.info("Compared snapshots. catalog='%s' products=%d added=%d removed=%d repriced=%d",
+                                      catalog, len(current), len(added), len(removed), len(repriced))
+
+        previous_prices = {}
+        products = [self.product(current, index, catalog) for index in added]
+        for previous_index, current_index in repriced:
+            product = self.product(current, current_index, catalog)
+            previous_prices[product['name']] = previous.prices[previous_index]
+            products.append(product)
+
+        removed_products = [self.product(previous, index, catalog) for index in removed]
+
+        if db is not None:
+            new_product_names, price_drops = CatalogSnapshot.save(db, catalog, products, removed_products)
+        else:
+            new_product_names = {products[index]['name'] for index in range(len(added))}
+            price_drops = [(product['name'], previous_prices[product['name']]) for product in products[len(added):]
+                           if Database.cents(product['price']) < previous_prices[product['name']]]
+
+        self.stats.inc_value('vodafone/products_new', len(new_product_names))
+        self.stats.inc_value('vodafone/products_changed', len(products) - len(new_product_names))
+        self.stats.inc_value('vodafone/products_removed', len(removed))
+
+        products_by_name = {product['name']: product for product in products}
+
+        for name in new_product_names:
+            self.notifier.new_product(products_by_name[name])
+            if Metrics.enabled:
+                Metrics.inc('vodafone_products_notified_total')
+
+        for name, previous_price in price_drops:
+            self.stats.inc_value('vodafone/products_price_drops')
+            self.notifier.price_drop(products_by_name[name], previous_price / 100)
+
+        for product in removed_products:
+            CatalogSnapshot.__logger.info("Product is no longer available: %s", product)
+            self.notifier.removed_product(product)
+
+    @staticmethod
+    def save(db, catalog, products, removed_products):
+        """
+        Writes the products to the database in batches and marks the removed ones as removed.
+
+        :param db: :py:class:`src.databases.database.Database` where the changes are written.
+        :param catalog: name of the catalog.
+        :param products: list of :py:class:`src.domain.product.Product` that were added or repriced.
+        :param removed_products: list of :py:class:`src.domain.product.Product` that were removed.
+        :return: tuple with the set of names of the new products and a list of tuples with the name and the previous
+        price in cents of the products whose price dropped.
+        """
+        new_product_names = set()
+        price_drops = []
+
+        for start in range(0, len(products), CatalogSnapshot.BATCH_SIZE):
+            result = db.insert_many(products[start:start + CatalogSnapshot.BATCH_SIZE])
+            new_product_names |= result.new
+            price_drops += [(price_drop.name, price_drop.previous_price) for price_drop in result.price_drops]
+
+        db.remove_many(catalog, [product['name'] for product in removed_products])
+
+        return new_product_names, price_drops
+
+    @staticmethod
+    def product(snapshot, index, catalog):
+        """
+        :param snapshot: :py:class:`src.structures.snapshot.Snapshot` with the product.
+        :param index: position of the product in the snapshot.
+        :param catalog: name of the catalog.
+        :return: :py:class:`src.domain.product.Product`.
+        """
+        name, price, url = snapshot.product(index)
+        return Product(name=name, price=price / 100, url=url, catalog=catalog)
@@ -0,0 +1,21 @@
+import logging
+
+from scrapy.logformatter import LogFormatter
+
+
+class DroppedItemLogFormatter(LogFormatter):
+    """
+    `Log formatter <https://docs.scrapy.org/en/2.1/topics/logging.html#custom-log-formats>`_ of the crawler.
+
+    Items are dropped by :py:class:`src.pipelines.productvalidator.ProductValidator` and
+    :py:class:`src.pipelines.duplicatesfilter.DuplicatesFilter`, which publish a single summary of them when the spider
+    closes. Each dropped item is therefore only logged at debug level, instead of a warning per item.
+    """
+
+    def dropped(self, item, exception, response, spider):
+        """
+        :return: the same message of :py:class:`scrapy.logformatter.LogFormatter`, at debug level.
+        """
+        message = super().dropped(item, exception, response, spider)
+        message['level'] = logging.DEBUG
+        return message
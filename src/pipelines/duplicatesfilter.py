@@ -2,18 +2,27 @@ import logging
 
 from scrapy.exceptions import DropItem
 
+from src.environmentvariables import EnvironmentVariables
+from src.metrics.instrumentation import instrumented_stage
 from src.notifiers.notifierfactory import NotifierFactory
+from src.structures.fingerprintset import FingerprintSet
 
 
 class DuplicatesFilter:
     """
-    Stateless filter able to be an `Item Pipeline component
+    Filter able to be an `Item Pipeline component
     <https://docs.scrapy.org/en/2.1/topics/item-pipeline.html>`_ on Scrappy.
 
     This class removes duplicates of :py:class:`src.domain.product.Product` by dropping them.
+
+    Product names are tracked by a :py:class:`src.structures.fingerprintset.FingerprintSet`. Duplicates are reported in
+    a single summary when the spider closes.
     """
     __logger = logging.getLogger(__name__)
 
+    # Number of duplicated products kept to be reported
+    SAMPLES = 5
+
     def __init__(self, crawler_settings):
         """
         Stores crawler_settings and start with the no products seen.
@@ -21,7 +30,9 @@ class DuplicatesFilter:
         :param crawler_settings: Settings of the crawler :py:class:`scrapy.settings.Settings`.
         """
         self.crawler_settings = crawler_settings
-        self.products_seen = set()
+        self.products_seen = FingerprintSet(exact=crawler_settings.getbool(EnvironmentVariables.DUPLICATES_EXACT_ARG))
+        self.duplicates = 0
+        self.duplicate_samples = []
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -45,6 +56,24 @@ class DuplicatesFilter:
         """
         self.notifier = NotifierFactory.get_notifier(self.crawler_settings)
 
+    def close_spider(self, spider):
+        """
+        Publishes the summary of the duplicated products, if any, and waits for the delivery of all the notifications.
+
+        :param spider: Unused.
+        """
+        tracked = len(self.products_seen)
+        DuplicatesFilter.__logger.info("Tracked %d products in %d bytes (%.1f bytes per product).", tracked,
+                                       self.products_seen.memory(), self.products_seen.memory() / max(tracked, 1))
+
+        if self.duplicates:
+            samples = ', '.join("'%s'" % sample for sample in self.duplicate_samples)
+            DuplicatesFilter.__logger.warning("Dropped %d duplicated products. samples=%s", self.duplicates, samples)
+            self.notifier.warning("Dropped %d duplicated products. samples=%s", self.duplicates, samples)
+
+        self.notifier.flush()
+
+    @instrumented_stage('DuplicatesFilter')
     def process_item(self, item, spider):
         """
         Check if the item of :py:class:`src.domain.product.Product` has been seen before by keeping track of all product
@@ -56,11 +85,12 @@ class DuplicatesFilter:
         :param spider: Unused.
         :return:
         """
-        if item['name'] in self.products_seen:
-            DuplicatesFilter.__logger.info("Dropping duplicated product: '%s'", item)
-            self.notifier.warning("Dropping duplicated product: '%s'" % item)
-            raise DropItem("Duplicate product found: '%s'" % item)
-        else:
+        if self.products_seen.add(item['name']):
             DuplicatesFilter.__logger.info("Adding unseen product: '%s'", item)
-            self.products_seen.add(item['name'])
             return item
+        else:
+            DuplicatesFilter.__logger.info("Dropping duplicated product: '%s'", item)
+            self.duplicates += 1
+            if len(self.duplicate_samples) < DuplicatesFilter.SAMPLES:
+                self.duplicate_samples.append(item)
+            raise DropItem("Duplicate product found: '%s'" % item)
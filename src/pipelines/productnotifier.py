@@ -1,3 +1,5 @@
+from src.metrics.instrumentation import instrumented_stage
+from src.metrics.metrics import Metrics
 from src.notifiers.notifierfactory import NotifierFactory
 
 
@@ -6,7 +8,8 @@ class ProductNotifier:
     Notifier class able to be an `Item Pipeline component
     <https://docs.scrapy.org/en/2.1/topics/item-pipeline.html>`_ on Scrappy.
 
-    This class notifies about every :py:class:`src.domain.product.Product` and returns it for further processing.
+    This class notifies about every :py:class:`src.domain.product.Product` and returns it for further processing. If a
+    watchlist is configured, the notifier only publishes the products that match the rules of its subscribers.
     """
 
     def __init__(self, crawler_settings):
@@ -39,6 +42,15 @@ class ProductNotifier:
         """
         self.notifier = NotifierFactory.get_notifier(self.crawler_settings)
 
+    def close_spider(self, spider):
+        """
+        Waits for the delivery of all the notifications.
+
+        :param spider: Unused.
+        """
+        self.notifier.flush()
+
+    @instrumented_stage('ProductNotifier')
     def process_item(self, item, spider):
         """
         Uses the appropriate notifier to publish about the product.
@@ -48,4 +60,8 @@ class ProductNotifier:
         :return: item
         """
         self.notifier.new_product(item)
+
+        if Metrics.enabled:
+            Metrics.inc('vodafone_products_notified_total')
+
         return item
@@ -1,30 +1,39 @@
 import logging
 
-import validators
 from scrapy.exceptions import DropItem
 
+from src.metrics.catalogstats import CatalogStats
+from src.metrics.instrumentation import instrumented_stage
 from src.notifiers.notifierfactory import NotifierFactory
+from src.validation.validationengine import ValidationEngine
 
 
 class ProductValidator:
     """
-    Stateless validator able to be an `Item Pipeline component
+    Validator able to be an `Item Pipeline component
     <https://docs.scrapy.org/en/2.1/topics/item-pipeline.html>`_ on Scrappy.
 
-    This class validates a given item of :py:class:`src.domain.product.Product` with a series of validators.
+    This class validates a given item of :py:class:`src.domain.product.Product` with a
+    :py:class:`src.validation.validationengine.ValidationEngine`.
 
-    Invalid items are dropped. Valid items are returned to go further down the line.
+    Invalid items are dropped and counted as errors of their catalog, so the products of the catalog are not taken as
+    removed. Valid items are returned to go further down the line. A single summary of the invalid items is published
+    when the spider closes.
     """
 
     __logger = logging.getLogger(__name__)
 
-    def __init__(self, crawler_settings):
+    def __init__(self, crawler_settings, stats=None):
         """
-        Stores crawler_settings.
+        Stores crawler_settings and the stats.
 
         :param crawler_settings: Settings of the crawler :py:class:`scrapy.settings.Settings`.
+        :param stats: Optional :py:class:`scrapy.statscollectors.StatsCollector` where the invalid products are counted
+        per catalog.
         """
         self.crawler_settings = crawler_settings
+        self.stats = stats
+        self.engine = ValidationEngine()
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -33,10 +42,10 @@ class ProductValidator:
 
         Mainly the crawler settings to get the appropriate notifier.
 
-        :param crawler: Used to choose the appropriate notifier.
+        :param crawler: Used to choose the appropriate notifier and to get the stats.
         :return: :py:class:`src.pipelines.productvalidator.ProductValidator` instance.
         """
-        return cls(crawler.settings)
+        return cls(crawler.settings, crawler.stats)
 
     def open_spider(self, spider):
         """
@@ -48,54 +57,21 @@ class ProductValidator:
         """
         self.notifier = NotifierFactory.get_notifier(self.crawler_settings)
 
-    def valid_name(self, item):
+    def close_spider(self, spider):
         """
-        Validates the name of a given item of :py:class:`src.domain.product.Product`.
+        Publishes the summary of the invalid products, if any, and waits for the delivery of all the notifications.
 
-        Checks the name is not empty.
-
-        :param item: Product to be validated.
-        :return: True if product passed validation, False otherwise.
-        """
-        if item['name']:
-            ProductValidator.__logger.debug("Product has valid name: '%s'", item)
-            return True
-
-        ProductValidator.__logger.warning("Product contains invalid name: '%s'", item)
-        return False
-
-    def valid_price(self, item):
-        """
-        Validates the price of a given item of :py:class:`src.domain.product.Product`.
-
-        Only valid if it is non-negative.
-
-        :param item: Product to be validated.
-        :return: True if product passed validation, False otherwise.
+        :param spider: Unused.
         """
-        if item['price'] >= 0:
-            ProductValidator.__logger.debug("Product has valid price: '%s'", item)
-            return True
-
-        ProductValidator.__logger.warning("Product contains invalid price: '%s'", item)
-        return False
+        summary = self.engine.summary()
 
-    def valid_url(self, item):
-        """
-        Validates the url of a given item of :py:class:`src.domain.product.Product`.
+        if summary:
+            ProductValidator.__logger.warning("Invalid Products found.\n%s", summary)
+            self.notifier.warning("Invalid Products found.\n%s", summary)
 
-        URL validation is performed according to :py:func:`validators.url.url`.
-
-        :param item: Product to be validated.
-        :return: True if product passed validation, False otherwise.
-        """
-        if validators.url(item['url']) is True:
-            ProductValidator.__logger.debug("Product has valid URL: '%s'", item)
-            return True
-
-        ProductValidator.__logger.warning("Product contains invalid URL: '%s'", item)
-        return False
+        self.notifier.flush()
 
+    @instrumented_stage('ProductValidator')
     def process_item(self, item, spider):
         """
         Validates a given item of :py:class:`src.domain.product.Product` by checking the name, price and URL.
@@ -106,10 +82,14 @@ class ProductValidator:
         :param spider: Unused.
         :return: item if valid, :py:class:`scrapy.exceptions.DropItem` is thrown otherwise.
         """
-        if self.valid_name(item) and self.valid_price(item) and self.valid_url(item):
-            ProductValidator.__logger.debug("Valid Product: '%s'", item)
+        reason = self.engine.validate(item)
+
+        if reason is None:
+            if ProductValidator.__logger.isEnabledFor(logging.DEBUG):
+                ProductValidator.__logger.debug("Valid Product: '%s'", item)
             return item
 
-        ProductValidator.__logger.warning("Invalid Product: '%s'", item)
-        self.notifier.warning("Invalid Product: '%s'" % item)
-        raise DropItem("Invalid Product: '%s'" % item)
+        if self.stats is not None and item.get('catalog') is not None:
+            self.stats.inc_value(CatalogStats.key(item['catalog'], 'errors'))
+
+        raise DropItem("Invalid Product (%s): '%s'" % (reason, item))
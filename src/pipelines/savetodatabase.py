@@ -1,9 +1,17 @@
 import logging
+import sys
 
+from scrapy import signals
 from scrapy.exceptions import DropItem
+from twisted.internet import defer, reactor
 
+from src.databases.database import Database
 from src.databases.databasefactory import DatabaseFactory
+from src.domain.product import Product
 from src.environmentvariables import EnvironmentVariables
+from src.metrics.catalogstats import CatalogStats
+from src.metrics.instrumentation import instrumented_stage
+from src.notifiers.notifierfactory import NotifierFactory
 
 
 class SaveToDatabase:
@@ -14,16 +22,55 @@ class SaveToDatabase:
     This class inserts new :py:class:`src.domain.product.Product` on the database and drops existent ones.
 
     Database is instantiated according to :py:class:`src.databases.databasefactory.DatabaseFactory`.
+
+    All the stored products are loaded into an index when the spider opens. Products that are known and whose price and
+    URL did not change are dropped without touching the database.
+
+    When the batch size is greater than 1, products are buffered and written with
+    :py:meth:`src.databases.database.Database.insert_many`. Each buffered product is held by a
+    :py:class:`twisted.internet.defer.Deferred` that only fires once its batch is flushed, so new products still flow
+    to the next pipelines.
+
+    Price drops are detected by the database while writing each batch and are notified straight away, as the products
+    whose price changed are dropped by this pipeline.
+
+    Every spider gets a run id from the database, which is stamped on every product it writes and, in batches of
+    `SEEN_BATCH_SIZE`, on the known products it drops. When the spider finishes successfully, the products of the
+    extracted catalogs that were not stamped are marked as removed by a single statement and notified. Catalogs that
+    were skipped (because they did not change) are left alone, and products stored without a catalog are only removed
+    when every requested catalog was extracted.
     """
     __logger = logging.getLogger(__name__)
 
-    def __init__(self, database_url):
+    # Seconds to wait before flushing an incomplete batch. Scrapy only finishes a response once all its items went
+    # through the pipeline, so the last (incomplete) batch would otherwise wait forever.
+    FLUSH_INTERVAL = 1.0
+    # Number of known products whose run is stamped per statement
+    SEEN_BATCH_SIZE = 10000
+
+    def __init__(self, database_url, batch_size=1, stats=None, crawler_settings=None):
         """
-        Stores the database URL.
+        Stores the database URL and the batch size.
 
         :param database_url: URL of the database to connect to.
+        :param batch_size: Maximum number of products written per transaction. 1 disables buffering.
+        :param stats: Optional :py:class:`scrapy.statscollectors.StatsCollector` where the number of new and changed
+        products is counted.
+        :param crawler_settings: Optional settings of the crawler :py:class:`scrapy.settings.Settings` used to get the
+        notifier of the price drops. Price drops are only logged without them.
         """
         self.database_url = database_url
+        self.batch_size = batch_size
+        self.stats = stats
+        self.crawler_settings = crawler_settings
+        self.notifier = None
+        self.pending = []
+        self.flush_call = None
+        self.index = {}
+        self.run = None
+        self.seen = []
+        # Whether the connection is closed on the spider_closed signal, once the removed products were detected
+        self.closes_on_signal = False
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -32,38 +79,274 @@ class SaveToDatabase:
 
         The single required configured parameter is `src.environmentvariables.EnvironmentVariables.DATABASE_URL_ARG`.
 
+        The batch size defaults to `src.environmentvariables.EnvironmentVariables.DATABASE_BATCH_SIZE`, the same as the
+        settings of :py:class:`src.scraper.Scraper`, and it is capped by `CONCURRENT_ITEMS` as Scrapy never has more
+        items than that in the pipeline at the same time. The removed products are detected when the spider closes, as
+        only then the reason it was closed is known.
+
         :param crawler: Used to choose the appropriate database.
         :return: :py:class:`src.pipelines.savetodatabase.SaveToDatabase` instance.
         """
-        return cls(crawler.settings.get(EnvironmentVariables.DATABASE_URL_ARG))
+        batch_size = crawler.settings.getint(EnvironmentVariables.DATABASE_BATCH_SIZE_ARG,
+                                             int(EnvironmentVariables.DATABASE_BATCH_SIZE))
+        concurrent_items = crawler.settings.getint('CONCURRENT_ITEMS')
+
+        if batch_size > concurrent_items:
+            SaveToDatabase.__logger.warning("Batch size is bigger than CONCURRENT_ITEMS. Using %d instead of %d.",
+                                            concurrent_items, batch_size)
+            batch_size = concurrent_items
+
+        pipeline = cls(crawler.settings.get(EnvironmentVariables.DATABASE_URL_ARG), batch_size, crawler.stats,
+                       crawler.settings)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        pipeline.closes_on_signal = True
+        return pipeline
 
     def open_spider(self, spider):
         """
-        Instantiates database connection.
+        Instantiates database connection and the notifier, starts a run and loads the index of known products.
 
         Check :py:class:`src.databases.databasefactory.DatabaseFactory` initialization details.
 
         :param spider: Unused.
         """
         self.db = DatabaseFactory.get_database(self.database_url)
+        if self.crawler_settings is not None:
+            self.notifier = NotifierFactory.get_notifier(self.crawler_settings)
+        self.run = self.db.start_run()
+        self.index = {name: (price, url) for name, price, url in self.db.products()}
+
+        SaveToDatabase.__logger.info('Loaded index of known products. run=%d products=%d memory=%.1fKiB',
+                                     self.run, len(self.index), self.index_size() / 1024)
+
+    def index_size(self):
+        """
+        Estimates the memory used by the index of known products, including its keys and values.
+
+        :return: size in bytes.
+        """
+        size = sys.getsizeof(self.index)
+
+        for name, value in self.index.items():
+            size += sys.getsizeof(name) + sys.getsizeof(value) + sum(sys.getsizeof(field) for field in value)
+
+        return size
 
     def close_spider(self, spider):
         """
-        Closes the database connection.
+        Flushes the pending and the seen products. Unless it is done on the spider_closed signal, closes the database
+        connection and waits for the delivery of all the notifications.
+
         :param spider: Unused.
         """
+        self.flush()
+        self.flush_seen()
+
+        if not self.closes_on_signal:
+            self.close()
+
+    def spider_closed(self, spider, reason):
+        """
+        Marks the products that were not seen as removed, if the spider finished successfully, closes the database
+        connection and waits for the delivery of all the notifications.
+
+        :param spider: Spider whose requested catalogs are compared with the extracted ones.
+        :param reason: reason why the spider was closed.
+        """
+        try:
+            if reason == 'finished':
+                self.remove_unseen(spider)
+            else:
+                SaveToDatabase.__logger.warning("Spider did not finish. Not detecting removed products. reason='%s'",
+                                                reason)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Closes the database connection and waits for the delivery of all the notifications.
+        """
         self.db.close()
 
+        if self.notifier is not None:
+            self.notifier.flush()
+
+    @instrumented_stage('SaveToDatabase')
     def process_item(self, item, spider):
         """
         Inserts the given item of :py:class:`src.domain.product.Product` in the database. If it already exists, then it
         is dropped. Otherwise, the item is returned for further processing.
 
+        When buffering, a :py:class:`twisted.internet.defer.Deferred` is returned instead. It fires with the item once
+        the batch is flushed.
+
         :param item: Product to be inserted.
         :param spider: Unused.
         :return: item if new, :py:class:`scrapy.exceptions.DropItem` is thrown otherwise.
         """
-        is_new_item = self.db.insert(item)
+        if self.index.get(item['name']) == (Database.cents(item['price']), item['url']):
+            self.seen.append(item)
+            if len(self.seen) >= SaveToDatabase.SEEN_BATCH_SIZE:
+                self.flush_seen()
+
+            SaveToDatabase.__logger.info('Product already exists on the database: %s', item)
+            raise DropItem('Product already exists on the database: %s' % item)
+
+        if self.batch_size <= 1:
+            try:
+                result = self.db.insert_many([item], self.run)
+            except Exception:
+                self.record_failure([item])
+                raise
+
+            self.notify_price_drops(result.price_drops, {item['name']: item})
+            return self.settle(item, item['name'] in result.new)
+
+        deferred = defer.Deferred()
+        self.pending.append((item, deferred))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.flush_call is None:
+            self.flush_call = reactor.callLater(SaveToDatabase.FLUSH_INTERVAL, self.flush)
+
+        return deferred
+
+    def flush(self):
+        """
+        Writes all the pending products in a single batch and fires their deferreds.
+        """
+        if self.flush_call is not None and self.flush_call.active():
+            self.flush_call.cancel()
+        self.flush_call = None
+
+        pending, self.pending = self.pending, []
+
+        if not pending:
+            return
+
+        try:
+            result = self.db.insert_many([item for item, _ in pending], self.run)
+        except Exception as exception:
+            self.record_failure([item for item, _ in pending])
+            for _, deferred in pending:
+                deferred.errback(exception)
+            return
+
+        SaveToDatabase.__logger.info('Flushed batch of products to the database. size=%d new=%d price_drops=%d',
+                                     len(pending), len(result.new), len(result.price_drops))
+
+        self.notify_price_drops(result.price_drops, {item['name']: item for item, _ in pending})
+
+        for item, deferred in pending:
+            try:
+                deferred.callback(self.settle(item, item['name'] in result.new))
+            except DropItem as drop:
+                deferred.errback(drop)
+
+    def record_failure(self, items):
+        """
+        Counts the products that could not be written, per catalog, so the spider does not store the state of their
+        catalogs and they are not skipped on the next run.
+
+        :param items: list of :py:class:`src.domain.product.Product` that were not written.
+        """
+        SaveToDatabase.__logger.error('Could not write products to the database. size=%d', len(items))
+
+        if self.stats is None:
+            return
+
+        self.stats.inc_value('vodafone/products_failed', len(items))
+        for item in items:
+            if item.get('catalog') is not None:
+                self.stats.inc_value(CatalogStats.key(item['catalog'], 'failed'))
+
+    def flush_seen(self):
+        """
+        Stamps the run on the known products that were dropped since the last call.
+        """
+        seen, self.seen = self.seen, []
+
+        if not seen:
+            return
+
+        try:
+            self.db.mark_seen(self.run, seen)
+        except Exception as exception:
+            # Unstamped products would be taken as removed, so their catalogs are left out of the detection
+            SaveToDatabase.__logger.error("Could not mark known products as seen! run=%d exception='%s'", self.run,
+                                          exception)
+            self.record_failure(seen)
+            return
+
+        SaveToDatabase.__logger.debug('Marked known products as seen. run=%d size=%d', self.run, len(seen))
+
+    def remove_unseen(self, spider):
+        """
+        Marks the products of the extracted catalogs that were not seen by the run as removed, and logs and notifies
+        about each of them.
+
+        Only the catalogs given by :py:meth:`src.metrics.catalogstats.CatalogStats.removable` are looked at, so catalogs
+        that extracted no products, or had products that could not be extracted, validated or written (and therefore
+        stamped), keep theirs. The run is only complete if every requested catalog is removable.
+
+        :param spider: Spider whose requested catalogs are compared with the extracted ones.
+        """
+        stats = self.stats.get_stats() if self.stats else None
+        extracted = CatalogStats.catalogs(stats, 'products')
+        removable = CatalogStats.removable(stats)
+
+        if extracted - removable:
+            SaveToDatabase.__logger.warning('Some catalogs had no products or errors. Not detecting their removed '
+                                            'products. run=%d catalogs=%s', self.run, sorted(extracted - removable))
+        if not removable:
+            SaveToDatabase.__logger.info('No catalog can have removed products. Not detecting them. run=%d', self.run)
+            return
+
+        requested = {catalog['name'] for catalog in spider.catalog_definitions()}
+        complete = requested <= removable and not self.stats.get_value('vodafone/products_failed')
+        removed_products = self.db.remove_unseen(self.run, removable, complete)
+
+        SaveToDatabase.__logger.info('Detected removed products. run=%d catalogs=%s removed=%d', self.run,
+                                     sorted(removable), len(removed_products))
+
+        for removed in removed_products:
+            product = Product(name=removed.name, price=removed.price / 100, url=removed.url, catalog=removed.catalog)
+            SaveToDatabase.__logger.info('Product is no longer available: %s', product)
+
+            self.stats.inc_value('vodafone/products_removed')
+            if self.notifier is not None:
+                self.notifier.removed_product(product)
+
+    def notify_price_drops(self, price_drops, items):
+        """
+        Logs and notifies about each price drop.
+
+        :param price_drops: list of :py:class:`src.databases.database.PriceDrop`.
+        :param items: dict with the written products by name.
+        """
+        for price_drop in price_drops:
+            item = items[price_drop.name]
+            SaveToDatabase.__logger.info('Price of product dropped from %.2f: %s', price_drop.previous_price / 100,
+                                         item)
+
+            if self.stats is not None:
+                self.stats.inc_value('vodafone/products_price_drops')
+            if self.notifier is not None:
+                self.notifier.price_drop(item, price_drop.previous_price / 100)
+
+    def settle(self, item, is_new_item):
+        """
+        Returns the item if it is new, drops it otherwise.
+
+        :param item: Product that has been inserted.
+        :param is_new_item: Whether the product did not exist before.
+        :return: item if new, :py:class:`scrapy.exceptions.DropItem` is thrown otherwise.
+        """
+        self.index[item['name']] = (Database.cents(item['price']), item['url'])
+
+        if self.stats is not None:
+            self.stats.inc_value('vodafone/products_new' if is_new_item else 'vodafone/products_changed')
 
         if is_new_item:
             SaveToDatabase.__logger.debug('Inserted new product on the database: %s', item)
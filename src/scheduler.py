@@ -0,0 +1,299 @@
+import datetime
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+
+from src.environmentvariables import EnvironmentVariables
+from src.metrics.metrics import Metrics
+
+
+def work(connection):
+    """
+    Body of a worker process. Imports the scraper and connects to the database ahead of time, waits for a single job,
+    runs it (profiling it, if requested) and exits.
+
+    Scrapy cannot restart its reactor, so every worker runs one job only.
+
+    :param connection: :py:class:`multiprocessing.connection.Connection` to the scheduler.
+    """
+    from src.scraper import Scraper
+
+    if EnvironmentVariables.DATABASE_URL:
+        warm_up_database(EnvironmentVariables.DATABASE_URL)
+
+    job = connection.recv()
+    if job is None:
+        return
+
+    try:
+        stats = Scraper.scrape(profile=job['profile'])
+        connection.send(('finished', stats, Metrics.snapshot()))
+    except Exception as exception:
+        connection.send(('failed', repr(exception), Metrics.snapshot()))
+
+
+def warm_up_database(database_url):
+    """
+    Opens the database once, so its connections are established and its schema is checked before the job arrives.
+    Databases that pool their connections keep them open for the job.
+
+    :param database_url: URL of the database.
+    """
+    from src.databases.databasefactory import DatabaseFactory
+
+    try:
+        DatabaseFactory.get_database(database_url).close()
+    except Exception as exception:
+        logging.getLogger(__name__).warning("Could not warm up the database. exception='%s'", exception)
+
+
+class Job:
+    """
+    A scraping run requested to the :py:class:`src.scheduler.Scheduler`.
+    """
+
+    def __init__(self, job_id, profile=False):
+        """
+        :param job_id: Sequential id of the job.
+        :param profile: whether to profile the run. See :py:class:`src.metrics.profiler.Profiler`.
+        """
+        self.id = job_id
+        self.profile = profile
+        self.state = 'queued'
+        self.triggers = 1
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stats = {}
+        self.error = None
+        self.done = threading.Event()
+
+    def changes(self):
+        """
+        :return: number of products that were added, removed or changed their price or URL during the job.
+        """
+        keys = ('vodafone/products_new', 'vodafone/products_changed', 'vodafone/products_removed')
+
+        if any(key in self.stats for key in keys):
+            return sum(self.stats.get(key, 0) for key in keys)
+
+        # Without a database, every product that went through all the pipelines is a change
+        return self.stats.get('item_scraped_count', 0)
+
+    def to_dict(self):
+        """
+        :return: JSON serializable representation of the job, with its timings in seconds.
+        """
+        crawl_started_at = None
+        if 'start_time' in self.stats:
+            crawl_started_at = self.stats['start_time'].replace(tzinfo=datetime.timezone.utc).timestamp()
+
+        return {
+            'id': self.id,
+            'state': self.state,
+            'triggers': self.triggers,
+            'queued_at': self.queued_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_time': self.started_at - self.queued_at if self.started_at else None,
+            'startup_time': crawl_started_at - self.started_at if crawl_started_at else None,
+            'run_time': self.finished_at - self.started_at if self.finished_at else None,
+            'items_scraped': self.stats.get('item_scraped_count', 0),
+            'items_dropped': self.stats.get('item_dropped_count', 0),
+            'products_new': self.stats.get('vodafone/products_new', 0),
+            'products_changed': self.stats.get('vodafone/products_changed', 0),
+            'products_removed': self.stats.get('vodafone/products_removed', 0),
+            'finish_reason': self.stats.get('finish_reason'),
+            'profile': self.stats.get('vodafone/profile'),
+            'error': self.error
+        }
+
+
+class Scheduler:
+    """
+    Runs the scraper in a separate process, one job at a time.
+
+    A worker process with the scraper already imported is always kept ready, so a job starts as soon as it is
+    triggered. Workers are replaced after every job. Triggers received while a job is queued or running are merged into
+    that job instead of starting a new one.
+    """
+    __logger = logging.getLogger(__name__)
+
+    # Number of finished jobs whose status is kept
+    HISTORY_SIZE = 100
+
+    def __init__(self):
+        """
+        Starts the first worker.
+        """
+        self.context = multiprocessing.get_context('spawn')
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = OrderedDict()
+        self.current_job = None
+        self.worker = None
+        self.connection = None
+        self.listeners = []
+
+        self.__start_worker()
+
+    def __start_worker(self):
+        self.connection, worker_connection = self.context.Pipe()
+        self.worker = self.context.Process(target=work, args=(worker_connection,), name='scraper', daemon=True)
+        self.worker.start()
+        worker_connection.close()
+        Scheduler.__logger.info('Started warm worker. pid=%d', self.worker.pid)
+
+    def trigger(self, profile=False):
+        """
+        Requests a scraping run. It is merged into the current job, if there is one, which is only profiled if it was
+        requested so.
+
+        :param profile: whether to profile the run. See :py:class:`src.metrics.profiler.Profiler`.
+        :return: tuple with the :py:class:`src.scheduler.Job` and whether it was merged into an existent one.
+        """
+        with self.lock:
+            if self.current_job is not None:
+                self.current_job.triggers += 1
+                Scheduler.__logger.info('Merged trigger into job %d.', self.current_job.id)
+                return self.current_job, True
+
+            job = Job(next(self.ids), profile)
+            self.current_job = job
+            self.jobs[job.id] = job
+
+            while len(self.jobs) > Scheduler.HISTORY_SIZE:
+                self.jobs.popitem(last=False)
+
+        threading.Thread(target=self.__run, args=(job,), name='scheduler-job-%d' % job.id, daemon=True).start()
+        return job, False
+
+    def job(self, job_id):
+        """
+        :param job_id: Id of the job.
+        :return: :py:class:`src.scheduler.Job` or None if it is unknown.
+        """
+        return self.jobs.get(job_id)
+
+    def latest_jobs(self):
+        """
+        :return: the known jobs, from the most recent to the oldest.
+        """
+        # Requests are served concurrently, so a trigger could change the jobs while they are listed
+        with self.lock:
+            return list(reversed(self.jobs.values()))
+
+    def __run(self, job):
+        """
+        Hands the job to the warm worker, waits for its result and starts the next worker.
+
+        :param job: :py:class:`src.scheduler.Job` to run.
+        """
+        if not self.worker.is_alive():
+            Scheduler.__logger.warning('Warm worker died. Starting a new one.')
+            self.__start_worker()
+
+        job.state = 'running'
+        job.started_at = time.time()
+        Scheduler.__logger.info('Running job %d. queue_time=%.3fs', job.id, job.started_at - job.queued_at)
+
+        try:
+            self.connection.send({'profile': job.profile})
+            job.state, result, metrics = self.connection.recv()
+            Metrics.merge(metrics)
+        except (EOFError, OSError) as exception:
+            job.state, result = 'failed', 'Worker exited unexpectedly: %r' % exception
+
+        Metrics.inc('vodafone_jobs_total', (('state', job.state),))
+
+        if job.state == 'finished':
+            job.stats = result
+        else:
+            job.error = result
+
+        job.finished_at = time.time()
+        self.worker.join()
+        self.connection.close()
+        self.__start_worker()
+
+        with self.lock:
+            self.current_job = None
+
+        Scheduler.__logger.info('Job %d %s. run_time=%.3fs', job.id, job.state, job.finished_at - job.started_at)
+        job.done.set()
+
+        for listener in self.listeners:
+            listener(job)
+
+    def add_listener(self, listener):
+        """
+        :param listener: callable that receives every :py:class:`src.scheduler.Job` once it finishes.
+        """
+        self.listeners.append(listener)
+
+
+class AdaptiveTrigger:
+    """
+    Triggers the :py:class:`src.scheduler.Scheduler` periodically, adapting the interval to how often the catalog
+    changes.
+
+    After each job, no matter who triggered it, the interval is halved if products were added or changed, and doubled
+    otherwise. It always stays between the given bounds. The next job is triggered one interval after the last one
+    finished.
+    """
+    __logger = logging.getLogger(__name__)
+
+    def __init__(self, scheduler, min_interval, max_interval):
+        """
+        :param scheduler: :py:class:`src.scheduler.Scheduler` to trigger.
+        :param min_interval: Minimum number of seconds between jobs. It is also the initial interval.
+        :param max_interval: Maximum number of seconds between jobs.
+        """
+        self.scheduler = scheduler
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_run = time.time() + min_interval
+        self.condition = threading.Condition()
+
+        scheduler.add_listener(self.on_job_finished)
+
+    def start(self):
+        """
+        Starts triggering jobs in the background.
+        """
+        threading.Thread(target=self.__loop, name='adaptive-trigger', daemon=True).start()
+
+    def on_job_finished(self, job):
+        """
+        Adapts the interval to the changes observed by the job and schedules the next one.
+
+        Failed jobs keep the interval as they tell nothing about the catalog.
+
+        :param job: finished :py:class:`src.scheduler.Job`.
+        """
+        with self.condition:
+            if job.state == 'finished':
+                if job.changes():
+                    self.interval = max(self.min_interval, self.interval / 2)
+                else:
+                    self.interval = min(self.max_interval, self.interval * 2)
+
+            self.next_run = job.finished_at + self.interval
+            self.condition.notify()
+
+        AdaptiveTrigger.__logger.info('Next scrape in %.0f seconds. changes=%d', self.interval, job.changes())
+
+    def __loop(self):
+        while True:
+            with self.condition:
+                while time.time() < self.next_run:
+                    self.condition.wait(self.next_run - time.time())
+
+                # Postponed until the job finishes, which reschedules it
+                self.next_run = float('inf')
+
+            self.scheduler.trigger()
@@ -1,3 +1,5 @@
+import argparse
+
 from scrapy.crawler import CrawlerProcess
 from scrapy.settings import Settings
 
@@ -7,35 +9,110 @@ from src.spiders.vodafonebusinessstore import VodafoneBusinessStore
 
 class Scraper:
     """
-    Functional class that contains a single method.
+    Functional class that scrapes the Vodafone Business Store.
     """
     @staticmethod
-    def scrape():
+    def settings():
         """
-        Scrapes the Vodafone Business Store. For each scrapped product, it validates it, check it was already processed,
-         saves to a database and notifies about it.
+        Builds the settings of the crawler from the environment variables.
+
+        :return: :py:class:`scrapy.settings.Settings`.
         """
         settings = Settings()
 
         settings.set(EnvironmentVariables.DATABASE_URL_ARG, EnvironmentVariables.DATABASE_URL)
+        settings.set(EnvironmentVariables.DATABASE_BATCH_SIZE_ARG, EnvironmentVariables.DATABASE_BATCH_SIZE)
+
+        settings.set(EnvironmentVariables.DUPLICATES_EXACT_ARG, EnvironmentVariables.DUPLICATES_EXACT)
+        settings.set(EnvironmentVariables.CATALOG_PARSER_ARG, EnvironmentVariables.CATALOG_PARSER)
+        settings.set(EnvironmentVariables.CATALOGS_ARG, EnvironmentVariables.CATALOGS)
+
+        # Every catalog is on the same host, so the per domain limit is what keeps the scraper polite
+        settings.set('CONCURRENT_REQUESTS', int(EnvironmentVariables.CONCURRENT_REQUESTS))
+        settings.set('CONCURRENT_REQUESTS_PER_DOMAIN', int(EnvironmentVariables.CONCURRENT_REQUESTS_PER_DOMAIN))
+        settings.set('DOWNLOAD_DELAY', 0)
 
         settings.set(EnvironmentVariables.NOTIFIER_ARG, EnvironmentVariables.NOTIFIER)
+        settings.set(EnvironmentVariables.WATCHLIST_ARG, EnvironmentVariables.WATCHLIST)
         settings.set(EnvironmentVariables.SLACK_TOKEN_ARG, EnvironmentVariables.SLACK_TOKEN)
         settings.set(EnvironmentVariables.SLACK_CHANNEL_ARG, EnvironmentVariables.SLACK_CHANNEL)
+        settings.set(EnvironmentVariables.SLACK_CHANNEL_CACHE_ARG, EnvironmentVariables.SLACK_CHANNEL_CACHE)
+        settings.set(EnvironmentVariables.SLACK_CHANNEL_CACHE_TTL_ARG, EnvironmentVariables.SLACK_CHANNEL_CACHE_TTL)
+        settings.set(EnvironmentVariables.SLACK_API_URL_ARG, EnvironmentVariables.SLACK_API_URL)
+
+        settings.set(EnvironmentVariables.SNAPSHOT_DIRECTORY_ARG, EnvironmentVariables.SNAPSHOT_DIRECTORY)
+
+        settings.set(EnvironmentVariables.PROFILE_DIRECTORY_ARG, EnvironmentVariables.PROFILE_DIRECTORY)
+
+        settings.set(EnvironmentVariables.ARCHIVE_DIRECTORY_ARG, EnvironmentVariables.ARCHIVE_DIRECTORY)
+        settings.set(EnvironmentVariables.ARCHIVE_MODE_ARG, EnvironmentVariables.ARCHIVE_MODE)
+        settings.set(EnvironmentVariables.ARCHIVE_RUN_ARG, EnvironmentVariables.ARCHIVE_RUN)
+
+        if EnvironmentVariables.ARCHIVE_DIRECTORY:
+            # Responses are archived after they are decompressed (590) and replayed before anything is downloaded
+            settings.set('DOWNLOADER_MIDDLEWARES', {'src.middlewares.responsearchiver.ResponseArchiver': 580})
+
+        if EnvironmentVariables.SNAPSHOT_DIRECTORY:
+            # The snapshot stage writes to the database and notifies in bulk, once the whole catalog is known
+            settings.set('ITEM_PIPELINES', {
+                'src.pipelines.productvalidator.ProductValidator': 100,
+                'src.pipelines.duplicatesfilter.DuplicatesFilter': 200,
+                'src.pipelines.catalogsnapshot.CatalogSnapshot': 300
+            })
+        else:
+            settings.set('ITEM_PIPELINES', {
+                'src.pipelines.productvalidator.ProductValidator': 100,
+                'src.pipelines.duplicatesfilter.DuplicatesFilter': 200,
+                'src.pipelines.savetodatabase.SaveToDatabase': 300,
+                'src.pipelines.productnotifier.ProductNotifier': 400
+            })
 
-        settings.set('ITEM_PIPELINES', {
-            'src.pipelines.productvalidator.ProductValidator': 100,
-            'src.pipelines.duplicatesfilter.DuplicatesFilter': 200,
-            'src.pipelines.savetodatabase.SaveToDatabase': 300,
-            'src.pipelines.productnotifier.ProductNotifier': 400
-        })
+        # Dropped items are summarized by the pipelines that drop them
+        settings.set('LOG_FORMATTER', 'src.pipelines.droppeditemlogformatter.DroppedItemLogFormatter')
 
         settings.set('TELNETCONSOLE_ENABLED', False)
+        settings.set('COMPRESSION_ENABLED', True)
 
+        return settings
+
+    @staticmethod
+    def scrape(settings=None, profile=False, **spider_arguments):
+        """
+        Scrapes every catalog of the Vodafone Business Store in the same crawler. For each scraped product, it validates
+        it, checks it was already processed, saves it to a database and notifies about it.
+
+        :param settings: :py:class:`scrapy.settings.Settings` of the crawler. Defaults to :py:meth:`settings`.
+        :param profile: whether to profile the CPU time and the allocations of the run with a
+        :py:class:`src.metrics.profiler.Profiler`. Its artifacts are written to a new directory inside
+        `src.environmentvariables.EnvironmentVariables.PROFILE_DIRECTORY_ARG`, reported by the `vodafone/profile` stat.
+        :param spider_arguments: Overridden attributes of the spider, such as `catalogs`.
+        :return: dict with the stats collected by the crawler.
+        """
+        settings = settings if settings is not None else Scraper.settings()
         process = CrawlerProcess(settings)
-        process.crawl(VodafoneBusinessStore)
-        process.start()
+        crawler = process.create_crawler(VodafoneBusinessStore)
+        process.crawl(crawler, **spider_arguments)
+
+        if not profile:
+            process.start()
+            return crawler.stats.get_stats()
+
+        from src.metrics.profiler import Profiler
+
+        profiler = Profiler(settings.get(EnvironmentVariables.PROFILE_DIRECTORY_ARG))
+        profiler.attach(crawler)
+        profiler.start()
+        try:
+            process.start()
+        finally:
+            directory = profiler.stop()
+
+        stats = crawler.stats.get_stats()
+        stats['vodafone/profile'] = directory
+        return stats
 
 
 if __name__ == '__main__':
-    Scraper.scrape()
+    parser = argparse.ArgumentParser(description='Scrapes the Vodafone Business Store.')
+    parser.add_argument('--profile', action='store_true', help='Profiles the CPU time and allocations of the run.')
+    Scraper.scrape(profile=parser.parse_args().profile)
@@ -1,34 +1,188 @@
-from concurrent.futures.process import ProcessPoolExecutor
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import re
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 
 from src.environmentvariables import EnvironmentVariables
-from src.scraper import Scraper
+from src.metrics.metrics import Metrics
+from src.scheduler import AdaptiveTrigger, Scheduler
+from src.structures.productcatalog import ProductCatalog
 
 
 class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
     """
-    Simple HTTP request handler only for POST requests.
+    Simple HTTP request handler to trigger the scraper, check the status of its jobs and query the current products.
+
+    Connections are kept alive, so clients can send several requests without reconnecting.
     """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which would wait for the acknowledgement of the headers otherwise
+    disable_nagle_algorithm = True
+
+    JOB_PATH = re.compile(r'^/jobs/(\d+)$')
+
     def do_POST(self):
         """
         If path is '/scrape', then it responds with 200 and starts scraping in the background. Otherwise, responds 404.
 
-        Any kind of parameters are ignored.
+        If a scraping job is already queued or running, the request is merged into it. Either way, the response points
+        to the job status with the `Location` header.
+
+        With the `profile=1` parameter, the run is profiled and the status of the job reports where its profile was
+        written to. Other parameters are ignored.
         """
-        if self.path == '/scrape':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write('Going to scrape!'.encode('utf8'))
-            self.server.pool.submit(Scraper.scrape)
+        url = urlsplit(self.path)
+
+        if url.path == '/scrape':
+            job, merged = self.server.scheduler.trigger(profile=parse_qs(url.query).get('profile') == ['1'])
+            message = 'Already scraping! job=%d' if merged else 'Going to scrape! job=%d'
+            self.send_body(200, 'text/plain', (message % job.id).encode('utf8'), {'Location': '/jobs/%d' % job.id})
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write('The requested path was not found.'.encode('utf8'))
+            self.send_not_found()
+
+    def do_GET(self):
+        """
+        If path is '/jobs', then it responds with the status of the latest jobs. If path is '/jobs/<id>', then it
+        responds with the status of that job. Otherwise, responds 404.
+
+        The status includes the queue, startup and run times in seconds, and the number of scraped and dropped items.
+
+        If path is '/metrics', then it responds with the metrics of all the jobs in the Prometheus text format.
+
+        If path is '/products', then it responds with the current products sorted by price. See :py:meth:`get_products`.
+        """
+        url = urlsplit(self.path)
+        job_path = SimpleHTTPRequestHandler.JOB_PATH.match(url.path)
+
+        if url.path == '/metrics':
+            self.send_body(200, 'text/plain; version=0.0.4', Metrics.render().encode('utf8'))
+        elif url.path == '/products':
+            self.get_products(parse_qs(url.query))
+        elif url.path == '/jobs':
+            self.send_json([job.to_dict() for job in self.server.scheduler.latest_jobs()])
+        elif job_path and self.server.scheduler.job(int(job_path.group(1))):
+            self.send_json(self.server.scheduler.job(int(job_path.group(1))).to_dict())
+        else:
+            self.send_not_found()
+
+    def get_products(self, parameters):
+        """
+        Responds with the products of the catalog that match the optional parameters:
+         - `max_price`: maximum price in euros, inclusive.
+         - `contains`: words that must start a word of the name, in any order and case.
+         - `limit` and `offset`: page of the matching products.
+
+        The `ETag` changes whenever the catalog changes. If the client already has it, it responds 304 with no body.
+
+        :param parameters: dict with the query parameters.
+        """
+        catalog = self.server.catalog
+        # The response only depends on the catalog and the query, so both identify it
+        query_hash = zlib.crc32(self.path.encode('utf8'))
+        etag = '"%s-%08x"' % (catalog.index.version, query_hash)
+
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_body(304, None, b'', {'ETag': etag})
+            return
+
+        try:
+            max_price = parameters.get('max_price', [None])[0]
+            limit = parameters.get('limit', [None])[0]
+            limit = int(limit) if limit is not None else None
+            offset = int(parameters.get('offset', [0])[0])
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError('limit and offset must not be negative')
+            version, total, products = catalog.query(
+                max_price=round(float(max_price) * 100) if max_price is not None else None,
+                contains=parameters.get('contains', [None])[0], limit=limit, offset=offset)
+        except (ValueError, OverflowError) as exception:
+            self.send_body(400, 'text/plain', ('Invalid parameter: %s' % exception).encode('utf8'))
+            return
+
+        self.send_json({
+            'version': version,
+            'total': total,
+            'products': [{'name': name, 'price': price / 100, 'url': url} for name, price, url in products]
+        }, {'ETag': '"%s-%08x"' % (version, query_hash)})
+
+    def send_json(self, body, headers=None):
+        self.send_body(200, 'application/json', json.dumps(body).encode('utf8'), headers)
+
+    def send_not_found(self):
+        self.send_body(404, 'text/plain', 'The requested path was not found.'.encode('utf8'))
+
+    def send_body(self, status, content_type, body, headers=None):
+        """
+        Sends a complete response. The length of the body is always sent, so the connection can be reused.
+
+        :param status: HTTP status code.
+        :param content_type: value of the `Content-type` header or None to omit it.
+        :param body: bytes of the body.
+        :param headers: optional dict with other headers.
+        """
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Refreshes run one at a time, so the connections of one are never released while another one uses them
+refresh_lock = threading.Lock()
+
+
+def refresh_catalog(catalog, database_url):
+    """
+    Loads the products stored in the database into the catalog.
+
+    The server only reads the database once per job, so its connections are released after every refresh instead of
+    being kept open between jobs.
+
+    :param catalog: :py:class:`src.structures.productcatalog.ProductCatalog` to be replaced.
+    :param database_url: URL of the database.
+    """
+    from src.databases.databasefactory import DatabaseFactory
+
+    logger = logging.getLogger(__name__)
+
+    with refresh_lock:
+        try:
+            db = DatabaseFactory.get_database(database_url)
+            try:
+                version = catalog.load(db.products())
+            finally:
+                db.close()
+                DatabaseFactory.release(database_url)
+        except Exception as exception:
+            logger.error("Could not refresh the catalog of products. exception='%s'", exception)
+            return
+
+    logger.info("Refreshed the catalog of products. products=%d version='%s'", len(catalog), version)
 
 
 if __name__ == '__main__':
-    httpd = HTTPServer(('', int(EnvironmentVariables.PORT)), SimpleHTTPRequestHandler)
-    httpd.pool = ProcessPoolExecutor(max_workers=1)
+    httpd = ThreadingHTTPServer(('', int(EnvironmentVariables.PORT)), SimpleHTTPRequestHandler)
+    httpd.scheduler = Scheduler()
+    httpd.catalog = ProductCatalog()
+
+    if EnvironmentVariables.DATABASE_URL:
+        def start_refresh(job=None):
+            # The catalog is loaded in the background, so neither the server nor the scheduler wait for it
+            if job is None or job.state == 'finished':
+                threading.Thread(target=refresh_catalog, args=(httpd.catalog, EnvironmentVariables.DATABASE_URL),
+                                 name='catalog-refresh', daemon=True).start()
+
+        start_refresh()
+        httpd.scheduler.add_listener(start_refresh)
+
+    if EnvironmentVariables.SCRAPE_MIN_INTERVAL:
+        AdaptiveTrigger(httpd.scheduler, float(EnvironmentVariables.SCRAPE_MIN_INTERVAL),
+                        float(EnvironmentVariables.SCRAPE_MAX_INTERVAL)).start()
+
     httpd.serve_forever()
@@ -1,9 +1,18 @@
+import hashlib
+import io
 import json
+from urllib.parse import urlencode
 
+import ijson
 import logging
 import scrapy
 
+from src.databases.database import CatalogState
+from src.databases.databasefactory import DatabaseFactory
 from src.domain.product import Product
+from src.environmentvariables import EnvironmentVariables
+from src.metrics.catalogstats import CatalogStats
+from src.metrics.instrumentation import instrumented_callback
 from src.notifiers.notifierfactory import NotifierFactory
 
 
@@ -14,55 +23,301 @@ class VodafoneBusinessStore(scrapy.Spider):
 
     This spider goes through each page and for each product, it yields it with the necessary information to instantiate
     a :py:class:`src.domain.product.Product`.
+
+    The catalog is parsed incrementally by default: each variant is read straight from the response bytes and yielded
+    before the rest of the catalog is parsed. Set `src.environmentvariables.EnvironmentVariables.CATALOG_PARSER_ARG` to
+    `json` to parse the whole catalog at once instead.
+
+    When a database is configured, the validators (ETag and Last-Modified) and a hash of the normalized products of each
+    catalog are stored at the end of a successful run. The next run sends a conditional request and skips the catalog,
+    and therefore every item pipeline, if it was not modified or if its products did not change.
+
+    Several catalogs can be scraped in the same run. They are requested concurrently and share the same item pipelines,
+    database connection and notifier. Each catalog is a dict with a `name` and either the `catalogType` and `pageModel`
+    of the store (plus any extra query parameter, such as `segment`) or a full `url`. They are read, in order of
+    precedence, from the `catalogs` spider argument, from `src.environmentvariables.EnvironmentVariables.CATALOGS_ARG`
+    (a JSON list) or from `DEFAULT_CATALOGS`.
+
+    When replaying an archive (see :py:class:`src.middlewares.responsearchiver.ResponseArchiver`), the catalogs are the
+    ones of the archived run and no state of the catalogs is read or stored, so every archived catalog is parsed and
+    sent through the item pipelines.
     """
 
     __logger = logging.getLogger(__name__)
 
     name = 'vodafone_business_store'
-    start_urls = ['https://www.vodafone.pt/bin/mvc.do/eshop/catalogs/catalog?collectionPath=&catalogType=Accessory&'
-                  'pageModel=%2Floja%2Facessorios.html&filterCatalog=true']
 
+    CATALOG_URL = 'https://www.vodafone.pt/bin/mvc.do/eshop/catalogs/catalog'
+    DEFAULT_CATALOGS = [
+        {'name': 'accessories', 'catalogType': 'Accessory', 'pageModel': '/loja/acessorios.html'}
+    ]
+
+    # Not modified responses are handled by the spider to skip the catalog
+    handle_httpstatus_list = [304]
+
+    URL_HOST = 'https://www.vodafone.pt'
+
+    def start_requests(self):
+        """
+        Requests every catalog. If there is a stored state of the catalog, the request is conditional.
+        """
+        database_url = self.settings.get(EnvironmentVariables.DATABASE_URL_ARG)
+
+        self.db = DatabaseFactory.get_database(database_url) if database_url and not self.replaying() else None
+        self.previous_states = {}
+        self.current_states = {}
+        self.catalog_names = {}
+        self.bytes_avoided = 0
+
+        for catalog in self.catalog_definitions():
+            url = VodafoneBusinessStore.catalog_url(catalog)
+            headers = {}
+            self.catalog_names[url] = catalog['name']
+
+            if self.db is not None:
+                state = self.db.catalog_state(url)
+                self.previous_states[url] = state
+
+                if state and state.etag:
+                    headers['If-None-Match'] = state.etag
+                if state and state.last_modified:
+                    headers['If-Modified-Since'] = state.last_modified
+
+            yield scrapy.Request(url, headers=headers, meta={'catalog_url': url, 'catalog': catalog['name']},
+                                 dont_filter=True)
+
+    def catalog_definitions(self):
+        """
+        :return: list of the definitions of the catalogs to be scraped.
+        """
+        if self.replaying():
+            from src.structures.responsearchive import ResponseArchive
+
+            archive = ResponseArchive(self.settings.get(EnvironmentVariables.ARCHIVE_DIRECTORY_ARG))
+            return [{'name': response.catalog, 'url': response.url}
+                    for response in archive.responses(self.settings.get(EnvironmentVariables.ARCHIVE_RUN_ARG))]
+
+        catalogs = getattr(self, 'catalogs', None) or self.settings.get(EnvironmentVariables.CATALOGS_ARG)
+
+        if not catalogs:
+            return VodafoneBusinessStore.DEFAULT_CATALOGS
+
+        return json.loads(catalogs) if isinstance(catalogs, str) else catalogs
+
+    def replaying(self):
+        """
+        :return: whether the responses are replayed from an archive instead of downloaded.
+        """
+        directory = self.settings.get(EnvironmentVariables.ARCHIVE_DIRECTORY_ARG)
+        return bool(directory) and self.settings.get(EnvironmentVariables.ARCHIVE_MODE_ARG) == 'replay'
+
+    @staticmethod
+    def catalog_url(catalog):
+        """
+        Builds the URL of the listing of a catalog of the store.
+
+        :param catalog: dict with the definition of the catalog.
+        :return: the `url` of the catalog, if present. Otherwise, the URL built from the remaining query parameters.
+        """
+        if 'url' in catalog:
+            return catalog['url']
+
+        query = [('collectionPath', '')]
+        query += [(key, value) for key, value in catalog.items() if key != 'name']
+        query += [('filterCatalog', 'true')]
+
+        return VodafoneBusinessStore.CATALOG_URL + '?' + urlencode(query)
+
+    @instrumented_callback
     def parse(self, response):
         """
         Parses a given json response and yields all valid :py:class:`src.domain.product.Product` it can find.
 
+        Unmodified catalogs and catalogs whose products did not change since the last run yield nothing.
+
         :param response: argument of type :py:class:`scrapy.http.Response`
         """
-        products = json.loads(response.text)['products']
+        catalog_url = response.meta.get('catalog_url', response.url)
+        catalog = response.meta.get('catalog')
+        previous_state = self.previous_states.get(catalog_url)
 
-        if not products:
-            VodafoneBusinessStore.__logger.warning("Found no products! url='%s'", response.url)
-            NotifierFactory.get_notifier(self.settings).warning("Found no products! url='%s'" % response.url)
+        if response.status == 304:
+            self.bytes_avoided += previous_state.content_length if previous_state else 0
+            VodafoneBusinessStore.__logger.info("Catalog was not modified. Skipping it. url='%s'", catalog_url)
+            return
 
-        URL_HOST = 'https://www.vodafone.pt'
+        if self.db is not None:
+            # The hash is computed in a streaming pass of its own, so no more than a single variant is ever held in
+            # memory and unchanged catalogs are skipped without building any product
+            content_hash = VodafoneBusinessStore.catalog_hash(self.variants(response))
+            self.current_states[catalog_url] = CatalogState(
+                etag=VodafoneBusinessStore.header(response, 'ETag'),
+                last_modified=VodafoneBusinessStore.header(response, 'Last-Modified'),
+                content_hash=content_hash,
+                content_length=int(response.headers.get('Content-Length', len(response.body))))
 
-        counter = 0
+            if previous_state and previous_state.content_hash == content_hash:
+                VodafoneBusinessStore.__logger.info(
+                    "Products of the catalog did not change. Skipping it. url='%s' hash='%s'", catalog_url,
+                    content_hash)
+                return
 
-        for raw_product in products:
-            for variant in raw_product['variants']:
-                pvp = variant['priceCondition']['PVP']
-                if not pvp:
-                    VodafoneBusinessStore.__logger.info(
-                        "Ignoring product because it is only sold in-store. product='%s'", variant)
-                    continue
+        yield from self.extract_products(self.variants(response), response.url, catalog)
+
+    def closed(self, reason):
+        """
+        Reports the transferred bytes and, if the spider finished successfully, stores the state of the catalogs whose
+        products were all written by the item pipelines. The others are processed again on the next run.
 
-                try:
-                    price = round(pvp[0]['price'], 2)
-                except:
-                    VodafoneBusinessStore.__logger.error(
-                        "Error rounding price. price='%s' product='%s'", pvp[0]['price'], variant)
-                    NotifierFactory.get_notifier(self.settings).error(
-                        "Error rounding price1. price='%s' product='%s'" % (pvp[0]['price'], variant))
+        When snapshots are enabled, the changes are only written after this method runs, so the state is stored by
+        :py:class:`src.pipelines.catalogsnapshot.CatalogSnapshot` instead.
+
+        :param reason: reason why the spider was closed.
+        """
+        VodafoneBusinessStore.__logger.info("Transferred %d bytes and avoided %d bytes.",
+                                            self.crawler.stats.get_value('downloader/response_bytes', 0),
+                                            self.bytes_avoided)
+
+        if self.db is None:
+            return
+
+        if reason == 'finished' and not self.settings.get(EnvironmentVariables.SNAPSHOT_DIRECTORY_ARG):
+            for url, state in self.current_states.items():
+                catalog = self.catalog_names.get(url)
+                if self.crawler.stats.get_value(CatalogStats.key(catalog, 'failed')):
+                    VodafoneBusinessStore.__logger.warning(
+                        "Products of the catalog were not all written. Not storing its state. catalog='%s' url='%s'",
+                        catalog, url)
                     continue
 
-                product = Product(
-                    name=variant['name'],
-                    price=price,
-                    url=URL_HOST + variant['pageLink']
-                )
+                self.db.save_catalog_state(url, state)
+
+        self.db.close()
+
+    @staticmethod
+    def header(response, name):
+        """
+        :param response: argument of type :py:class:`scrapy.http.Response`
+        :param name: name of the header.
+        :return: the decoded value of the header or None if it is missing.
+        """
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+    def variants(self, response):
+        """
+        Iterates over the variants of all the products of the catalog with the configured parser.
+
+        :param response: argument of type :py:class:`scrapy.http.Response`
+        :return: iterable of the raw variants.
+        """
+        if self.settings.get(EnvironmentVariables.CATALOG_PARSER_ARG) == 'json':
+            return VodafoneBusinessStore.parse_variants(response.text)
+
+        return VodafoneBusinessStore.stream_variants(response.body)
+
+    @staticmethod
+    def catalog_hash(variants):
+        """
+        Hashes the normalized name, price and page of every variant sold online.
+
+        The hash of each variant is summed, so the result does not depend on the order of the products in the catalog
+        and no variant has to be kept in memory.
+
+        :param variants: iterable of the raw variants.
+        :return: the number of variants and their hash.
+        """
+        counter = 0
+        total = 0
+
+        for variant in variants:
+            pvp = variant['priceCondition']['PVP']
+            if not pvp:
+                continue
+
+            try:
+                price = round(pvp[0]['price'], 2)
+            except Exception:
+                price = repr(pvp[0]['price'])
+
+            digest = hashlib.blake2b(repr((variant['name'], price, variant['pageLink'])).encode('utf8'),
+                                     digest_size=16).digest()
+            total = (total + int.from_bytes(digest, 'big')) % (1 << 128)
+            counter += 1
+
+        return '%d:%032x' % (counter, total)
+
+    @staticmethod
+    def parse_variants(text):
+        """
+        Parses the whole catalog at once and iterates over the variants of all its products.
+
+        :param text: decoded body of the catalog response.
+        :return: iterable of the raw variants.
+        """
+        for raw_product in json.loads(text)['products']:
+            yield from raw_product['variants']
+
+    @staticmethod
+    def stream_variants(body):
+        """
+        Incrementally parses the catalog and yields each variant of all its products as soon as it is read.
+
+        Only a single variant is held in memory at a time, besides the raw body.
+
+        :param body: raw bytes of the catalog response.
+        :return: iterable of the raw variants.
+        """
+        return ijson.items(io.BytesIO(body), 'products.item.variants.item', use_float=True)
+
+    def extract_products(self, variants, url, catalog=None):
+        """
+        Yields a :py:class:`src.domain.product.Product` for each variant sold online.
+
+        :param variants: iterable of the raw variants of the catalog.
+        :param url: URL of the catalog, for logging purposes.
+        :param catalog: name of the catalog the products are tagged with.
+        """
+        counter = 0
+        found_variants = False
+
+        for variant in variants:
+            found_variants = True
+
+            pvp = variant['priceCondition']['PVP']
+            if not pvp:
+                VodafoneBusinessStore.__logger.info(
+                    "Ignoring product because it is only sold in-store. product='%s'", variant)
+                continue
+
+            try:
+                price = round(pvp[0]['price'], 2)
+            except:
+                VodafoneBusinessStore.__logger.error(
+                    "Error rounding price. price='%s' product='%s'", pvp[0]['price'], variant)
+                NotifierFactory.get_notifier(self.settings).error(
+                    "Error rounding price. price='%s' product='%s'", pvp[0]['price'], variant)
+                if catalog is not None and getattr(self, 'crawler', None) is not None:
+                    self.crawler.stats.inc_value(CatalogStats.key(catalog, 'errors'))
+                continue
+
+            product = Product(
+                name=variant['name'],
+                price=price,
+                url=VodafoneBusinessStore.URL_HOST + variant['pageLink'],
+                catalog=catalog
+            )
+
+            counter += 1
+            VodafoneBusinessStore.__logger.debug("Extracted new Product: %s", product)
+            yield product
+
+        if not found_variants:
+            VodafoneBusinessStore.__logger.warning("Found no products! url='%s'", url)
+            NotifierFactory.get_notifier(self.settings).warning("Found no products! url='%s'", url)
 
-                counter += 1
-                VodafoneBusinessStore.__logger.debug("Extracted new Product: %s", product)
-                yield product
+        if catalog is not None and getattr(self, 'crawler', None) is not None:
+            self.crawler.stats.inc_value(CatalogStats.key(catalog, 'products'), counter)
 
-        VodafoneBusinessStore.__logger.info("Finished extraction. Processed %d products.", counter)
+        VodafoneBusinessStore.__logger.info("Finished extraction. Processed %d products. catalog='%s'", counter,
+                                            catalog)
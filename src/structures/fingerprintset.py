@@ -0,0 +1,106 @@
+import sys
+from array import array
+
+
+class FingerprintSet:
+    """
+    Memory-compact set of strings.
+
+    Instead of the strings, it keeps their 64-bit fingerprints in an array-backed open-addressing hash table with linear
+    probing. The table is doubled whenever it gets half full, so each string costs between 16 and 32 bytes.
+
+    Two different strings with the same fingerprint are considered the same. The chance of that is negligible (about
+    n^2 / 2^65 for n strings), but if it is not acceptable the set can also keep the strings and compare them on every
+    fingerprint match, at the cost of their memory.
+    """
+
+    # Fingerprint that marks an empty slot
+    __EMPTY = 0
+
+    def __init__(self, capacity=1024, exact=False):
+        """
+        :param capacity: initial number of slots. Rounded up to a power of two.
+        :param exact: whether to keep the strings to tell apart strings with the same fingerprint.
+        """
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+
+        self.slots = array('Q', bytes(8 * capacity))
+        self.strings = [None] * capacity if exact else None
+        self.size = 0
+
+    @staticmethod
+    def fingerprint(string):
+        """
+        Python's string hash is a 64-bit SipHash, salted per process. So fingerprints must not outlive the process.
+
+        :param string: string to fingerprint.
+        :return: non-zero 64-bit fingerprint of the string.
+        """
+        return (hash(string) & 0xFFFFFFFFFFFFFFFF) or 1
+
+    def __find(self, string, fingerprint):
+        """
+        :return: tuple with the slot of the string, or the empty slot where it should be, and whether it was found.
+        """
+        mask = len(self.slots) - 1
+        slot = fingerprint & mask
+
+        while self.slots[slot] != FingerprintSet.__EMPTY:
+            if self.slots[slot] == fingerprint and (self.strings is None or self.strings[slot] == string):
+                return slot, True
+            slot = (slot + 1) & mask
+
+        return slot, False
+
+    def add(self, string):
+        """
+        :param string: string to add.
+        :return: True if the string was added, False if it was already in the set.
+        """
+        fingerprint = FingerprintSet.fingerprint(string)
+        slot, found = self.__find(string, fingerprint)
+
+        if found:
+            return False
+
+        self.slots[slot] = fingerprint
+        if self.strings is not None:
+            self.strings[slot] = string
+        self.size += 1
+
+        if self.size * 2 > len(self.slots):
+            self.__grow()
+
+        return True
+
+    def __grow(self):
+        slots, strings = self.slots, self.strings
+
+        self.slots = array('Q', bytes(16 * len(slots)))
+        self.strings = [None] * len(self.slots) if strings is not None else None
+
+        for slot, fingerprint in enumerate(slots):
+            if fingerprint != FingerprintSet.__EMPTY:
+                string = strings[slot] if strings is not None else None
+                new_slot, _ = self.__find(string, fingerprint)
+                self.slots[new_slot] = fingerprint
+                if strings is not None:
+                    self.strings[new_slot] = string
+
+    def __contains__(self, string):
+        return self.__find(string, FingerprintSet.fingerprint(string))[1]
+
+    def __len__(self):
+        return self.size
+
+    def memory(self):
+        """
+        :return: bytes used by the set, including the kept strings, if any.
+        """
+        size = sys.getsizeof(self.slots)
+
+        if self.strings is not None:
+            size += sys.getsizeof(self.strings) + sum(sys.getsizeof(string) for string in self.strings
+                                                      if string is not None)
+
+        return size
@@ -0,0 +1,136 @@
+import bisect
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+CatalogIndex = namedtuple('CatalogIndex', ['version', 'products', 'prices', 'tokens', 'postings', 'results'])
+CatalogIndex.__doc__ = """
+Immutable index of the catalog: its version, the products and their prices sorted by price, the sorted name tokens, the
+sorted positions of the products that have each token and the positions matched by the latest filters.
+"""
+
+
+class ProductCatalog:
+    """
+    In-memory catalog of the current products, indexed to answer queries without touching the database.
+
+    Products are kept sorted by price, so the products under a price are a prefix of the catalog and every result is
+    already sorted. Each lowercase word of the names points to the positions of the products that have it.
+
+    The index is never changed, only replaced as a whole by :py:meth:`load`, so queries never wait for a refresh and
+    always see a consistent catalog.
+
+    The positions that match each combination of filters are cached with the index they belong to, as the same queries
+    are repeated over and over again, and short prefixes match most of the catalog.
+    """
+
+    TOKEN = re.compile(r'\w+')
+    # Number of combinations of filters whose matching positions are cached
+    RESULTS_CACHE_SIZE = 1024
+
+    def __init__(self):
+        self.index = CatalogIndex(ProductCatalog.version([]), [], [], [], {}, OrderedDict())
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def tokenize(text):
+        """
+        :param text: name of a product or a query.
+        :return: list of the lowercase words of the text.
+        """
+        return ProductCatalog.TOKEN.findall(text.lower())
+
+    @staticmethod
+    def version(products):
+        """
+        :param products: list of tuples with the name, price in cents and URL of each product, sorted by price.
+        :return: hash of the products, which changes whenever any of them changes.
+        """
+        digest = hashlib.blake2b(digest_size=12)
+        for product in products:
+            digest.update(repr(product).encode('utf8'))
+        return digest.hexdigest()
+
+    def load(self, products):
+        """
+        Replaces the catalog with the given products.
+
+        :param products: iterable of tuples with the name, price in cents and URL of each product.
+        :return: the version of the new catalog.
+        """
+        ordered = sorted(products, key=lambda product: (product[1], product[0]))
+        postings = {}
+
+        for position, (name, _, _) in enumerate(ordered):
+            for token in set(ProductCatalog.tokenize(name)):
+                postings.setdefault(token, []).append(position)
+
+        self.index = CatalogIndex(ProductCatalog.version(ordered), ordered, [price for _, price, _ in ordered],
+                                  sorted(postings), postings, OrderedDict())
+        return self.index.version
+
+    def query(self, max_price=None, contains=None, limit=None, offset=0):
+        """
+        Finds the products that match all the given filters, sorted by price.
+
+        :param max_price: maximum price in cents, inclusive.
+        :param contains: words that must start a word of the name of the product, in any order and case.
+        :param limit: maximum number of products returned.
+        :param offset: number of matching products skipped.
+        :return: tuple with the version of the catalog, the number of matching products and a list with the tuples of
+        the name, price in cents and URL of each returned product.
+        """
+        index = self.index
+        end = len(index.products) if max_price is None else bisect.bisect_right(index.prices, max_price)
+        tokens = ProductCatalog.tokenize(contains) if contains else []
+
+        if not tokens:
+            positions = range(end)
+        else:
+            key = (end, tuple(sorted(set(tokens))))
+            with self.lock:
+                positions = index.results.get(key)
+                if positions is not None:
+                    index.results.move_to_end(key)
+
+            if positions is None:
+                positions = ProductCatalog.__match(index, tokens, end)
+                with self.lock:
+                    index.results[key] = positions
+                    if len(index.results) > ProductCatalog.RESULTS_CACHE_SIZE:
+                        index.results.popitem(last=False)
+
+        stop = len(positions) if limit is None else offset + limit
+        return index.version, len(positions), [index.products[position] for position in positions[offset:stop]]
+
+    @staticmethod
+    def __match(index, tokens, end):
+        """
+        :return: sorted list with the positions before `end` of the products that have a word starting with each token.
+        """
+        positions = None
+        # Rarest words first, so the candidates shrink as soon as possible
+        for postings in sorted((ProductCatalog.__prefixed(index, token) for token in tokens), key=len):
+            positions = postings if positions is None else positions.intersection(postings)
+            if not positions:
+                break
+        return sorted(position for position in positions if position < end)
+
+    @staticmethod
+    def __prefixed(index, prefix):
+        """
+        :return: set with the positions of the products with a word that starts with the given prefix.
+        """
+        positions = set()
+        start = bisect.bisect_left(index.tokens, prefix)
+
+        for token in index.tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            positions.update(index.postings[token])
+
+        return positions
+
+    def __len__(self):
+        return len(self.index.products)
@@ -0,0 +1,164 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+ArchivedResponse = namedtuple('ArchivedResponse', ['url', 'catalog', 'status', 'headers', 'digest', 'size',
+                                                   'recorded_at'])
+ArchivedResponse.__doc__ = """
+Metadata of an archived response: the URL it was requested with, its catalog, status and headers, the SHA-256 of its
+body, the size of the body and when it was recorded.
+"""
+
+
+class ResponseArchive:
+    """
+    Directory with the raw responses of the catalogs, to run the scraper again on them without any network.
+
+    Bodies are stored compressed and addressed by their content (`objects/<first 2 digits>/<sha256>.gz`), so a catalog
+    that did not change between runs is only stored once. The metadata of each run is a JSON line per response in
+    `runs/<run>.jsonl`, where runs are named after the UTC time they started at, so they sort chronologically.
+
+    Objects are written to a temporary file and then renamed, and the metadata is appended once the object exists, so
+    an interrupted run never references a missing or partial body.
+
+    The newest response of each URL is also kept in `latest/<sha256 of the URL>.json`, so looking it up costs a single
+    small read, however many runs are archived. Archives that predate it get these files on open.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: directory of the archive. It is created if missing.
+        """
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'runs'), exist_ok=True)
+
+        if not os.path.isdir(os.path.join(directory, 'latest')):
+            self.__index_latest()
+
+    @staticmethod
+    def new_run():
+        """
+        :return: name of a run that starts now.
+        """
+        return datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%fZ')
+
+    def record(self, run, url, catalog, status, headers, body):
+        """
+        Archives a response as part of the given run.
+
+        :param run: name of the run.
+        :param url: URL the catalog was requested with.
+        :param catalog: name of the catalog.
+        :param status: HTTP status of the response.
+        :param headers: dict with the list of values of each header.
+        :param body: raw bytes of the decoded body.
+        :return: :py:class:`src.structures.responsearchive.ArchivedResponse` of the response.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.__object_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as file:
+                file.write(gzip.compress(body, compresslevel=6))
+            os.replace(path + '.tmp', path)
+
+        return self.reference(run, ArchivedResponse(url, catalog, status, headers, digest, len(body),
+                                                    datetime.datetime.utcnow().isoformat() + 'Z'))
+
+    def reference(self, run, response):
+        """
+        Adds an already archived response to the given run, such as the unmodified catalog of a previous run.
+
+        :param run: name of the run.
+        :param response: :py:class:`src.structures.responsearchive.ArchivedResponse` whose body is archived.
+        :return: the given response.
+        """
+        with open(os.path.join(self.directory, 'runs', run + '.jsonl'), 'a', encoding='utf8') as file:
+            file.write(json.dumps(response._asdict()) + '\n')
+
+        self.__write_latest(response)
+        return response
+
+    def runs(self):
+        """
+        :return: sorted list with the names of the archived runs, from the oldest to the newest.
+        """
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(os.path.join(self.directory, 'runs'))
+                      if name.endswith('.jsonl'))
+
+    def responses(self, run=None):
+        """
+        Throws :py:class:`builtins.ValueError` if the run is not archived or if there is no run at all.
+
+        :param run: name of the run. Defaults to the newest one.
+        :return: list of :py:class:`src.structures.responsearchive.ArchivedResponse` of the run, in the order they were
+        recorded.
+        """
+        runs = self.runs()
+
+        if run is None and runs:
+            run = runs[-1]
+        if run not in runs:
+            raise ValueError("Run not found in the archive! run='%s' directory='%s'" % (run, self.directory))
+
+        with open(os.path.join(self.directory, 'runs', run + '.jsonl'), encoding='utf8') as file:
+            return [ArchivedResponse(**json.loads(line)) for line in file if line.strip()]
+
+    def latest(self, url):
+        """
+        :param url: URL the catalog was requested with.
+        :return: the newest :py:class:`src.structures.responsearchive.ArchivedResponse` of the URL or None if it was
+        never archived.
+        """
+        try:
+            with open(self.__latest_path(url), encoding='utf8') as file:
+                return ArchivedResponse(**json.load(file))
+        except FileNotFoundError:
+            return None
+
+    def body(self, response):
+        """
+        Throws :py:class:`builtins.ValueError` if the archived body does not match its digest.
+
+        :param response: :py:class:`src.structures.responsearchive.ArchivedResponse`.
+        :return: raw bytes of the body of the response.
+        """
+        with open(self.__object_path(response.digest), 'rb') as file:
+            body = gzip.decompress(file.read())
+
+        if hashlib.sha256(body).hexdigest() != response.digest:
+            raise ValueError("Archived body is corrupted! digest='%s' url='%s'" % (response.digest, response.url))
+
+        return body
+
+    def __index_latest(self):
+        """
+        Writes the newest response of every archived URL, going through the runs from the oldest to the newest.
+        """
+        latest = {}
+        for run in self.runs():
+            for response in self.responses(run):
+                latest[response.url] = response
+
+        os.makedirs(os.path.join(self.directory, 'latest.tmp'), exist_ok=True)
+        for response in latest.values():
+            self.__write_latest(response, 'latest.tmp')
+
+        os.replace(os.path.join(self.directory, 'latest.tmp'), os.path.join(self.directory, 'latest'))
+
+    def __write_latest(self, response, directory='latest'):
+        path = self.__latest_path(response.url, directory)
+        with open(path + '.tmp', 'w', encoding='utf8') as file:
+            json.dump(response._asdict(), file)
+        os.replace(path + '.tmp', path)
+
+    def __latest_path(self, url, directory='latest'):
+        return os.path.join(self.directory, directory, hashlib.sha256(url.encode('utf8')).hexdigest() + '.json')
+
+    def __object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest + '.gz')
@@ -0,0 +1,173 @@
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+SnapshotDiff = namedtuple('SnapshotDiff', ['added', 'removed', 'repriced'])
+SnapshotDiff.__doc__ = """
+Difference between two snapshots: the indexes of the added products in the current snapshot, the indexes of the removed
+products in the previous snapshot and the pairs of indexes (previous, current) of the products whose price changed.
+"""
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped snapshot of the products of a catalog.
+
+    The file is made of a header followed by three columns of fixed-size records, sorted by the hash of the name of the
+    product, and by the names and URLs themselves:
+
+     - header: magic and number of products.
+     - hashes: 64-bit hash of each name.
+     - prices: 64-bit price in cents of each product.
+     - offsets: 64-bit offset of the name and URL of each product.
+     - strings: length-prefixed UTF-8 name and URL of each product.
+
+    Columns are in the native byte order and are read straight from the mapped file, so opening a snapshot costs the
+    same regardless of its size. Names and URLs are only decoded for the products that are asked for.
+    """
+
+    MAGIC = b'VDFSNAP1'
+    __HEADER = struct.Struct('=8sQ')
+    __LENGTH = struct.Struct('=I')
+
+    def __init__(self, path):
+        """
+        Maps the given snapshot file.
+
+        :param path: path of a file written by :py:meth:`write`.
+        """
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size = Snapshot.__HEADER.unpack_from(self.map)
+        if magic != Snapshot.MAGIC:
+            self.close()
+            raise ValueError("Not a snapshot file! path='%s'" % path)
+
+        view = memoryview(self.map)
+        start = Snapshot.__HEADER.size
+        column = 8 * self.size
+
+        self.hashes = view[start:start + column].cast('Q')
+        self.prices = view[start + column:start + 2 * column].cast('q')
+        self.offsets = view[start + 2 * column:start + 3 * column].cast('Q')
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def hash(name):
+        """
+        Unlike Python's string hash, it is stable across processes, so it can be stored.
+
+        :param name: name of a product.
+        :return: 64-bit hash of the name.
+        """
+        return int.from_bytes(hashlib.blake2b(name.encode('utf8'), digest_size=8).digest(), 'little')
+
+    def product(self, index):
+        """
+        :param index: position of the product in the snapshot.
+        :return: tuple with the name, price in cents and URL of the product.
+        """
+        offset = self.offsets[index]
+        name_length, = Snapshot.__LENGTH.unpack_from(self.map, offset)
+        offset += Snapshot.__LENGTH.size
+        name = self.map[offset:offset + name_length].decode('utf8')
+
+        offset += name_length
+        url_length, = Snapshot.__LENGTH.unpack_from(self.map, offset)
+        offset += Snapshot.__LENGTH.size
+        url = self.map[offset:offset + url_length].decode('utf8')
+
+        return name, self.prices[index], url
+
+    def close(self):
+        """
+        Unmaps the file. Products can no longer be read.
+        """
+        for column in ('hashes', 'prices', 'offsets'):
+            if hasattr(self, column):
+                getattr(self, column).release()
+        self.map.close()
+
+    @staticmethod
+    def write(path, products):
+        """
+        Writes a snapshot of the given products. The file is replaced atomically, so readers never see a partial file.
+
+        Products with the same name are only written once, with the last price and URL.
+
+        :param path: path of the snapshot file.
+        :param products: iterable of tuples with the name, price in cents and URL of each product.
+        :return: number of products written.
+        """
+        products_by_hash = {Snapshot.hash(name): (name, price, url) for name, price, url in products}
+
+        # Sorting the bare hashes is several times faster than sorting the records
+        hashes = array('Q', sorted(products_by_hash))
+        records = [products_by_hash[name_hash] for name_hash in hashes]
+        prices = array('q', (price for _, price, _ in records))
+
+        pack_length = Snapshot.__LENGTH.pack
+        strings = []
+        for name, _, url in records:
+            name, url = name.encode('utf8'), url.encode('utf8')
+            strings.append(pack_length(len(name)) + name + pack_length(len(url)) + url)
+
+        start = Snapshot.__HEADER.size + 24 * len(records)
+        offsets = array('Q', itertools.accumulate((len(string) for string in strings[:-1]), initial=start))
+        offsets = offsets if records else array('Q')
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(Snapshot.__HEADER.pack(Snapshot.MAGIC, len(records)))
+            hashes.tofile(file)
+            prices.tofile(file)
+            offsets.tofile(file)
+            file.writelines(strings)
+        os.replace(temporary_path, path)
+
+        return len(records)
+
+    @staticmethod
+    def diff(previous, current):
+        """
+        Compares two snapshots with a single linear merge of their sorted hashes.
+
+        :param previous: :py:class:`src.structures.snapshot.Snapshot` of the last run.
+        :param current: :py:class:`src.structures.snapshot.Snapshot` of this run.
+        :return: :py:class:`src.structures.snapshot.SnapshotDiff`.
+        """
+        previous_hashes, previous_prices, previous_size = previous.hashes, previous.prices, previous.size
+        current_hashes, current_prices, current_size = current.hashes, current.prices, current.size
+
+        added = []
+        removed = []
+        repriced = []
+        i = j = 0
+
+        while i < previous_size and j < current_size:
+            previous_hash = previous_hashes[i]
+            current_hash = current_hashes[j]
+
+            if previous_hash == current_hash:
+                if previous_prices[i] != current_prices[j]:
+                    repriced.append((i, j))
+                i += 1
+                j += 1
+            elif previous_hash < current_hash:
+                removed.append(i)
+                i += 1
+            else:
+                added.append(j)
+                j += 1
+
+        removed.extend(range(i, previous_size))
+        added.extend(range(j, current_size))
+
+        return SnapshotDiff(added, removed, repriced)
@@ -0,0 +1,118 @@
+import bisect
+import json
+import sys
+from collections import Counter, namedtuple
+
+from src.structures.productcatalog import ProductCatalog
+
+WatchRule = namedtuple('WatchRule', ['subscriber', 'keywords', 'max_price'])
+WatchRule.__doc__ = """
+Rule of a subscriber: the words that must all be in the name of a product and its optional maximum price, in euros.
+"""
+
+
+class Watchlist:
+    """
+    Compiled set of :py:class:`src.structures.watchlist.WatchRule` that finds the subscribers interested in a product.
+
+    Rules are compiled into an inverted index: each rule is filed under a single word of its keywords, the one that the
+    fewest rules have, and the rules of each word are sorted by their maximum price. A product only looks up the words
+    of its name and, for each of them, the rules whose maximum price it does not exceed. Only those candidates are
+    checked for the rest of their keywords, so matching a product does not depend on how many rules there are but on
+    how many of them nearly match it. Rules without keywords are only filtered by their maximum price.
+
+    Words are compared whole and in lowercase, as tokenized by
+    :py:meth:`src.structures.productcatalog.ProductCatalog.tokenize`.
+    """
+
+    def __init__(self, rules):
+        """
+        Compiles the given rules.
+
+        :param rules: iterable of :py:class:`src.structures.watchlist.WatchRule`.
+        """
+        rules = [rule._replace(keywords=frozenset(ProductCatalog.tokenize(rule.keywords or ''))) for rule in rules]
+        frequencies = Counter(keyword for rule in rules for keyword in rule.keywords)
+        anchored = {}
+        unanchored = []
+
+        for rule in rules:
+            entry = (Watchlist.cents(rule.max_price), rule.subscriber)
+
+            if not rule.keywords:
+                unanchored.append(entry)
+                continue
+
+            anchor = min(rule.keywords, key=lambda keyword: (frequencies[keyword], keyword))
+            anchored.setdefault(anchor, []).append(entry + (rule.keywords - {anchor},))
+
+        # Each word keeps the maximum prices apart from the rules, so the affordable rules are found with a bisection
+        self.anchored = {}
+        for anchor, entries in anchored.items():
+            entries.sort(key=lambda entry: entry[0])
+            self.anchored[anchor] = ([entry[0] for entry in entries], entries)
+
+        unanchored.sort()
+        self.unanchored = ([entry[0] for entry in unanchored], unanchored)
+        self.size = len(rules)
+
+    @staticmethod
+    def load(path):
+        """
+        Reads the rules from a JSON file with a list of objects with:
+         - `subscriber`: who is notified. With Slack, it is the id of the user, which is mentioned.
+         - `keywords`: words that must all be in the name of the product, in any order and case. Optional.
+         - `max_price`: maximum price of the product, in euros. Optional.
+
+        Throws :py:class:`builtins.ValueError` if any rule has no subscriber.
+
+        :param path: path of the JSON file.
+        :return: :py:class:`src.structures.watchlist.Watchlist` with the rules of the file.
+        """
+        with open(path, encoding='utf8') as file:
+            definitions = json.load(file)
+
+        rules = []
+        for position, definition in enumerate(definitions):
+            if not definition.get('subscriber'):
+                raise ValueError("Watch rule without subscriber! position=%d rule='%s'" % (position, definition))
+            rules.append(WatchRule(definition['subscriber'], definition.get('keywords'), definition.get('max_price')))
+
+        return Watchlist(rules)
+
+    @staticmethod
+    def cents(price):
+        """
+        :param price: price in euros or None if there is no limit.
+        :return: price in cents, where no limit is the highest possible price.
+        """
+        return sys.maxsize if price is None else int(round(price * 100))
+
+    def match(self, name, price):
+        """
+        :param name: name of the product.
+        :param price: price of the product, in euros.
+        :return: sorted list with the subscribers of the rules matched by the product, without repetitions.
+        """
+        cents = Watchlist.cents(price)
+        keywords = set(ProductCatalog.tokenize(name))
+        subscribers = set()
+
+        prices, entries = self.unanchored
+        for index in range(bisect.bisect_left(prices, cents), len(entries)):
+            subscribers.add(entries[index][1])
+
+        for keyword in keywords:
+            if keyword not in self.anchored:
+                continue
+
+            prices, entries = self.anchored[keyword]
+            for index in range(bisect.bisect_left(prices, cents), len(entries)):
+                _, subscriber, other_keywords = entries[index]
+                if other_keywords <= keywords:
+                    subscribers.add(subscriber)
+
+        return sorted(subscribers)
+
+    def __len__(self):
+        return self.size
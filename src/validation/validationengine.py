@@ -0,0 +1,91 @@
+import re
+from collections import Counter
+
+import validators
+
+
+class ValidationEngine:
+    """
+    Validates :py:class:`src.domain.product.Product` against precompiled rules and keeps a summary of the rejections.
+
+    A product is valid if its name is not empty, its price is non-negative and its URL is valid. URLs of the store are
+    validated by a cheap precompiled expression, while other URLs fall back to :py:func:`validators.url.url`.
+    """
+    KNOWN_PREFIX = 'https://www.vodafone.pt/'
+
+    # Characters allowed in the path, query and fragment of an URL (RFC 3986)
+    __known_path = re.compile(r"[A-Za-z0-9\-._~!$&'()*+,;=:@/?#%]*")
+
+    # Number of rejected products kept per reason
+    SAMPLES = 3
+
+    def __init__(self):
+        """
+        Starts with an empty summary.
+        """
+        self.validated = 0
+        self.rejections = Counter()
+        self.samples = {}
+
+    @staticmethod
+    def valid_url(url):
+        """
+        :param url: URL to be validated.
+        :return: True if the URL is valid, False otherwise.
+        """
+        if url.startswith(ValidationEngine.KNOWN_PREFIX):
+            return ValidationEngine.__known_path.fullmatch(url, len(ValidationEngine.KNOWN_PREFIX)) is not None
+
+        return validators.url(url) is True
+
+    @staticmethod
+    def rejection(product):
+        """
+        :param product: :py:class:`src.domain.product.Product` to be validated.
+        :return: the reason why the product is invalid or None if it is valid.
+        """
+        if not product['name']:
+            return 'invalid name'
+
+        try:
+            if not product['price'] >= 0:
+                return 'invalid price'
+        except TypeError:
+            return 'invalid price'
+
+        if not isinstance(product['url'], str) or not ValidationEngine.valid_url(product['url']):
+            return 'invalid URL'
+
+        return None
+
+    def validate(self, product):
+        """
+        Validates the given product and records it in the summary if it is invalid.
+
+        :param product: :py:class:`src.domain.product.Product` to be validated.
+        :return: the reason why the product is invalid or None if it is valid.
+        """
+        self.validated += 1
+        reason = ValidationEngine.rejection(product)
+
+        if reason is not None:
+            self.rejections[reason] += 1
+            samples = self.samples.setdefault(reason, [])
+            if len(samples) < ValidationEngine.SAMPLES:
+                samples.append(product)
+
+        return reason
+
+    def summary(self):
+        """
+        :return: human readable summary of the rejections, or None if no product was rejected.
+        """
+        if not self.rejections:
+            return None
+
+        lines = ['Rejected %d of %d products.' % (sum(self.rejections.values()), self.validated)]
+        for reason, count in self.rejections.most_common():
+            samples = ', '.join("'%s'" % sample for sample in self.samples[reason])
+            lines.append('%s: %d. samples=%s' % (reason, count, samples))
+
+        return '\n'.join(lines)